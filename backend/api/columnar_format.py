@@ -0,0 +1,191 @@
+"""
+A binary columnar format for the graph and table responses, used when the request has
+Accept: application/vnd.hypatia.columns, the JSON response is sent otherwise.
+
+The numeric columns of the response are sent as little-endian arrays, and everything else stays in a small JSON
+header. Integer columns use the smallest integer type that fits. The website values are rounded to a few decimals, so
+a float column where every value is a short decimal is sent as integers times 10**-scale, with the smallest value of
+the integer type for null, dividing by 10**scale gives back the same float64 values. The other float columns are
+float64 with NaN for null. The payload is:
+
+    8 bytes    the magic string b'HYPCOL01'
+    4 bytes    the length of the JSON header, uint32 little-endian
+    header     UTF-8 JSON, padded with spaces so that the column data starts at a multiple of 8 bytes
+    columns    the column arrays, each one starts at a multiple of 8 bytes
+
+The header is {"meta": ..., "columns": [{"path": [...], "dtype": "<i2", "offset": 0, "length": 10000, "scale": 2,
+"null": -32768}, ...]}, where meta is the response with the numeric columns left out, path is the list of keys to the
+column in the response, and offset is from the start of the column data. decode_columns() rebuilds the response, with
+numpy arrays for the numeric columns.
+"""
+import json
+import struct
+
+import numpy as np
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.core.serializers.json import DjangoJSONEncoder
+
+columns_content_type = 'application/vnd.hypatia.columns'
+columns_magic = b'HYPCOL01'
+column_alignment = 8
+numeric_types = (int, float, type(None))
+int_dtypes = ['<i1', '<i2', '<i4', '<i8']
+# float columns with more decimals than this are sent as float64
+max_decimal_scale = 6
+
+
+def pad_length(length: int) -> int:
+    return -length % column_alignment
+
+
+def column_array(values) -> np.ndarray | None:
+    """
+    The little-endian array for a numeric column, None for the values that stay in the JSON header.
+    """
+    if isinstance(values, np.ndarray):
+        if values.ndim != 1 or values.dtype.kind not in 'iuf':
+            return None
+        dtype = '<f8' if values.dtype.kind == 'f' else '<i8'
+        # no copy when the array already has this dtype
+        return np.ascontiguousarray(values, dtype=dtype)
+    if not isinstance(values, (list, tuple)) or not values:
+        return None
+    # bool is a subclass of int, so the exact types are checked
+    has_none = False
+    has_float = False
+    for value in values:
+        value_type = type(value)
+        if value_type not in numeric_types:
+            return None
+        if value is None:
+            has_none = True
+        elif value_type is float:
+            has_float = True
+    if has_none or has_float:
+        return np.array(values, dtype='<f8')
+    return np.array(values, dtype='<i8')
+
+
+def smallest_int_dtype(min_value, max_value, reserve_null: bool = False) -> str:
+    for dtype in int_dtypes:
+        dtype_info = np.iinfo(dtype)
+        if dtype_info.min + int(reserve_null) <= min_value and max_value <= dtype_info.max:
+            return dtype
+    return '<i8'
+
+
+def pack_column(array: np.ndarray) -> tuple[np.ndarray, dict]:
+    """
+    The array to send for a column and the extra header fields that decode_columns() needs to unpack it.
+    """
+    if array.dtype.kind in 'iu':
+        return array.astype(smallest_int_dtype(array.min(), array.max()), copy=False), {}
+    is_null = np.isnan(array)
+    values = array[~is_null]
+    if len(values) == 0 or not np.all(np.isfinite(values)):
+        return array, {}
+    for scale in range(max_decimal_scale + 1):
+        scaled = np.rint(values * 10.0 ** scale)
+        if np.abs(scaled).max() >= 2 ** 31:
+            break
+        if np.array_equal(scaled / 10.0 ** scale, values):
+            dtype = smallest_int_dtype(scaled.min(), scaled.max(), reserve_null=True)
+            null_value = int(np.iinfo(dtype).min)
+            packed = np.full(len(array), null_value, dtype=dtype)
+            packed[~is_null] = scaled
+            return packed, {'scale': scale, 'null': null_value}
+    return array, {}
+
+
+def split_columns(value, path: list, columns: list[tuple[list, np.ndarray]]):
+    """
+    The value with the numeric columns taken out and added to columns.
+    """
+    if isinstance(value, dict):
+        meta = {}
+        for key, item in value.items():
+            array = column_array(item)
+            if array is None:
+                meta[key] = split_columns(item, path + [key], columns)
+            else:
+                columns.append((path + [key], array))
+        return meta
+    return value
+
+
+def encode_columns(response_data: dict) -> bytes:
+    columns = []
+    meta = split_columns(response_data, [], columns)
+    column_records = []
+    offset = 0
+    packed_arrays = []
+    for path, array in columns:
+        packed_array, pack_fields = pack_column(array)
+        packed_arrays.append(packed_array)
+        column_records.append({'path': path, 'dtype': packed_array.dtype.str, 'offset': offset,
+                               'length': len(packed_array)} | pack_fields)
+        offset += packed_array.nbytes + pad_length(packed_array.nbytes)
+    header = json.dumps({'meta': meta, 'columns': column_records}, cls=DjangoJSONEncoder,
+                        separators=(',', ':')).encode('utf-8')
+    header += b' ' * pad_length(len(columns_magic) + 4 + len(header))
+    parts = [columns_magic, struct.pack('<I', len(header)), header]
+    for array in packed_arrays:
+        # the array memory is joined without a tobytes() copy
+        parts.append(memoryview(array).cast('B'))
+        parts.append(b'\x00' * pad_length(array.nbytes))
+    return b''.join(parts)
+
+
+def decode_columns(payload: bytes, as_lists: bool = False) -> dict:
+    """
+    The response from encode_columns(), the numeric columns are numpy arrays, or lists with None for NaN when
+    as_lists is True, like the JSON response. The columns that are not packed use the payload memory.
+    """
+    if payload[:len(columns_magic)] != columns_magic:
+        raise ValueError('Not a Hypatia columns payload')
+    header_start = len(columns_magic) + 4
+    header_length, = struct.unpack('<I', payload[len(columns_magic):header_start])
+    header = json.loads(payload[header_start:header_start + header_length])
+    data_start = header_start + header_length
+    response_data = header['meta']
+    for column_record in header['columns']:
+        array = np.frombuffer(payload, dtype=column_record['dtype'], count=column_record['length'],
+                              offset=data_start + column_record['offset'])
+        if 'scale' in column_record.keys():
+            is_null = array == column_record['null']
+            array = array.astype('<f8') / 10.0 ** column_record['scale']
+            array[is_null] = np.nan
+        if as_lists:
+            array = [None if value != value else value for value in array.tolist()]
+        *parent_keys, key = column_record['path']
+        parent = response_data
+        for parent_key in parent_keys:
+            parent = parent.setdefault(parent_key, {})
+        parent[key] = array
+    return response_data
+
+
+def accepts_columns(request) -> bool:
+    return columns_content_type in request.headers.get('Accept', '')
+
+
+def to_json_data(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    elif isinstance(value, dict):
+        return {key: to_json_data(item) for key, item in value.items()}
+    return value
+
+
+def columns_or_json_response(request, response_data: dict) -> HttpResponse:
+    """
+    The binary columnar response when the request accepts it, a JsonResponse otherwise. The numpy arrays in
+    response_data are sent as they are in the columnar format and as lists in the JSON response.
+    """
+    if accepts_columns(request):
+        response = HttpResponse(encode_columns(response_data), content_type=columns_content_type)
+    else:
+        response = JsonResponse(to_json_data(response_data))
+    patch_vary_headers(response, ('Accept',))
+    return response
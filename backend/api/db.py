@@ -1,7 +1,7 @@
 from warnings import warn
 
 from hypatia.pipeline.star.db import HypatiaDB
-from hypatia.configs.env_load import MONGO_DATABASE
+from hypatia.configs.env_load import MONGO_DATABASE, COLUMNAR_ENGINE, INDEX_ADVISOR
 from hypatia.pipeline.summary import SummaryCollection
 from hypatia.sources.nea.db import ExoPlanetStarCollection
 
@@ -9,6 +9,13 @@ from hypatia.sources.nea.db import ExoPlanetStarCollection
 """Instances that can get data from the database."""
 summary_db = SummaryCollection(db_name=MONGO_DATABASE, collection_name='summary')
 hypatia_db = HypatiaDB(db_name=MONGO_DATABASE, collection_name='hypatiaDB')
+hypatia_db.enable_query_cache(get_data_version=summary_db.get_data_version)
+hypatia_db.enable_plot_view()
+if COLUMNAR_ENGINE:
+    hypatia_db.enable_columnar_engine(get_data_version=summary_db.get_data_version)
+if INDEX_ADVISOR:
+    # the report in run_report_dir is written again for each new query shape
+    hypatia_db.enable_index_advisor(auto_write=True)
 nea_db = ExoPlanetStarCollection(db_name='metadata', collection_name='nea')
 # star_collection = StarCollection(db_name=MONGO_DATABASE, collection_name='stars')
 
@@ -0,0 +1,73 @@
+"""
+Streaming JSON responses for the large API results.
+
+JsonResponse encodes the whole result into one string, so a request holds the result, the string, and the response
+bytes at the same time. The generators here encode a JSON array or object a chunk of values at a time, straight from
+a MongoDB cursor or from the table columns, and StreamingHttpResponse sends each chunk as it is made. orjson is used
+when it is installed, the json module with the Django encoder is used otherwise.
+"""
+from collections.abc import Iterable, Iterator
+
+from django.http import StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# the number of values that are encoded together
+stream_chunk_size = 1000
+json_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+
+def encode_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json_encoder.encode(value).encode('utf-8')
+
+
+def json_array_chunks(values: Iterable, chunk_size: int = stream_chunk_size) -> Iterator[bytes]:
+    """
+    A JSON array of values, each chunk has up to chunk_size values.
+    """
+    yield b'['
+    is_first = True
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= chunk_size:
+            yield (b'' if is_first else b',') + encode_json(chunk)[1:-1]
+            is_first = False
+            chunk = []
+    if chunk:
+        yield (b'' if is_first else b',') + encode_json(chunk)[1:-1]
+    yield b']'
+
+
+def json_object_chunks(items: dict[str, any]) -> Iterator[bytes]:
+    """
+    A JSON object, the values that are iterators of bytes, like json_array_chunks(), are streamed and the other
+    values are encoded.
+    """
+    yield b'{'
+    for item_index, (key, value) in enumerate(items.items()):
+        yield (b',' if item_index else b'') + encode_json(str(key)) + b':'
+        if isinstance(value, Iterator):
+            yield from value
+        else:
+            yield encode_json(value)
+    yield b'}'
+
+
+def column_values(rows: list[dict], key: str, default=''):
+    """
+    The values of one column of the rows, without making a list.
+    """
+    return (row.get(key, default) for row in rows)
+
+
+class JsonStreamResponse(StreamingHttpResponse):
+    def __init__(self, streaming_content: Iterator[bytes], **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(streaming_content=streaming_content, **kwargs)
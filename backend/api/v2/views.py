@@ -1,9 +1,11 @@
 from django.views import View
+from django.utils.cache import patch_vary_headers
 from django.http import JsonResponse, HttpResponse
 
 from core.settings import DEBUG
+from api.columnar_format import accepts_columns, columns_or_json_response
 from api.web2py.data_process import (graph_settings_from_request, graph_query_pipeline_web2py,
-                                     histogram_format)
+                                     graph_histogram_web2py)
 from api.v2.data_process import (normalizations_v2, available_elements_v2, available_catalogs_v2, get_star_data_v2,
                                  get_abundance_data_v2, element_parse_v2, get_norm_key, max_unique_star_names, nea_v2,
                                  get_norm_data)
@@ -103,23 +105,31 @@ class Composition(View):
 class Data(View):
     def get(self, request):
         graph_settings = graph_settings_from_request(request.GET)
+        if graph_settings['is_histogram']:
+            histogram = graph_histogram_web2py(graph_settings=graph_settings)
+            return columns_or_json_response(request, {
+                'count': histogram['count'],
+                'labels': histogram['labels'],
+                'all_hypatia': histogram['hist_all'],
+                'exo_hosts': histogram['hist_planet'],
+                'edges': histogram['edges'],
+            })
         # get more settings about how to process the data
         graph_data, labels, to_v2, from_v2, _is_loggable, _unique_star_names \
             = graph_query_pipeline_web2py(graph_settings=graph_settings)
-
-        if graph_settings['is_histogram']:
-            hist_all, hist_planet, edges, x_data \
-                = histogram_format(graph_data=graph_data, labels=labels, from_v2=from_v2,
-                                   normalize_hist=graph_settings['normalize_hist'])
-            return JsonResponse({
-                'count': len(x_data),
+        if accepts_columns(request):
+            # the columnar format has a column for each value key, instead of a list of rows
+            value_keys = list(dict.fromkeys(key for db_return in graph_data for key in db_return.keys()))
+            return columns_or_json_response(request, {
+                'counts': len(graph_data),
                 'labels': labels,
-                'all_hypatia': hist_all.tolist(),
-                'exo_hosts': hist_planet.tolist(),
-                'edges': edges.tolist(),
+                'solarnorm': get_norm_data(graph_settings['solarnorm_id']),
+                'values': {to_v2[key] if key in to_v2.keys() else key: [db_return.get(key, None)
+                                                                         for db_return in graph_data]
+                           for key in value_keys},
             })
         else:
-            return JsonResponse({
+            response = JsonResponse({
                 'counts': len(graph_data),
                 'labels': labels,
                 'solarnorm': get_norm_data(graph_settings['solarnorm_id']),
@@ -128,6 +138,9 @@ class Data(View):
                     for db_return in graph_data
                 ],
             })
+            # the same URL has the columnar response for the requests that accept it
+            patch_vary_headers(response, ('Accept',))
+            return response
 
 
 class Nea(View):
@@ -2,6 +2,7 @@ from django.views import View
 from api.db import hypatia_db, summary_db
 from django.http import JsonResponse
 from django.views.generic import TemplateView
+from api.json_stream import JsonStreamResponse, json_array_chunks
 
 
 class HomeView(TemplateView):
@@ -16,7 +17,8 @@ class HypatiaDataBaseView(View):
     throttle_scope = 'full_db'
 
     def get(self, request):
-        return JsonResponse(list(hypatia_db.find_all()), safe=False)
+        # encoded from the cursor, one chunk of documents at a time
+        return JsonStreamResponse(json_array_chunks(hypatia_db.find_all()))
 
 
 class SummaryView(View):
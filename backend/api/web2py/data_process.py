@@ -1,11 +1,15 @@
 from copy import copy
+from collections.abc import Iterator
 
 import numpy as np
 
 from hypatia.element_error import get_representative_error
+from hypatia.tools.downsample import reduce_scatter, bin_means
+from hypatia.configs.source_settings import histogram_bins
 from api.db import summary_doc, hypatia_db, number_of_catalogs
+from api.json_stream import json_array_chunks, json_object_chunks, column_values
 from hypatia.pipeline.star.aggregation import string_names_types
-from hypatia.elements import ElementID, RatioID, hydrogen_id, element_rank
+from hypatia.elements import ElementID, RatioID, hydrogen_id
 from api.v2.data_process import (get_norm_key, get_catalog_summary, total_stars, total_abundance_count,
                                  available_wds_stars, available_nea_names, available_elements_v2, normalizations_v2)
 
@@ -281,6 +285,10 @@ def graph_settings_from_request(settings: dict[str, any] | None, mode: str = Non
     else:
         return_median = str(is_none_str(statistic, default='median')).lower() == 'median'
     normalize = is_true_str(settings.get('normalize', 'false'))
+    return_x_data = is_true_str(settings.get('return_x_data', 'false'))
+    max_points = is_value_str(settings.get('max_points', None))
+    max_points = int(max_points) if isinstance(max_points, float) and max_points >= 1 else None
+    axis_log = {axis_str: is_true_str(settings.get(f'{axis_str}log', 'false')) for axis_str in ('xaxis', 'yaxis')}
     if solarnorm_id is None:
         solarnorm_id = 'lodders09'
 
@@ -356,6 +364,9 @@ def graph_settings_from_request(settings: dict[str, any] | None, mode: str = Non
         axis_mapping=axis_mapping,
         is_histogram=is_histogram,
         normalize_hist=normalize,
+        return_x_data=return_x_data,
+        max_points=max_points,
+        axis_log=axis_log,
     )
 
 
@@ -400,8 +411,8 @@ def table_settings_from_request(settings: dict[str, any] | None) -> dict[str, an
     )
 
 
-def graph_query_pipeline(graph_settings: dict[str, any]) -> list[dict[str, any]]:
-    return hypatia_db.frontend_pipeline(
+def graph_query_args(graph_settings: dict[str, any]) -> dict[str, any]:
+    return dict(
         db_formatted_names=graph_settings['db_formatted_names'],
         db_formatted_names_exclude=graph_settings['db_formatted_names_exclude'],
         elements_returned=graph_settings['elements_returned'],
@@ -424,16 +435,12 @@ def graph_query_pipeline(graph_settings: dict[str, any]) -> list[dict[str, any]]
     )
 
 
-def graph_query_pipeline_web2py(graph_settings: dict[str, any]) -> tuple[
-    list[dict[str, any]],
-    dict[str, str],
-    dict[str, str],
-    dict[str, str],
-    dict[str, bool],
-    set[str],
-]:
-    # get the data from the database
-    graph_data = graph_query_pipeline(graph_settings=graph_settings)
+def graph_query_pipeline(graph_settings: dict[str, any]) -> list[dict[str, any]]:
+    return hypatia_db.frontend_pipeline(**graph_query_args(graph_settings=graph_settings))
+
+
+def graph_axes(graph_settings: dict[str, any]) \
+        -> tuple[dict[str, str], dict[str, str], dict[str, str], dict[str, bool]]:
     # calculate the labels for the data
     labels = {}
     to_v2 = {}
@@ -458,6 +465,20 @@ def graph_query_pipeline_web2py(graph_settings: dict[str, any]) -> tuple[
             to_v2[db_field] = axis_str
             from_v2[axis_str] = db_field
         is_loggable[axis_str] = param_id in loggable_fields_v2
+    return labels, to_v2, from_v2, is_loggable
+
+
+def graph_query_pipeline_web2py(graph_settings: dict[str, any]) -> tuple[
+    list[dict[str, any]],
+    dict[str, str],
+    dict[str, str],
+    dict[str, str],
+    dict[str, bool],
+    set[str],
+]:
+    # get the data from the database
+    graph_data = graph_query_pipeline(graph_settings=graph_settings)
+    labels, to_v2, from_v2, is_loggable = graph_axes(graph_settings=graph_settings)
     unique_star_names = set()
     if any([graph_settings['planet_params_returned'], graph_settings['planet_params_match_filters'], graph_settings['planet_params_value_filters']]):
         for data_row in graph_data:
@@ -467,6 +488,42 @@ def graph_query_pipeline_web2py(graph_settings: dict[str, any]) -> tuple[
     return graph_data, labels, to_v2, from_v2, is_loggable, unique_star_names
 
 
+def downsample_outputs(outputs: dict[str, list], graph_settings: dict[str, any], is_loggable: dict[str, bool]) \
+        -> tuple[dict[str, list | np.ndarray], bool]:
+    """
+    The scatter outputs reduced to max_points or fewer with reduce_scatter(), more only when the axis extremes alone do
+    not fit, and True if any points were binned.
+    The reduced outputs have a weight column, 1 for the exact points and the number of points for each bin.
+    """
+    max_points = graph_settings['max_points']
+    if max_points is None or len(outputs.get('xaxis', [])) <= max_points or 'yaxis' not in outputs.keys():
+        return outputs, False
+    try:
+        columns = {axis_str: np.asarray(outputs[axis_str], dtype=float)
+                   for axis_str in ('xaxis', 'yaxis', 'zaxis') if axis_str in outputs.keys()}
+    except (TypeError, ValueError):
+        # string axis values are not binned
+        return outputs, False
+    axis_log = {axis_str: graph_settings['axis_log'].get(axis_str, False) and is_loggable.get(axis_str, False)
+                for axis_str in columns.keys()}
+    exact_index, point_bin, bin_count = reduce_scatter(
+        x=columns['xaxis'], y=columns['yaxis'], max_points=max_points,
+        x_log=axis_log['xaxis'], y_log=axis_log['yaxis'],
+        extra_columns=[columns['zaxis']] if 'zaxis' in columns.keys() else None)
+    if len(bin_count) == 0:
+        return outputs, False
+    names = outputs['name']
+    reduced = {'name': [names[point_index] for point_index in exact_index.tolist()]
+               + [f'{point_count} binned points' for point_count in bin_count.tolist()]}
+    for axis_str, values in columns.items():
+        # the exact values are taken from the outputs, so that null values stay None
+        axis_values = outputs[axis_str]
+        means = np.round(bin_means(values, point_bin, bin_count, is_log=axis_log[axis_str]), 4)
+        reduced[axis_str] = [axis_values[point_index] for point_index in exact_index.tolist()] + means.tolist()
+    reduced['weight'] = np.concatenate([np.ones(len(exact_index), dtype=np.int64), bin_count])
+    return reduced, True
+
+
 def histogram_format(graph_data: list[dict[str, any]], labels: dict[str, str],
                      from_v2: dict[str, str], normalize_hist: bool = False) \
         -> tuple[np.ndarray, np.ndarray, np.ndarray, list[float]]:
@@ -476,8 +533,15 @@ def histogram_format(graph_data: list[dict[str, any]], labels: dict[str, str],
     x_data = [db_return[db_field] for db_return in graph_data]
     x_data_with_planet = [db_return[db_field] for db_return in graph_data if 'nea_name' in db_return.keys()]
     # builds the histogram
-    hist_all, edges = np.histogram(x_data, bins=20)
+    hist_all, edges = np.histogram(x_data, bins=histogram_bins)
     hist_planet, edges = np.histogram(x_data_with_planet, bins=edges)
+    hist_all, hist_planet = normalize_histogram(hist_all=hist_all, hist_planet=hist_planet, labels=labels,
+                                                normalize_hist=normalize_hist)
+    return hist_all, hist_planet, edges, x_data
+
+
+def normalize_histogram(hist_all: np.ndarray, hist_planet: np.ndarray, labels: dict[str, str],
+                        normalize_hist: bool = False) -> tuple[np.ndarray, np.ndarray]:
     # get maximum point on the histogram
     max_hist_all = float(max(hist_all))
     max_hist_planet = float(max(hist_planet))
@@ -488,10 +552,36 @@ def histogram_format(graph_data: list[dict[str, any]], labels: dict[str, str],
         labels['yaxis'] = 'Relative Frequency'
     else:
         labels['yaxis'] = 'Number of Stellar Systems'
-    return hist_all, hist_planet, edges, x_data
-
-
-def table_query_from_request(settings: dict[str, any] | None = None) -> dict[str, any]:
+    return hist_all, hist_planet
+
+
+def graph_histogram_web2py(graph_settings: dict[str, any]) -> dict[str, any]:
+    """
+    The histogram of the x-axis, the bins are counted by the database and only the counts and edges are returned.
+    The x values are only returned when graph_settings['return_x_data'] is True.
+    """
+    if graph_settings.get('return_x_data', False):
+        graph_data, labels, _to_v2, from_v2, _is_loggable, _unique_star_names \
+            = graph_query_pipeline_web2py(graph_settings=graph_settings)
+        hist_all, hist_planet, edges, x_data \
+            = histogram_format(graph_data=graph_data, labels=labels, from_v2=from_v2,
+                               normalize_hist=graph_settings['normalize_hist'])
+        return dict(labels=labels, hist_all=hist_all, hist_planet=hist_planet, edges=edges, count=len(x_data),
+                    x_range=[min(x_data), max(x_data)] if x_data else None, x_data=x_data)
+    labels, _to_v2, from_v2, _is_loggable = graph_axes(graph_settings=graph_settings)
+    histogram = hypatia_db.frontend_histogram(histogram_field=from_v2['xaxis'], bins=histogram_bins,
+                                              **graph_query_args(graph_settings=graph_settings))
+    hist_all, hist_planet = normalize_histogram(hist_all=histogram['hist_all'], hist_planet=histogram['hist_planet'],
+                                                labels=labels, normalize_hist=graph_settings['normalize_hist'])
+    return dict(labels=labels, hist_all=hist_all, hist_planet=hist_planet, edges=histogram['edges'],
+                count=histogram['count'], x_range=histogram['x_range'])
+
+
+def table_query(settings: dict[str, any] | None = None) -> dict[str, any]:
+    """
+    Runs the table query and returns the rows with the columns of the response, the response is made by
+    table_query_from_request() or streamed by table_query_stream().
+    """
     # parse the settings from the request for the table query
     table_settings = table_settings_from_request(settings=settings)
     return_error = table_settings['return_error']
@@ -579,43 +669,63 @@ def table_query_from_request(settings: dict[str, any] | None = None) -> dict[str
         planet_count = None
         star_count = len(table_data)
 
-    hover_data = {}
+    hover_columns = {}
     if return_hover:
         if elements_returned:
-            hover_data.update({str(el_id): [] for el_id in elements_returned})
-            all_element = sorted(set(elements_returned), key=element_rank)
-            catalog_fields = [f'{el_id}_catalogs' for el_id in all_element]
-            for data_row in table_data:
-                for el_id, catalogs_field in zip(all_element, catalog_fields):
-                    hover_data[str(el_id)].append(data_row.get(catalogs_field, ''))
+            hover_columns.update({str(el_id): f'{el_id}_catalogs' for el_id in elements_returned})
         if stellar_params_returned:
-            hover_data.update({stellar_param: [] for stellar_param in stellar_params_returned})
-            for data_row in table_data:
-                for stellar_param in stellar_params_returned:
-                     hover_data[stellar_param].append(data_row.get(f'{stellar_param}_ref', ''))
+            hover_columns.update({stellar_param: f'{stellar_param}_ref' for stellar_param in stellar_params_returned})
         if planet_params_returned:
-            hover_data.update({planet_param: [] for planet_param in planet_params_returned})
-            for data_row in table_data:
-                for planet_param in planet_params_returned:
-                    hover_data[planet_param].append(data_row.get(f'{planet_param}_ref', ''))
-    # return the table data
-    return_data = dict(
-        body={
-            column_name: data_list for column_name, data_list in
-            zip(
-                [element_map[col_name] if col_name in element_map.keys() else col_name for col_name in all_columns],
-                zip(*[[row_data.get(col_name, '') for col_name in all_columns] for row_data in table_data])
-            )
-        },
-        hover_data=hover_data,
+            hover_columns.update({planet_param: f'{planet_param}_ref' for planet_param in planet_params_returned})
+    return dict(
+        table_data=table_data,
+        # (response column name, row key) pairs, the body has no columns when there are no rows
+        body_columns=[(element_map[col_name] if col_name in element_map.keys() else col_name, col_name)
+                      for col_name in all_columns] if table_data else [],
+        hover_columns=hover_columns,
         planet_count=planet_count,
         star_count=star_count,
+        return_targets=return_targets,
+    )
+
+
+def table_query_from_request(settings: dict[str, any] | None = None) -> dict[str, any]:
+    table_parts = table_query(settings=settings)
+    table_data = table_parts['table_data']
+    # return the table data
+    return_data = dict(
+        body={column_name: tuple(row_data.get(col_name, '') for row_data in table_data)
+              for column_name, col_name in table_parts['body_columns']},
+        hover_data={hover_name: [row_data.get(row_key, '') for row_data in table_data]
+                    for hover_name, row_key in table_parts['hover_columns'].items()},
+        planet_count=table_parts['planet_count'],
+        star_count=table_parts['star_count'],
     )
-    if return_targets:
+    if table_parts['return_targets']:
         return_data['targets'] = [data_row['target_handles'] for data_row in table_data]
     return return_data
 
 
+def table_query_stream(settings: dict[str, any] | None = None) -> Iterator[bytes]:
+    """
+    The table_query_from_request() response as JSON chunks, one column at a time. The query runs before the first
+    chunk, so errors are raised before the response starts.
+    """
+    table_parts = table_query(settings=settings)
+    table_data = table_parts['table_data']
+    return_data = dict(
+        body=json_object_chunks({column_name: json_array_chunks(column_values(table_data, col_name))
+                                 for column_name, col_name in table_parts['body_columns']}),
+        hover_data=json_object_chunks({hover_name: json_array_chunks(column_values(table_data, row_key))
+                                       for hover_name, row_key in table_parts['hover_columns'].items()}),
+        planet_count=table_parts['planet_count'],
+        star_count=table_parts['star_count'],
+    )
+    if table_parts['return_targets']:
+        return_data['targets'] = json_array_chunks(column_values(table_data, 'target_handles'))
+    return json_object_chunks(return_data)
+
+
 if __name__ == '__main__':
     from hypatia.configs.env_load import MONGO_DATABASE
     from hypatia.pipeline.star.db import HypatiaDB
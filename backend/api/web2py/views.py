@@ -2,11 +2,15 @@ from django.views import View
 from django.http import JsonResponse
 
 from core.settings import DEBUG
+from django.utils.cache import patch_vary_headers
+from api.json_stream import JsonStreamResponse
+from api.columnar_format import accepts_columns, columns_or_json_response
 from api.v2.data_process import available_catalogs_v2, representative_error
 from api.web2py.data_process import (home_data, units_and_fields_v2, stellar_param_types_v2,
                                      planet_param_types_v2, ranked_string_params, plot_norms,
-                                     graph_settings_from_request, graph_query_pipeline_web2py, histogram_format,
-                                     element_data, table_query_from_request, targets_metadata,
+                                     graph_settings_from_request, graph_query_pipeline_web2py,
+                                     graph_histogram_web2py, element_data, table_query_from_request,
+                                     table_query_stream, targets_metadata, downsample_outputs,
                                      )
 
 
@@ -52,16 +56,25 @@ def get_graph_data(request, return_targets: bool = False):
     else:
         star_count = len(graph_data)
         planet_count = None
+    outputs = {data_key: data_column for data_key, data_column in zip(
+        output_header,
+        [list(i) for i in zip(*[[data_row[data_key] for data_key in graph_keys]
+                                for data_row in graph_data])],
+    )}
+    # the targets are per point, so only the scatter outputs are reduced
+    if return_targets:
+        is_downsampled = False
+    else:
+        outputs, is_downsampled = downsample_outputs(outputs=outputs, graph_settings=graph_settings,
+                                                     is_loggable=is_loggable)
     return_data = {
         'labels': labels,
-        'outputs': {data_key: data_column for data_key, data_column in zip(
-            output_header,
-            [list(i) for i in zip(*[[data_row[data_key] for data_key in graph_keys]
-                                    for data_row in graph_data])],
-        )},
+        'outputs': outputs,
         'star_count': star_count,
         'planet_count': planet_count,
         'is_loggable': is_loggable,
+        'downsampled': is_downsampled,
+        'point_count': len(graph_data),
     }
     if return_targets:
         return_data['targets'] = [data_row['target_handles'] for data_row in graph_data]
@@ -70,12 +83,12 @@ def get_graph_data(request, return_targets: bool = False):
 
 class ScatterView(View):
     def get(self, request):
-        return JsonResponse(get_graph_data(request))
+        return columns_or_json_response(request, get_graph_data(request))
 
 
 class TargetsView(View):
     def get(self, request):
-        return JsonResponse(get_graph_data(request, return_targets=True))
+        return columns_or_json_response(request, get_graph_data(request, return_targets=True))
 
 
 class HistView(View):
@@ -83,23 +96,16 @@ class HistView(View):
         if DEBUG:
             print(request.get_full_path())
         graph_settings = graph_settings_from_request(request.GET, mode='hist')
-        # get more settings about how to process the data
-        graph_data, labels, _to_v2, from_v2, _is_loggable, _unique_star_names \
-            = graph_query_pipeline_web2py(graph_settings=graph_settings)
-        hist_all, hist_planet, edges, x_data \
-            = histogram_format(graph_data=graph_data, labels=labels, from_v2=from_v2,
-                               normalize_hist=graph_settings['normalize_hist'])
-        return JsonResponse({
-            'labels': labels,
-            'hist_all': hist_all.tolist(),
-            'hist_planet': hist_planet.tolist(),
-            'edges': edges.tolist(),
-            'x_data': x_data,
-        })
+        # the bins are counted by the database, the x values are only returned with return_x_data=true
+        return columns_or_json_response(request, graph_histogram_web2py(graph_settings=graph_settings))
 
 
 class TableView(View):
     def get(self, request):
         if DEBUG:
             print(request.get_full_path())
-        return JsonResponse(table_query_from_request(settings=request.GET))
+        if accepts_columns(request):
+            return columns_or_json_response(request, table_query_from_request(settings=request.GET))
+        response = JsonStreamResponse(table_query_stream(settings=request.GET))
+        patch_vary_headers(response, ('Accept',))
+        return response
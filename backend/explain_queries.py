@@ -0,0 +1,92 @@
+"""
+Replays a log of the website API query strings with the index advisor, see hypatia.pipeline.star.index_advisor, and
+prints the slowest pipeline shapes and the suggested indexes.
+
+Each line of the log has one query, the API path that the API prints in DEBUG mode, like
+/hypatia/api/web2py/scatter/?mode=scatter&xaxis1=Fe&..., or only the query string. The path sets the request type,
+scatter, targets, hist, or table, and a query string without a path is replayed as a --mode request.
+"""
+import re
+from urllib.parse import urlsplit, parse_qsl
+
+api_path_pattern = re.compile(r'\S*/web2py/(scatter|targets|hist|table)/?\S*')
+
+
+def parse_log_line(line: str, default_mode: str = 'scatter') -> tuple[str, dict[str, str]] | None:
+    """
+    The request type and the settings for one line of the log, None for empty lines and comments.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    found = api_path_pattern.search(line)
+    if found is None:
+        mode = default_mode
+        query_string = line.split('?', 1)[-1]
+    else:
+        mode = found.group(1)
+        query_string = urlsplit(found.group(0)).query
+    # like the QueryDict of a request, the last value is used for repeated keys
+    return mode, dict(parse_qsl(query_string, keep_blank_values=True))
+
+
+def replay_query(mode: str, settings: dict[str, str]):
+    from api.web2py.data_process import (graph_settings_from_request, graph_query_pipeline_web2py,
+                                         graph_histogram_web2py, table_query_from_request)
+    if mode == 'table':
+        table_query_from_request(settings=settings)
+    elif mode == 'hist':
+        graph_histogram_web2py(graph_settings=graph_settings_from_request(settings, mode='hist'))
+    else:
+        graph_settings = graph_settings_from_request(settings, mode='scatter')
+        graph_settings['return_targets'] = mode == 'targets'
+        graph_query_pipeline_web2py(graph_settings=graph_settings)
+
+
+def replay_log(log_file: str, default_mode: str = 'scatter', use_plot_view: bool = True, top: int = 10,
+               report_file: str = None):
+    from api.db import hypatia_db
+    # every query goes to the database, so that the advisor sees it
+    hypatia_db.query_cache = None
+    hypatia_db.columnar_engine = None
+    if not use_plot_view:
+        hypatia_db.plot_view_requested = False
+        hypatia_db.plot_view = None
+    index_advisor = hypatia_db.enable_index_advisor(report_file=report_file)
+    replayed_count = 0
+    failed_count = 0
+    with open(log_file, 'r') as f:
+        for line in f:
+            parsed = parse_log_line(line, default_mode=default_mode)
+            if parsed is None:
+                continue
+            try:
+                replay_query(*parsed)
+            except (ValueError, KeyError, TypeError) as error:
+                failed_count += 1
+                print(f'Failed to replay {line.strip()}: {error}')
+            else:
+                replayed_count += 1
+    print(f'Replayed {replayed_count} queries from {log_file}, {failed_count} failed.')
+    index_advisor.print_summary(count=top)
+    index_advisor.write()
+    return index_advisor
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay a log of API query strings and explain the slowest '
+                                                 'pipeline shapes.')
+    parser.add_argument('log_file', help='The log file, one API path or query string per line.')
+    parser.add_argument('--mode', dest='default_mode', default='scatter',
+                        choices=['scatter', 'targets', 'hist', 'table'],
+                        help='The request type for the lines without an API path, default is scatter.')
+    parser.add_argument('--top', type=int, default=10, help='The number of slowest shapes to print, default is 10.')
+    parser.add_argument('--nested', action='store_true', default=False,
+                        help='Query the nested hypatiaDB collection instead of the plot view.')
+    parser.add_argument('--report', dest='report_file', default=None,
+                        help='The JSON report file, default is a new file in the run reports directory.')
+    args = parser.parse_args()
+    replay_log(log_file=args.log_file, default_mode=args.default_mode, use_plot_view=not args.nested,
+               top=args.top, report_file=args.report_file)
@@ -10,9 +10,14 @@ from pymongo.results import DeleteResult, InsertOneResult, InsertManyResult, Upd
 from pymongo.errors import ServerSelectionTimeoutError, CollectionInvalid, OperationFailure
 
 
+from hypatia.tools.instrument import span
+from hypatia.configs.source_settings import validation_sample_size
 from hypatia.configs.env_load import connection_string, CLIENT_TLS
 
 is_read_only_user = False
+# collection name suffixes for the staged publish, see BaseCollection.swap_in()
+staging_suffix = '_staging'
+previous_suffix = '_previous'
 
 
 class BaseCollection:
@@ -48,7 +53,10 @@ class BaseCollection:
     def create_indexes(self):
         self.collection_add_index(index_name='_id', unique=True)
 
-    def create_collection(self):
+    def create_collection(self, indexes: bool = True):
+        """
+        With indexes=False, the indexes are not created, see finish_bulk_load().
+        """
         global is_read_only_user
         if not is_read_only_user:
             try:
@@ -68,11 +76,100 @@ class BaseCollection:
                     print(f'Created collection {self.collection_name} in database {self.db_name}')
                 # finish the setup
                 self.collection = self.db[self.collection_name]
-                self.create_indexes()
+                if indexes:
+                    self.create_indexes()
 
-    def reset(self):
+    def reset(self, indexes: bool = True):
         self.drop_collection()
-        self.create_collection()
+        self.create_collection(indexes=indexes)
+
+    def staging_collection(self, bulk_load: bool = False) -> 'BaseCollection':
+        """
+        An empty collection of the same class, with its validator and indexes, to load into before swap_in().
+        With bulk_load=True, the indexes are built by finish_bulk_load() after the documents are loaded.
+        """
+        staging = self.__class__(collection_name=f'{self.collection_name}{staging_suffix}', db_name=self.db_name,
+                                 verbose=self.verbose)
+        staging.reset(indexes=not bulk_load)
+        return staging
+
+    def invalid_sample_ids(self, sample_size: int = validation_sample_size) -> list:
+        """
+        The _id of the documents in a random sample of sample_size that do not pass the validator.
+        """
+        return [doc['_id'] for doc in self.collection.aggregate([{'$sample': {'size': sample_size}},
+                                                                  {'$match': {'$nor': [self.validator]}},
+                                                                  {'$project': {'_id': 1}}])]
+
+    def finish_bulk_load(self, source: 'BaseCollection' = None, sample_size: int = validation_sample_size):
+        """
+        Builds the indexes, and those of the source collection when it is given, once after a load that used
+        bypass_document_validation, and then checks a sample of the documents against the validator.
+        """
+        with span('index_build'):
+            self.create_indexes()
+            if source is not None:
+                self.copy_indexes_and_validator(source)
+        with span('validation_sample') as this_span:
+            invalid_ids = self.invalid_sample_ids(sample_size=sample_size)
+            this_span.items = sample_size
+        if invalid_ids:
+            raise ValueError(f'{len(invalid_ids)} documents in a sample of {sample_size} from '
+                             f'{self.db_name}.{self.collection_name} do not pass the validator, '
+                             f'for example: {invalid_ids[:10]}')
+        if self.verbose:
+            print(f'Indexes built and a sample of {sample_size} documents validated for '
+                  f'{self.db_name}.{self.collection_name}')
+
+    def swap_in(self, staging: 'BaseCollection', keep_previous: bool = True):
+        """
+        Replaces this collection with a loaded staging collection. The live collection is first copied, on the server,
+        to the previous collection for rollback(), so the swap is a single renameCollection with dropTarget=True and
+        readers never see an empty or partly loaded collection.
+        """
+        start_time = time.time()
+        if keep_previous and self.collection_exists():
+            previous_name = f'{self.collection_name}{previous_suffix}'
+            # created with the validator and indexes, $out keeps these when it replaces the collection
+            self.__class__(collection_name=previous_name, db_name=self.db_name, verbose=self.verbose)
+            # the live documents may have been bulk loaded without validation, see finish_bulk_load()
+            self.collection.aggregate([{'$match': {}}, {'$out': previous_name}], bypassDocumentValidation=True)
+        staging.collection.rename(self.collection_name, dropTarget=True)
+        self.collection = self.db[self.collection_name]
+        if self.verbose:
+            print(f'Swapped {staging.collection_name} in as {self.db_name}.{self.collection_name} '
+                  f'in {time.time() - start_time:.2f} seconds')
+
+    def rollback(self):
+        """
+        Swaps the previous collection, saved by swap_in(), back in.
+        """
+        previous_name = f'{self.collection_name}{previous_suffix}'
+        if previous_name not in self.db.list_collection_names():
+            raise ValueError(f'No previous collection {self.db_name}.{previous_name} to roll back to.')
+        self.db[previous_name].rename(self.collection_name, dropTarget=True)
+        self.collection = self.db[self.collection_name]
+        if self.verbose:
+            print(f'Rolled back {self.db_name}.{self.collection_name} to {previous_name}')
+
+    def collection_options(self) -> dict:
+        for collection_info in self.db.list_collections(filter={'name': self.collection_name}):
+            return collection_info.get('options', {})
+        return {}
+
+    def copy_indexes_and_validator(self, source: 'BaseCollection'):
+        """
+        Adds the validator and any indexes of the source collection that this collection does not already have.
+        """
+        validator = source.collection_options().get('validator')
+        if validator is not None and validator != self.collection_options().get('validator'):
+            self.db.command('collMod', self.collection_name, validator=validator)
+        existing_indexes = self.collection.index_information()
+        for index_name, index_info in source.collection.index_information().items():
+            if index_name not in existing_indexes:
+                index_options = {key: value for key, value in index_info.items() if key not in {'key', 'v', 'ns'}}
+                with span(f'index.{index_name}'):
+                    self.collection.create_index(index_info['key'], name=index_name, **index_options)
 
     def test_connection(self, tries: int = 10):
         count = 0
@@ -113,19 +210,22 @@ class BaseCollection:
         return self.db.drop()
 
     def collection_add_index(self, index_name: str, ascending: bool = True, unique: bool = False):
-        if unique and index_name != '_id':
-            self.collection.create_index([(index_name, 1 if ascending else -1)], unique=unique)
-        else:
-            self.collection.create_index([(index_name, 1 if ascending else -1)])
+        with span(f'index.{index_name}'):
+            if unique and index_name != '_id':
+                self.collection.create_index([(index_name, 1 if ascending else -1)], unique=unique)
+            else:
+                self.collection.create_index([(index_name, 1 if ascending else -1)])
 
     def collection_compound_index(self, index_dict: dict[str, int], unique: bool = False):
-        self.collection.create_index(list(index_dict.items()), unique=unique)
+        with span(f'index.{"_".join(index_dict.keys())}'):
+            self.collection.create_index(list(index_dict.items()), unique=unique)
 
     def add_one(self, doc: dict | list | float | str | int) -> InsertOneResult:
         return self.collection.insert_one(doc)
 
-    def add_many(self, docs: list[dict | list | float | str | int] | Cursor) -> InsertManyResult:
-        return self.collection.insert_many(docs)
+    def add_many(self, docs: list[dict | list | float | str | int] | Cursor,
+                 bypass_validation: bool = False) -> InsertManyResult:
+        return self.collection.insert_many(docs, bypass_document_validation=bypass_validation)
 
     def find_one(self, query: dict | None = None) -> dict:
         if query is None:
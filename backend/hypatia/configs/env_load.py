@@ -29,6 +29,8 @@ INTERACTIVE_STARNAMES = os.environ.get('INTERACTIVE_STARNAMES', 'True').lower()
 CONNECTION_STRING = os.environ.get('CONNECTION_STRING', 'none')
 DEBUG = str_is_true(os.environ.get("DEBUG", "true"))
 CLIENT_TLS = str_is_true(os.environ.get('CLIENT_TLS', 'true'))
+COLUMNAR_ENGINE = str_is_true(os.environ.get('COLUMNAR_ENGINE', 'false'))
+INDEX_ADVISOR = str_is_true(os.environ.get('INDEX_ADVISOR', 'false'))
 if CONNECTION_STRING.lower() in {None, 'none', 'null', ''}:
     CONNECTION_STRING = None
 
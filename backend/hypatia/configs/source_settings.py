@@ -11,6 +11,21 @@ simbad_batch_size = 1000
 default_reset_time_seconds = 60 * 60 * 24 * 365.24 * 3  # 3 years
 no_simbad_reset_time_seconds = 60 * 60 * 24 * 365.24  # 1 year
 
+# hypatia database export
+export_chunk_size = 500
+export_upload_threads = 2
+# the number of documents that are checked against the validator after a bulk load
+validation_sample_size = 1000
+# publishing, used when the documents are streamed between clusters
+copy_batch_size = 1000
+copy_cursor_threads = 4
+
+# frontend_pipeline result cache, see hypatia.pipeline.star.query_cache
+query_cache_size = 256
+query_cache_version_check_s = 30.0
+# the number of bins for the website histograms, see HypatiaDB.frontend_histogram()
+histogram_bins = 20
+
 # nea database
 nea_ref = 'NASA Exoplanet Archive'
 known_micro_names = {'kmt', 'ogle', 'moa', 'k2'}
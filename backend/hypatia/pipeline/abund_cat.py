@@ -1,6 +1,7 @@
 import numpy as np
 
 from hypatia.elements import ElementID
+from hypatia.sources.catalogs.solar_norm import solar_norm
 from hypatia.sources.catalogs.catalogs import solar_norm_dict
 
 
@@ -44,3 +45,37 @@ class CatalogData:
                          for element in overlapping_elements}
             self.__setattr__(norm_key, SingleNorm(norm_key, norm_data))
             self.normalizations.add(norm_key)
+
+
+def normalize_catalogs(catalogs: list[CatalogData], norm_keys: list[str]):
+    """
+    The same as calling CatalogData.normalize(norm_key) for every catalog and norm_key, but all the abundances are put
+    in a single (catalog, element) array so that each normalization is one vectorized subtraction of a solar vector.
+    """
+    element_ids = sorted(set().union(*[catalog.available_abundances for catalog in catalogs]), key=str)
+    element_index = {element_id: column_index for column_index, element_id in enumerate(element_ids)}
+    values = np.zeros((len(catalogs), len(element_ids)), dtype=float)
+    has_value = np.zeros((len(catalogs), len(element_ids)), dtype=bool)
+    for row_index, catalog in enumerate(catalogs):
+        for element_id in catalog.available_abundances:
+            values[row_index, element_index[element_id]] = catalog.__getattribute__(str(element_id))
+            has_value[row_index, element_index[element_id]] = True
+    # one solar vector for every normalization that is used, including the original normalization of each catalog
+    solar_keys = sorted({catalog.original_catalog_norm for catalog in catalogs} | set(norm_keys) - {'original'})
+    solar_key_index = {solar_key: row_index for row_index, solar_key in enumerate(solar_keys)}
+    solar_values, has_solar_value = solar_norm.solar_vectors(element_ids=element_ids, norm_keys=solar_keys)
+    original_rows = np.array([solar_key_index[catalog.original_catalog_norm] for catalog in catalogs], dtype=int)
+    for norm_key in norm_keys:
+        if norm_key == 'original':
+            solar_rows = original_rows
+        else:
+            solar_rows = np.full(len(catalogs), solar_key_index[norm_key], dtype=int)
+        normalized = np.around(values - solar_values[solar_rows], decimals=3)
+        overlapping = has_value & has_solar_value[solar_rows]
+        for row_index in np.flatnonzero(overlapping.any(axis=1)):
+            catalog = catalogs[row_index]
+            column_indexes = np.flatnonzero(overlapping[row_index])
+            norm_data = dict(zip([element_ids[column_index] for column_index in column_indexes],
+                                 normalized[row_index, column_indexes]))
+            catalog.__setattr__(norm_key, SingleNorm(norm_key, norm_data))
+            catalog.normalizations.add(norm_key)
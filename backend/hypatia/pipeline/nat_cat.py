@@ -1,21 +1,28 @@
 import os
+import uuid
 import pickle
 
 from hypatia.sources.xhips import Xhip
 from hypatia.sources.gaia.ops import GaiaLib
 from hypatia.object_params import SingleParam
 from hypatia.tools.table_read import row_dict
+from hypatia.tools.task_graph import TaskGraph
 from hypatia.pipeline.star.all import AllStarData
 from hypatia.configs.source_settings import hacked
 from hypatia.sources.tic.ops import get_hy_tic_data
 from hypatia.tools.color_text import file_name_text
+from hypatia.pipeline.star.single import SingleStar
 from hypatia.sources.pastel.ops import get_pastel_data
 from hypatia.pipeline.star.output import OutputStarData
+from hypatia.tools.instrument import span, instrumented
 from hypatia.sources.catalogs.solar_norm import SolarNorm
+from hypatia.pipeline.params.star import SingleStarParams
 from hypatia.sources.catalogs.catalogs import get_catalogs
 from hypatia.sources.simbad.batch import get_star_data_batch
 from hypatia.pipeline.star.targets import read_all_targets_files
 from hypatia.sources.simbad.ops import get_main_id, get_star_data
+from hypatia.tools.fork_pool import fork_map, fork_shared, get_processes
+from hypatia.tools.checkpoint import run_key, save_checkpoint, last_good_checkpoint, clear_checkpoints
 from hypatia.configs.file_paths import working_dir, ref_dir, abundance_dir, pickle_nat, default_catalog_file
 
 
@@ -23,14 +30,118 @@ def load_catalog_query():
     return pickle.load(open(pickle_nat, 'rb'))
 
 
+def single_star_params(single_star: SingleStar, pastel_data: dict | None, gaia_params: dict | None,
+                       xhip: Xhip | None, get_exo_params: bool, tic_params: dict | None, get_simbad_params: bool):
+    """
+    Updates single_star.params from all the parameter sources, a source that is None (or False) is skipped. The Gaia
+    and TIC parameters are prefetched for all the stars (see prefetch_params_sources), the sources are merged here
+    in priority order.
+    """
+    main_star_id = single_star.star_reference_name
+    # Star Parameters from the Pastel Catalog (effective temperature and Log values for surface gravity)
+    if pastel_data is not None:
+        if main_star_id in pastel_data.keys():
+            pastel_record = pastel_data[main_star_id]
+            single_star.pastel_params(pastel_record)
+    # Star Parameters from the Gaia Catalog
+    if gaia_params is not None:
+        single_star.gaia_params(gaia_params[main_star_id])
+    # Stellar Parameters from the Exoplanet Catalog
+    if get_exo_params:
+        single_star.exo_params()
+    # Stellar Parameters from the Tess Input Catalog
+    if tic_params is not None:
+        requested_tic = tic_params[main_star_id]
+        if requested_tic is not None:
+            single_star.params.update_params(requested_tic, overwrite_existing=False)
+    # add SIMBAD params
+    if get_simbad_params:
+        single_star.simbad_params(overwrite_existing=False)
+    # Parameters for the Hipparcos Survey
+    if xhip is not None:
+        if 'hip' in single_star.simbad_doc.keys():
+            hip_name = single_star.simbad_doc['hip']
+            xhip_params_dict = xhip.get_xhip_data(hip_name=hip_name)
+            if xhip_params_dict is not None:
+                single_star.xhip_params(xhip_params_dict)
+    # calculated parameters based on the available parameters
+    single_star.params.calculated_params()
+
+
+def prefetch_gaia_params(gaia_lib: GaiaLib, main_star_ids: list[str]) -> dict[str, dict]:
+    return {main_star_id: gaia_lib.get_object_params(main_star_id)[1] for main_star_id in main_star_ids}
+
+
+def prefetch_tic_params(main_star_ids: list[str]) -> dict[str, dict | None]:
+    return {main_star_id: get_hy_tic_data(main_star_id) for main_star_id in main_star_ids}
+
+
+def prefetch_params_sources(main_star_ids: list[str], xhip: Xhip, get_gaia_params: bool = True,
+                            get_pastel_params: bool = True, get_tic_params: bool = True,
+                            get_hipparcos_params: bool = True, verbose: bool = True) -> dict[str, any]:
+    """
+    Loads the parameter sources concurrently, the independent loads (PASTEL, Gaia, TIC, XHip) are run at the same
+    time, and the per-star Gaia lookups start when the Gaia reference data is loaded. A source that is not requested
+    is None.
+    """
+    task_graph = TaskGraph(verbose=verbose)
+    if get_pastel_params:
+        task_graph.add('pastel_data', instrumented('params_source.pastel', items_from='return')(
+            lambda: get_pastel_data(verbose=verbose)))
+    if get_gaia_params:
+        task_graph.add('gaia_lib', instrumented('params_source.gaia_load')(lambda: GaiaLib(verbose=verbose)))
+        task_graph.add('gaia_params', instrumented('params_source.gaia', items_from='return')(
+            lambda gaia_lib: prefetch_gaia_params(gaia_lib, main_star_ids)), depends_on=['gaia_lib'])
+    if get_tic_params:
+        task_graph.add('tic_params', instrumented('params_source.tic', items_from='return')(
+            lambda: prefetch_tic_params(main_star_ids)))
+    if get_hipparcos_params:
+        @instrumented('params_source.xhip')
+        def load_xhip():
+            if xhip.ref_data is None:
+                xhip.load(verbose=verbose)
+            return xhip
+        task_graph.add('xhip', load_xhip)
+    results = task_graph.run()
+    return {source: results.get(source, None) for source in ['pastel_data', 'gaia_params', 'tic_params', 'xhip']}
+
+
+def star_params_chunk(star_range: range) -> list[tuple[int, SingleStarParams]]:
+    """
+    Process pool worker for NatCat.get_params(), only the stellar parameters are sent back to the parent.
+    """
+    params_sources = {key: value for key, value in fork_shared.items() if key != 'star_list'}
+    star_params = []
+    for star_index in star_range:
+        single_star = fork_shared['star_list'][star_index]
+        single_star_params(single_star=single_star, **params_sources)
+        star_params.append((star_index, single_star.params))
+    return star_params
+
+
+# the stages of a NatCat run in order, the 'stats' stage also adds the website targets
+nat_cat_stages = ['catalogs', 'abundances', 'exoplanets', 'targets', 'gaia', 'params', 'stats']
+
+
 class NatCat:
+    # options that are taken from the current run, not from a checkpoint
+    run_options = {'verbose', 'catalogs_verbose', 'processes', 'catalogs_from_scratch', 'refresh_exo_data',
+                   'checkpoints'}
 
     def __init__(self, params_list_for_stats=None, star_types_for_stats=None,
                  catalogs_from_scratch=True, verbose=False, catalogs_verbose=True,
                  get_abundance_data=True, get_exo_data=False, refresh_exo_data=False,
                  target_list: list[str] | list[tuple[str, ...]] | str | os.PathLike | None = None,  fast_update_gaia=False,
-                 catalogs_file_name=None, abundance_data_path=None):
+                 catalogs_file_name=None, abundance_data_path=None, processes=1,
+                 checkpoints=False, resume=False):
+        """
+        With checkpoints=True, the state is saved after each stage in nat_cat_stages. With resume=True (which also
+        saves checkpoints), the run starts after the last stage with a good checkpoint from a run with the same
+        settings, or from the beginning if no checkpoint is found.
+        """
         self.verbose = verbose
+        # processes=1 is the serial mode for debugging, processes=None uses all the available CPUs
+        self.processes = processes
         self.catalogs_verbose = catalogs_verbose
 
         self.catalogs_from_scratch = catalogs_from_scratch
@@ -62,7 +173,7 @@ class NatCat:
         self.catalog_dict = None
         self.output_norm = None
 
-        self.star_data = AllStarData(verbose=self.verbose)
+        self.star_data = AllStarData(verbose=self.verbose, processes=self.processes)
         self.init_catalogs = set()
         self.unreferenced_stars = None
 
@@ -71,24 +182,63 @@ class NatCat:
         self.solar_norm_dict = sn()
         self.norm_keys = set(self.solar_norm_dict.keys())
 
-        self.star_data = AllStarData()
-        if get_abundance_data:
-            self.catalog_data()
-        if get_exo_data:
-            self.xo_data()
+        self.star_data = AllStarData(processes=self.processes)
         self.targets_requested = self.targets_found = self.targets_not_found = None
-        if target_list is not None:
-            self.target_data(target_list)
-        if fast_update_gaia:
-            self.star_data.fast_update_gaia()
-        self.get_params()
-        self.stats_for_star_data()
-        self.stats = self.star_data.stats
-        self.star_data.find_available_attributes()
+        self.stats = None
         self.target_web_data = None
-        self.get_web_targets()
+        # the run settings that change the data, checkpoints are only resumed by a run with the same settings
+        self.checkpoints = checkpoints or resume
+        self.checkpoint_key = run_key(self.catalogs_file_name, self.abundance_data_path, get_abundance_data,
+                                      get_exo_data, target_list, fast_update_gaia,
+                                      self.params_list_for_stats, self.star_types_for_stats)
+        # changes each time that a stage is computed, see run_stages()
+        self.checkpoint_generation = None
+        stage_steps = {
+            'catalogs': self.load_catalogs if get_abundance_data else None,
+            'abundances': self.link_abundances if get_abundance_data else None,
+            'exoplanets': self.xo_data if get_exo_data else None,
+            'targets': (lambda: self.target_data(target_list)) if target_list is not None else None,
+            'gaia': (lambda: self.star_data.fast_update_gaia()) if fast_update_gaia else None,
+            'params': self.get_params,
+            'stats': self.finish_star_data,
+        }
+        self.run_stages(stage_steps=stage_steps, resume=resume)
+
+    def run_stages(self, stage_steps: dict, resume: bool = False):
+        resume_stage = None
+        if resume:
+            resume_stage, state = last_good_checkpoint(stages=nat_cat_stages, prefix='nat_cat',
+                                                       key=self.checkpoint_key)
+            if resume_stage is None:
+                if self.verbose:
+                    print('No NatCat checkpoint found for these settings, starting from the beginning.\n')
+            else:
+                if self.verbose:
+                    print(f'Resuming NatCat after the {resume_stage} stage.\n')
+                self.__dict__.update(state)
+                self.star_data.processes = self.processes
+        elif self.checkpoints:
+            clear_checkpoints(stages=nat_cat_stages, prefix='nat_cat')
+        start_index = 0 if resume_stage is None else nat_cat_stages.index(resume_stage) + 1
+        if any(stage_steps[stage] is not None for stage in nat_cat_stages[start_index:]):
+            # the checkpoints of the later pipeline steps are only used with the data from this generation
+            self.checkpoint_generation = uuid.uuid4().hex
+        for stage in nat_cat_stages[start_index:]:
+            stage_step = stage_steps[stage]
+            if stage_step is None:
+                continue
+            with span(f'nat_cat.{stage}'):
+                stage_step()
+            if self.checkpoints:
+                save_checkpoint(state={key: value for key, value in self.__dict__.items()
+                                       if key not in self.run_options},
+                                stage=stage, prefix='nat_cat', key=self.checkpoint_key, verbose=self.verbose)
 
     def catalog_data(self):
+        self.load_catalogs()
+        self.link_abundances()
+
+    def load_catalogs(self):
         if self.verbose:
             print('\nLoading and mapping the stellar abundance data...')
             print('  Loading Abundance catalog data...')
@@ -105,6 +255,9 @@ class NatCat:
                 print('      Saving complete.')
         if self.verbose:
             print('    Abundance data load and processed.')
+
+    def link_abundances(self):
+        if self.verbose:
             print('  Linking abundance data to stellar objects...')
         self.init_catalogs = set(self.catalog_dict.keys())
         self.star_data.get_abundances(all_catalogs=self.catalog_dict)
@@ -144,49 +297,40 @@ class NatCat:
                    get_tic_params: bool = True, get_hipparcos_params: bool = True, get_simbad_params: bool = True):
         if self.verbose:
             print('Acquiring stellar parameter data...')
-        gaia_lib = None
-        pastel_data = None
-        print_int = max(round(len(self.star_data) / 20), 1)
-        for star_index, single_star in list(enumerate(self.star_data)):
-            if self.verbose and star_index % print_int == 0:
-                print(f'  {star_index:6} of {len(self.star_data)} stars processed.')
-            main_star_id = single_star.star_reference_name
-            # Star Parameters from the Pastel Data Set
-            if get_pastel_params:
-                # Star Parameters from the Pastel Catalog (effective temperature and Log values for surface gravity)
-                if pastel_data is None:
-                    pastel_data = get_pastel_data(verbose=self.verbose)
-                if main_star_id in pastel_data.keys():
-                    pastel_record = pastel_data[main_star_id]
-                    single_star.pastel_params(pastel_record)
-            # Star Parameters from the Gaia Catalog
-            if get_gaia_params:
-                if gaia_lib is None:
-                    gaia_lib = GaiaLib(verbose=self.verbose)
-                _attr_name, gaia_params_dict = gaia_lib.get_object_params(main_star_id)
-                single_star.gaia_params(gaia_params_dict)
-            # Stellar Parameters from the Exoplanet Catalog
-            if get_exo_params:
-                single_star.exo_params()
-            # Stellar Parameters from the Tess Input Catalog
-            if get_tic_params:
-                requested_tic = get_hy_tic_data(single_star.star_reference_name)
-                if requested_tic is not None:
-                    single_star.params.update_params(requested_tic, overwrite_existing=False)
-            # add SIMBAD params
-            if get_simbad_params:
-                single_star.simbad_params(overwrite_existing=False)
-            # Parameters for the Hipparcos Survey
-            if get_hipparcos_params:
-                if self.xhip.ref_data is None:
-                    self.xhip.load(verbose=self.verbose)
-                if 'hip' in single_star.simbad_doc.keys():
-                    hip_name = single_star.simbad_doc['hip']
-                    xhip_params_dict = self.xhip.get_xhip_data(hip_name=hip_name)
-                    if xhip_params_dict is not None:
-                        single_star.xhip_params(xhip_params_dict)
-            # calculated parameters based on the available parameters
-            single_star.params.calculated_params()
+        star_list = list(self.star_data)
+        # the read-only source data is prefetched concurrently, the worker processes inherit it through fork
+        params_sources = {
+            'pastel_data': None,
+            'gaia_params': None,
+            'xhip': None,
+            'tic_params': None,
+        }
+        if star_list:
+            params_sources = prefetch_params_sources(main_star_ids=[single_star.star_reference_name
+                                                                    for single_star in star_list],
+                                                     xhip=self.xhip,
+                                                     get_gaia_params=get_gaia_params,
+                                                     get_pastel_params=get_pastel_params,
+                                                     get_tic_params=get_tic_params,
+                                                     get_hipparcos_params=get_hipparcos_params,
+                                                     verbose=self.verbose)
+        params_sources['get_exo_params'] = get_exo_params
+        params_sources['get_simbad_params'] = get_simbad_params
+        processes = get_processes(self.processes)
+        with span('params_merge', items=len(star_list)):
+            if processes == 1:
+                print_int = max(round(len(star_list) / 20), 1)
+                for star_index, single_star in enumerate(star_list):
+                    if self.verbose and star_index % print_int == 0:
+                        print(f'  {star_index:6} of {len(star_list)} stars processed.')
+                    single_star_params(single_star=single_star, **params_sources)
+            else:
+                if self.verbose:
+                    print(f'  {len(star_list)} stars split across {processes} processes.')
+                params_sources['star_list'] = star_list
+                for star_index, star_params in fork_map(worker=star_params_chunk, shared=params_sources,
+                                                        total=len(star_list), processes=processes):
+                    star_list[star_index].params = star_params
 
         # hacked parameters to add at the last minute (from config.py)
         for string_name in hacked.keys():
@@ -195,11 +339,17 @@ class NatCat:
             simbad_doc = get_star_data(test_name=string_name, test_origin='hacked')
             main_star_id = simbad_doc['_id']
             if main_star_id in self.star_data.star_names:
-                this_star = self.star_data.__getattribute__(simbad_doc['attr_name'])
+                this_star = self.star_data.get_star(main_star_id)
                 this_star.params.update_param(param, hacked_single_param, overwrite_existing=False)
         if self.verbose:
             print('Stellar parameters acquired, reference is up-to-data, and calculations completed\n')
 
+    def finish_star_data(self):
+        self.stats_for_star_data()
+        self.stats = self.star_data.stats
+        self.star_data.find_available_attributes()
+        self.get_web_targets()
+
     def get_unreferenced_stars(self):
         self.unreferenced_stars = {key: self.catalog_dict[key].unreferenced_stars for key in self.catalog_dict.keys()
                                    if self.catalog_dict[key].unreferenced_stars != []}
@@ -315,3 +465,22 @@ class NatCat:
             single_catalog = self.catalog_dict[catalog_name]
             single_catalog.write_catalog(target='raw', update_catalog_list=False,
                                          add_to_git=False, output_dir=output_dir)
+
+
+if __name__ == '__main__':
+    import time
+    # benchmark of a full NatCat construction, and of AllStarData iteration with and without the star index
+    start_time = time.perf_counter()
+    nat_cat = NatCat(catalogs_from_scratch=False, verbose=True, get_abundance_data=True, get_exo_data=True)
+    construction_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    indexed_stars = list(nat_cat.star_data)
+    index_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    resolved_stars = [nat_cat.star_data.__getattribute__(get_star_data(test_name=star_name)['attr_name'])
+                      for star_name in sorted(nat_cat.star_data.star_names)]
+    resolved_seconds = time.perf_counter() - start_time
+    assert indexed_stars == resolved_stars
+    print(f'NatCat construction: {construction_seconds:.2f} s for {len(nat_cat.star_data)} stars')
+    print(f'  one iteration with the star index:      {index_seconds:.4f} s')
+    print(f'  one iteration with get_star_data names: {resolved_seconds:.4f} s')
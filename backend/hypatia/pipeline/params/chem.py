@@ -1,3 +1,5 @@
+from itertools import chain
+
 import numpy as np
 
 from hypatia.elements import ElementID
@@ -20,6 +22,9 @@ class ElementStats:
     def add_value(self, value: float, catalog: str):
         value = float(value)
         formatted_value = np.around(value, decimals=3)
+        self.add_formatted_value(formatted_value, catalog)
+
+    def add_formatted_value(self, formatted_value: np.float64, catalog: str):
         value_linear = 10.0**(formatted_value)
         self.value_list.append(formatted_value)
         self.value_list_linear.append(value_linear)
@@ -71,11 +76,111 @@ class ReducedAbundances:
     def __getitem__(self, item):
         return self.__getattribute__(str(item))
 
-    def add_abundance(self, abundance_record, element_name, catalog):
+    def get_element_stats(self, element_name) -> ElementStats:
         if element_name not in self.available_abundances:
             self.__setattr__(str(element_name), ElementStats(element_name))
             self.available_abundances.add(element_name)
-        self.__getattribute__(str(element_name)).add_value(abundance_record, catalog)
+        return self.__getattribute__(str(element_name))
+
+    def add_abundance(self, abundance_record, element_name, catalog):
+        self.get_element_stats(element_name).add_value(abundance_record, catalog)
 
     def calc(self):
         [self.__getattribute__(str(element_name)).calc_stats() for element_name in self.available_abundances]
+
+    def all_element_stats(self) -> list[ElementStats]:
+        return [self.__getattribute__(str(element_name)) for element_name in self.available_abundances]
+
+
+def add_abundances_batch(abundance_records: list[tuple[ReducedAbundances, ElementID, str, float]]):
+    """
+    Add many abundance records, each of the form (reduced_abundances, element_name, catalog, value), at once. The
+    results are the same as calling ReducedAbundances.add_abundance() for each record, but the rounding of the values
+    is done as a single array operation.
+    """
+    formatted_values = np.around(np.fromiter((float(value) for *_, value in abundance_records), dtype=float,
+                                             count=len(abundance_records)), decimals=3)
+    for (reduced_abundances, element_name, catalog, _value), formatted_value \
+            in zip(abundance_records, formatted_values):
+        reduced_abundances.get_element_stats(element_name).add_formatted_value(formatted_value, catalog)
+
+
+def calc_stats_batch(element_stats_list: list[ElementStats]):
+    """
+    Calculate the statistics of many ElementStats objects at once, with results that match calling
+    ElementStats.calc_stats() on each object.
+
+    The values for every (star, normalization, element) group are concatenated and the groups are bucketed by their
+    number of values. Each bucket is a contiguous 2D array, so every statistic is a single row-wise reduction. Row-wise
+    reductions use the same pairwise summation as np.mean() and np.std() on a single list, this is what keeps the mean,
+    median (in linear space), and std values bit-for-bit identical to the per-object calculation.
+    """
+    stats_count = len(element_stats_list)
+    lengths = np.fromiter((len(el_stats.value_list) for el_stats in element_stats_list), dtype=int, count=stats_count)
+    values = np.fromiter(chain.from_iterable(el_stats.value_list for el_stats in element_stats_list),
+                         dtype=float, count=lengths.sum())
+    values_linear = np.fromiter(chain.from_iterable(el_stats.value_list_linear for el_stats in element_stats_list),
+                                dtype=float, count=lengths.sum())
+    catalog_list = list(chain.from_iterable(el_stats.catalog_list for el_stats in element_stats_list))
+    catalogs_objects = np.empty(len(catalog_list), dtype=object)
+    catalogs_objects[:] = catalog_list
+    catalogs_sort_keys = np.array(catalog_list, dtype=str)
+    starts = np.cumsum(lengths) - lengths
+    for group_len in np.unique(lengths):
+        group_indexes = np.flatnonzero(lengths == group_len)
+        stats_this_len = [element_stats_list[group_index] for group_index in group_indexes]
+        if group_len < 1:
+            for el_stats in stats_this_len:
+                el_stats.len = 0
+                if el_stats.plusminus is None or el_stats.plusminus == 0.0:
+                    el_stats.plusminus = get_representative_error(element_id=el_stats.element_id)
+            continue
+        block_index = starts[group_indexes][:, np.newaxis] + np.arange(group_len)
+        value_block = values[block_index]
+        if group_len < 2:
+            for el_stats, rounded_value in zip(stats_this_len, np.around(value_block[:, 0], decimals=2)):
+                el_stats.len = 1
+                el_stats.mean = el_stats.median = el_stats.max = el_stats.min = rounded_value
+                el_stats.median_catalogs = [el_stats.catalog_list[0]]
+                if el_stats.plusminus is None or el_stats.plusminus == 0.0:
+                    el_stats.plusminus = get_representative_error(element_id=el_stats.element_id)
+            continue
+        linear_block = values_linear[block_index]
+        mean_linear = np.add.reduce(linear_block, axis=1) / group_len
+        means = np.around(np.log10(mean_linear), decimals=2)
+        maxes = np.max(value_block, axis=1)
+        mins = np.min(value_block, axis=1)
+        spreads = np.around(maxes - mins, decimals=3)
+        plusminuses = np.around(spreads / 2.0, decimals=2)
+        # The median calculation must take an average in linear space and record the catalogs used to the calculation
+        sort_index = np.lexsort((catalogs_sort_keys[block_index], value_block))
+        sorted_block_index = np.take_along_axis(block_index, sort_index, axis=1)
+        half_index, remainder = divmod(int(group_len), 2)
+        if remainder == 0:
+            median_slice = slice(half_index - 1, half_index + 1)
+            medians = np.around(np.log10(np.add.reduce(values_linear[sorted_block_index[:, median_slice]], axis=1)
+                                         / 2), decimals=2)
+        else:
+            median_slice = slice(half_index, half_index + 1)
+            medians = np.around(values[sorted_block_index[:, half_index]], decimals=2)
+        median_catalogs_block = catalogs_objects[sorted_block_index[:, median_slice]]
+        if group_len > 2:
+            deviations = linear_block - mean_linear[:, np.newaxis]
+            stds_log = np.log10(np.sqrt(np.add.reduce(deviations * deviations, axis=1) / group_len))
+            stds = [params_err_format(std_log, sig_figs=3) for std_log in stds_log]
+        else:
+            stds = [None] * len(stats_this_len)
+        for el_stats, mean, median, el_max, el_min, spread, plusminus, std, median_catalogs \
+                in zip(stats_this_len, means, medians, maxes, mins, spreads, plusminuses, stds, median_catalogs_block):
+            el_stats.len = int(group_len)
+            el_stats.mean = mean
+            el_stats.median = median
+            el_stats.max = el_max
+            el_stats.min = el_min
+            el_stats.spread = spread
+            el_stats.plusminus = plusminus
+            el_stats.median_catalogs = tuple(median_catalogs)
+            if std is not None:
+                el_stats.std = std
+            if el_stats.plusminus == 0.0:
+                el_stats.plusminus = get_representative_error(element_id=el_stats.element_id)
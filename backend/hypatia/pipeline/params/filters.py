@@ -1,3 +1,7 @@
+from functools import cached_property
+
+import numpy as np
+
 from hypatia.elements import elements_found
 
 
@@ -20,6 +24,127 @@ def core_filter(and_logic_for_lists, target_types, types_this_star):
         return set() != target_types & types_this_star
 
 
+class SetColumns:
+    """
+    Boolean membership columns for a set-valued feature, with one row per star. Made in a single pass over the stars.
+    """
+    def __init__(self, sets_per_star: list[set]):
+        self.star_count = len(sets_per_star)
+        star_indexes_per_key = {}
+        for star_index, star_set in enumerate(sets_per_star):
+            for key in star_set:
+                star_indexes_per_key.setdefault(key, []).append(star_index)
+        self.columns = {}
+        for key, star_indexes in star_indexes_per_key.items():
+            column = np.zeros(self.star_count, dtype=bool)
+            column[star_indexes] = True
+            self.columns[key] = column
+
+    def __getitem__(self, key) -> np.ndarray:
+        if key in self.columns:
+            return self.columns[key]
+        return np.zeros(self.star_count, dtype=bool)
+
+    def core_mask(self, and_logic_for_lists, target_types) -> np.ndarray:
+        """
+        The numpy mask version of core_filter(), for all the stars at once.
+        """
+        if and_logic_for_lists:
+            # all the star types are found for this star
+            mask = np.ones(self.star_count, dtype=bool)
+            for target_type in target_types:
+                mask &= self[target_type]
+        else:
+            # at least one of the star types is found for this star
+            mask = np.zeros(self.star_count, dtype=bool)
+            for target_type in target_types:
+                mask |= self[target_type]
+        return mask
+
+    def count(self, keys=None) -> np.ndarray:
+        """
+        The number of keys for each star, only counting the keys in the keys argument when it is not None.
+        """
+        if keys is None:
+            keys = self.columns.keys()
+        counts = np.zeros(self.star_count, dtype=int)
+        for key in keys:
+            counts += self[key]
+        return counts
+
+
+class StarFeatures:
+    """
+    Per-star feature columns for a list of SingleStar objects, used to filter all the stars with numpy boolean masks.
+    The row order is the order of star_list.
+    """
+    def __init__(self, star_list: list):
+        self.star_list = star_list
+        self.star_count = len(star_list)
+        self.param_values = {}
+
+    # the columns are only made for the features that are used by a filter
+    @cached_property
+    def data_types(self) -> SetColumns:
+        return SetColumns([single_star.available_data_types for single_star in self.star_list])
+
+    @cached_property
+    def abundance_catalogs(self) -> SetColumns:
+        return SetColumns([single_star.available_abundance_catalogs for single_star in self.star_list])
+
+    @cached_property
+    def name_types(self) -> SetColumns:
+        return SetColumns([single_star.available_star_name_types for single_star in self.star_list])
+
+    @cached_property
+    def params(self) -> SetColumns:
+        return SetColumns([single_star.params.available_params for single_star in self.star_list])
+
+    @cached_property
+    def elements(self) -> SetColumns:
+        return SetColumns([set().union(*[single_star.__getattribute__(catalog_name).available_abundances
+                                         for catalog_name in single_star.available_abundance_catalogs])
+                           for single_star in self.star_list])
+
+    @cached_property
+    def is_target(self) -> np.ndarray:
+        return np.fromiter((single_star.is_target for single_star in self.star_list), dtype=bool,
+                           count=self.star_count)
+
+    def param_column(self, param_name: str) -> np.ndarray:
+        """
+        An object array of the values for the stellar parameter param_name, None for stars without the parameter.
+        """
+        if param_name not in self.param_values:
+            values = np.full(self.star_count, None, dtype=object)
+            for star_index in np.flatnonzero(self.params[param_name]):
+                value = self.star_list[star_index].params.__getattribute__(param_name).value
+                if param_name == 'sptype':
+                    value = value[0]
+                values[star_index] = value
+            self.param_values[param_name] = values
+        return self.param_values[param_name]
+
+    def match_mask(self, param_name: str, match_values) -> np.ndarray:
+        has_param = self.params[param_name]
+        values = self.param_column(param_name)
+        mask = np.zeros(self.star_count, dtype=bool)
+        mask[has_param] = [value in match_values for value in values[has_param]]
+        return mask
+
+    def bound_mask(self, param_name: str, lower_bound: float | None, upper_bound: float | None) -> np.ndarray:
+        has_param = self.params[param_name]
+        values = np.full(self.star_count, np.nan)
+        values[has_param] = self.param_column(param_name)[has_param].astype(float)
+        mask = has_param.copy()
+        # the comparisons are written as the exclusions, so that a NaN value is not excluded
+        if upper_bound is not None:
+            mask &= ~(values >= upper_bound)
+        if lower_bound is not None:
+            mask &= ~(values < lower_bound)
+        return mask
+
+
 def min_cat_count(min_cat, star_data, complement_data, init_catalogs, verbose=False):
     if min_cat is None:
         return star_data, complement_data
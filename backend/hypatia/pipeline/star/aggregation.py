@@ -10,7 +10,8 @@ nea_no_ref = {'letter', 'pl_controv_flag', 'pl_name', 'radius_gap', 'discovery_m
 
 def add_params_and_filters(match_filters: set[str] | None,
                            value_filters: dict[str, tuple[float | None, float | None, bool]] | None,
-                           is_stellar: bool = True, base_path: str = None, value_name: str | None = 'value') -> list[dict]:
+                           is_stellar: bool = True, base_path: str = None, value_name: str | None = 'value',
+                           letter_path: str = 'planets_array.v.letter') -> list[dict]:
     and_filters = []
     curated_path = ''
     if base_path is None:
@@ -22,7 +23,7 @@ def add_params_and_filters(match_filters: set[str] | None,
     if match_filters:
         for param_name_match in match_filters:
             if param_name_match == 'planet_letter':
-                and_filters.append({f'planets_array.v.letter': {'$ne': None}})
+                and_filters.append({letter_path: {'$ne': None}})
             elif value_name is None:
                 and_filters.append({f'{base_path}{param_name_match}{curated_path}': {'$ne': None}})
             else:
@@ -30,7 +31,7 @@ def add_params_and_filters(match_filters: set[str] | None,
     if value_filters:
         for param_name, (min_value, max_value, exclude) in value_filters.items():
             if param_name == 'planet_letter':
-                path = 'planets_array.v.letter'
+                path = letter_path
             elif value_name is None:
                 path = f'{base_path}{param_name}{curated_path}'
             else:
@@ -202,6 +203,114 @@ def abundance_data_v2(db_formatted_names: list[str],
     ]
 
 
+def catalog_subset_stats(field_prefix: str, catalogs: list[str], catalog_exclude: bool = False,
+                         return_median: bool = True) -> dict[str, dict]:
+    """
+    An object with the value, err, and catalogs of an element for a subset of catalogs, from the parallel arrays of the
+    plot view that are sorted by value. This is the same calculation as stage 3-catalogs of frontend_pipeline().
+    """
+    handles = f'${field_prefix}__cat_handles'
+    condition = {'$in': [{'$arrayElemAt': [handles, '$$this']}, catalogs]}
+    if catalog_exclude:
+        condition = {'$not': condition}
+    if return_median:
+        cat_calc = {
+            '$cond': {
+                'if': {'$eq': [{'$mod': ['$$size', 2]}, 0]},
+                'then': {
+                    '$log10': {
+                        '$avg': [
+                            {'$arrayElemAt': ['$$linear', {'$add': [{'$divide': ['$$size', 2]}, -1]}]},
+                            {'$arrayElemAt': ['$$linear', {'$divide': ['$$size', 2]}]},
+                        ]
+                    }
+                },
+                'else': {'$arrayElemAt': ['$$values', {'$floor': {'$divide': ['$$size', 2]}}]},
+            },
+        }
+    else:
+        cat_calc = {'$log10': {'$avg': '$$linear'}}
+    return {
+        '$let': {
+            'vars': {
+                'picked': {
+                    '$filter': {
+                        'input': {'$range': [0, {'$size': {'$ifNull': [handles, []]}}]},
+                        'cond': condition,
+                    }
+                },
+            },
+            'in': {
+                '$let': {
+                    'vars': {
+                        'values': {'$map': {'input': '$$picked',
+                                            'in': {'$arrayElemAt': [f'${field_prefix}__cat_values', '$$this']}}},
+                        'linear': {'$map': {'input': '$$picked',
+                                            'in': {'$arrayElemAt': [f'${field_prefix}__cat_linear', '$$this']}}},
+                        'size': {'$size': '$$picked'},
+                    },
+                    'in': {
+                        'value': {'$round': [cat_calc, 2]},
+                        'err': {'$round': [{'$divide': [{'$subtract': [{'$max': '$$values'}, {'$min': '$$values'}]},
+                                                        2.0]}, 2]},
+                        # null when the star has no value for the element, like $arrayToObject in stage 3-catalogs
+                        'catalogs': {
+                            '$cond': {
+                                'if': {'$isArray': handles},
+                                'then': {'$arrayToObject': {'$zip': {'inputs': [
+                                    {'$map': {'input': '$$picked', 'in': {'$arrayElemAt': [handles, '$$this']}}},
+                                    '$$values',
+                                ]}}},
+                                'else': None,
+                            }
+                        },
+                    },
+                }
+            },
+        }
+    }
+
+
+def element_filters(element_fields: dict[ElementID, str],
+                    elements_match_filters: set[ElementID] | None,
+                    element_value_filters: dict[ElementID, tuple[float | None, float | None, bool]] | None) \
+        -> list[dict]:
+    and_filters_elements = []
+    if elements_match_filters:
+        for element_name in sorted(elements_match_filters, key=element_rank):
+            and_filters_elements.append({element_fields[element_name]: {'$ne': None}})
+    if element_value_filters:
+        for element_name, (min_val, max_val, exclude) in element_value_filters.items():
+            element_field = element_fields[element_name]
+            if min_val is not None and max_val is not None:
+                if exclude:
+                    and_filters_elements.append({'$or': [{element_field: {'$lt': min_val}},
+                                                {element_field: {'$gt': max_val}}]})
+                else:
+                    and_filters_elements.append({element_field: {'$gte': min_val}})
+                    and_filters_elements.append({element_field: {'$lte': max_val}})
+            elif min_val is not None:
+                if exclude:
+                    and_filters_elements.append({element_field: {'$lt': min_val}})
+                else:
+                    and_filters_elements.append({element_field: {'$gte': min_val}})
+            elif max_val is not None:
+                if exclude:
+                    and_filters_elements.append({element_field: {'$gt': max_val}})
+                else:
+                    and_filters_elements.append({element_field: {'$lte': max_val}})
+    return and_filters_elements
+
+
+def pipeline_early_project(paths: set[str]) -> dict:
+    """
+    An inclusion $project for the paths, without the paths that are inside another path, which MongoDB rejects.
+    """
+    kept_paths = [path for path in sorted(paths)
+                  if not any(path.startswith(f'{other_path}.') for other_path in paths)]
+    return {'$project': {path: 1 for path in kept_paths} if kept_paths else {'_id': 1}}
+
+
 def frontend_pipeline(db_formatted_names: list[str] = None,
                       db_formatted_names_exclude: bool = False,
                       elements_returned: list[ElementID] = None,
@@ -227,7 +336,17 @@ def frontend_pipeline(db_formatted_names: list[str] = None,
                       star_name_column: str = 'name',
                       return_hover: bool = False,
                       return_targets: bool = False,
+                      plot_view: bool = False,
+                      plan: bool = True,
                       ) -> list[dict]:
+    """
+    With plot_view=True, the pipeline is for the flat plot view collection, see hypatia.pipeline.star.plot_view.
+
+    With plan=True, the pipeline does less work for the same results. The element filters are part of the first
+    $match, on the stored median/mean fields, when there is no catalogs subset. The hypatiaDB documents are projected
+    to the paths that the later stages use before the planets are unwound, and the sorted catalogs are only made for
+    the elements that are returned with return_hover.
+    """
     if solarnorm_id == 'absolute':
         norm_path = 'absolute'
     else:
@@ -255,24 +374,103 @@ def frontend_pipeline(db_formatted_names: list[str] = None,
         if element_id_set:
             all_elements_set.update(set(element_id_set))
     all_elements = sorted(all_elements_set, key=element_rank)
+    # the field names for the elements in the filter, ratio, and project stages
+    if plot_view:
+        if catalogs:
+            # the value, err, and catalogs of the objects from stage 3-plot-view-catalogs
+            element_fields = {element_name: f'{element_name}_subset.value' for element_name in all_elements}
+            err_fields = {element_name: f'{element_name}_subset.err' for element_name in all_elements}
+            catalogs_fields = {element_name: f'{element_name}_subset.catalogs' for element_name in all_elements}
+        else:
+            element_fields = {element_name: f'{solarnorm_id}__{element_name}__{el_value_path}'
+                              for element_name in all_elements}
+            err_fields = {element_name: f'{solarnorm_id}__{element_name}__plusminus' for element_name in all_elements}
+            catalogs_fields = {element_name: f'{solarnorm_id}__{element_name}__catalogs'
+                               for element_name in all_elements}
+        stellar_path = 'stellar__{param_name}{suffix}'
+        planet_path = 'planet__{param_name}{suffix}'
+        star_id_path = '$star_id'
+    else:
+        element_fields = {element_name: str(element_name) for element_name in all_elements}
+        stellar_path = 'stellar.{param_name}.curated{suffix}'
+        planet_path = 'planets_array.v.planetary.{param_name}{suffix}'
+        star_id_path = '$_id'
+    value_suffix, err_suffix, ref_suffix = ('', '__err', '__ref') if plot_view else ('.value', '.err', '.ref')
     # initialize the pipeline
     json_pipeline = []
     # stage 1: If needed, filter by per-star parameters to narrow the number of documents to process
     and_filters_stellar = []
+    if plot_view:
+        # one document per planet for the planetary queries, otherwise one document per star
+        and_filters_stellar.append({'is_planet': is_planetary})
     if db_formatted_names:
-        and_filters_stellar.append({'names.match_names': {f"{'$nin' if db_formatted_names_exclude else '$in'}": db_formatted_names}})
+        names_path = 'match_names' if plot_view else 'names.match_names'
+        and_filters_stellar.append({names_path: {f"{'$nin' if db_formatted_names_exclude else '$in'}": db_formatted_names}})
     # add the stellar parameters filters
-    and_filters_stellar.extend(add_params_and_filters(match_filters=stellar_params_match_filters,
-                                                      value_filters=stellar_params_value_filters, is_stellar=True))
-    if is_planetary:
+    if plot_view:
+        and_filters_stellar.extend(add_params_and_filters(match_filters=stellar_params_match_filters,
+                                                          value_filters=stellar_params_value_filters,
+                                                          base_path='stellar__', value_name=None,
+                                                          letter_path='letter'))
+    else:
+        and_filters_stellar.extend(add_params_and_filters(match_filters=stellar_params_match_filters,
+                                                          value_filters=stellar_params_value_filters,
+                                                          is_stellar=True))
+    if is_planetary and not plot_view:
         # only require that a star has at least one planet at this stage.
         and_filters_stellar.append({'nea': {'$ne': None}})
+    # element filters on the stored values, these do not depend on the later stages without a catalogs subset
+    filter_elements_early = plan and not catalogs
+    if filter_elements_early:
+        stored_element_fields = element_fields if plot_view else \
+            {element_name: f'{norm_path}.{element_name}.{el_value_path}' for element_name in all_elements}
+        and_filters_stellar.extend(element_filters(element_fields=stored_element_fields,
+                                                   elements_match_filters=elements_match_filters,
+                                                   element_value_filters=element_value_filters))
     if and_filters_stellar:
         # only add a pipline stage if there are filters to apply.
         json_pipeline.append({'$match': {"$and": and_filters_stellar}})
+    # hover catalogs are only returned for the returned elements
+    hover_elements = set(elements_returned) if return_hover and elements_returned else set()
+    if plan and not plot_view:
+        # stage 1b: keep only the paths used by the later stages, so that they do not copy the full documents
+        needed_paths = set()
+        for element_name in all_elements:
+            element_path = f'{norm_path}.{element_name}'
+            if catalogs:
+                needed_paths.update({f'{element_path}.catalogs', f'{element_path}.catalogs_linear'})
+            else:
+                needed_paths.add(f'{element_path}.{el_value_path}')
+                if return_error:
+                    needed_paths.add(f'{element_path}.plusminus')
+                if element_name in hover_elements:
+                    needed_paths.add(f'{element_path}.catalogs')
+        if is_planetary:
+            needed_paths.add('nea.planets')
+        elif return_nea_name:
+            needed_paths.add('nea.nea_name')
+        if return_targets:
+            needed_paths.add('target_handles')
+        if stellar_params_returned:
+            for param_name in stellar_params_returned:
+                needed_paths.add(f'stellar.{param_name}.curated')
+                if sort_field == param_name and param_name in str_to_float_fields:
+                    needed_paths.add(f'stellar.{param_name}_num.curated')
+        if name_types_returned:
+            for name_type in name_types_returned:
+                if name_type != star_name_column:
+                    needed_paths.add(f'names.{name_type}')
+        json_pipeline.append(pipeline_early_project(needed_paths))
 
     # stage 2: planetary data requires a new-fields, unwind, and match stage to reshape and filter the data.
-    if is_planetary:
+    if is_planetary and plot_view:
+        # stage 2-plot-view: the planets are already separate documents
+        and_filters_planetary = add_params_and_filters(match_filters=planet_params_match_filters,
+                                                       value_filters=planet_params_value_filters,
+                                                       base_path='planet__', value_name=None, letter_path='letter')
+        if and_filters_planetary:
+            json_pipeline.append({'$match': {'$and': and_filters_planetary}})
+    elif is_planetary:
         # stage 2a: reshape the planetary data to be an array of objects, which can be a targe for unwind
         json_pipeline.append({'$addFields': {'planets_array': {'$objectToArray': '$nea.planets'}}})
         # stage 2b: unwind the planetary data to allow for per-planet filtering
@@ -285,7 +483,19 @@ def frontend_pipeline(db_formatted_names: list[str] = None,
             json_pipeline.append({'$match': {'$and': and_filters_planetary}})
 
     # stage 3: element not null, optional catalog filtering.
-    if catalogs:
+    if plot_view and catalogs:
+        # stage 3-plot-view-catalogs: select the catalogs from the presorted arrays, one object per element
+        add_fields_subset = {}
+        for element_name in all_elements:
+            add_fields_subset[f'{element_name}_subset'] = catalog_subset_stats(
+                field_prefix=f'{solarnorm_id}__{element_name}', catalogs=catalogs, catalog_exclude=catalog_exclude,
+                return_median=return_median)
+        if add_fields_subset:
+            json_pipeline.append({'$addFields': add_fields_subset})
+    elif plot_view:
+        # stage 3-plot-view: the element values are flat fields that are used directly by the next stages
+        pass
+    elif catalogs:
         # stage 3-catalogs: we need to find or exclude values from specific catalogs and calculate the median/mean
         # get the values for in a two-step calculation; the first is to sort the values
         add_fields_first_calc = {}
@@ -369,44 +579,26 @@ def frontend_pipeline(db_formatted_names: list[str] = None,
         for element_name in all_elements:
             element_field_name = str(element_name)
             add_fields[element_field_name] = f'${norm_path}.{element_field_name}.{el_value_path}'
-            add_fields[f'{element_field_name}_catalogs'] = {
-                '$arrayToObject': {
-                    '$sortArray': {
-                        'input': {'$objectToArray': f'${norm_path}.{element_field_name}.catalogs'},
-                        'sortBy': {'v': 1},
+            if not plan or element_name in hover_elements:
+                add_fields[f'{element_field_name}_catalogs'] = {
+                    '$arrayToObject': {
+                        '$sortArray': {
+                            'input': {'$objectToArray': f'${norm_path}.{element_field_name}.catalogs'},
+                            'sortBy': {'v': 1},
+                        }
                     }
                 }
-            }
             if return_error:
                 add_fields[f'{element_field_name}_err'] = f'${norm_path}.{element_field_name}.plusminus'
         json_pipeline.append({'$addFields': add_fields})
 
-    # stage 4: element match and value filtering
-    and_filters_elements = []
-    if elements_match_filters:
-        for element_name in sorted(elements_match_filters, key=element_rank):
-            and_filters_elements.append({f'{element_name}': {'$ne': None}})
-    if element_value_filters:
-        for element_name, (min_val, max_val, exclude) in element_value_filters.items():
-            if min_val is not None and max_val is not None:
-                if exclude:
-                    and_filters_elements.append({'$or': [{f'{element_name}': {'$lt': min_val}},
-                                                {f'{element_name}': {'$gt': max_val}}]})
-                else:
-                    and_filters_elements.append({f'{element_name}': {'$gte': min_val}})
-                    and_filters_elements.append({f'{element_name}': {'$lte': max_val}})
-            if min_val is not None:
-                if exclude:
-                    and_filters_elements.append({f'{element_name}': {'$lt': min_val}})
-                else:
-                    and_filters_elements.append({f'{element_name}': {'$gte': min_val}})
-            if max_val is not None:
-                if exclude:
-                    and_filters_elements.append({f'{element_name}': {'$gt': max_val}})
-                else:
-                    and_filters_elements.append({f'{element_name}': {'$lte': max_val}})
-    if and_filters_elements:
-        json_pipeline.append({'$match': {'$and': and_filters_elements}})
+    # stage 4: element match and value filtering, unless this was done in stage 1
+    if not filter_elements_early:
+        and_filters_elements = element_filters(element_fields=element_fields,
+                                               elements_match_filters=elements_match_filters,
+                                               element_value_filters=element_value_filters)
+        if and_filters_elements:
+            json_pipeline.append({'$match': {'$and': and_filters_elements}})
 
     # stage 5 ratio calculation
     ratio_ids = set()
@@ -420,8 +612,8 @@ def frontend_pipeline(db_formatted_names: list[str] = None,
             ratio_str = f'{ratio_id.numerator}_{ratio_id.denominator}'
             add_fields_ratio[ratio_str] = {
                 '$round': [{
-                    '$subtract': [f'${ratio_id.numerator}',
-                                  f'${ratio_id.denominator}']},
+                    '$subtract': [f'${element_fields[ratio_id.numerator]}',
+                                  f'${element_fields[ratio_id.denominator]}']},
                     2]
             }
         if add_fields_ratio:
@@ -442,52 +634,60 @@ def frontend_pipeline(db_formatted_names: list[str] = None,
     # stage 7: project the final data
     return_doc = {
         '_id': 0,
-        f'{star_name_column}': '$_id',
+        f'{star_name_column}': star_id_path,
     }
     if return_targets:
         return_doc['target_handles'] = '$target_handles'
     if elements_returned:
         for element_name in sorted(elements_returned, key=element_rank):
             element_str = str(element_name)
-            return_doc[element_str] = 1
-            if return_error:
-                return_doc[f'{element_str}_err'] = 1
+            if plot_view:
+                return_doc[element_str] = f'${element_fields[element_name]}'
+                if return_error:
+                    return_doc[f'{element_str}_err'] = f'${err_fields[element_name]}'
+            else:
+                return_doc[element_str] = 1
+                if return_error:
+                    return_doc[f'{element_str}_err'] = 1
     if element_ratios_returned:
         for ratio_id in element_ratios_returned:
             return_doc[f'{ratio_id.numerator}_{ratio_id.denominator}'] = 1
     if stellar_params_returned:
         for param_name in stellar_params_returned:
             # parameter's value
-            return_doc[param_name] = f'$stellar.{param_name}.curated.value'
+            return_doc[param_name] = '$' + stellar_path.format(param_name=param_name, suffix=value_suffix)
             # parameter's error
             if return_error and param_name not in string_names_types:
-                return_doc[f'{param_name}_err'] = f'$stellar.{param_name}.curated.err'
+                return_doc[f'{param_name}_err'] = '$' + stellar_path.format(param_name=param_name, suffix=err_suffix)
             # return the hover reference
             if return_hover:
-                return_doc[f'{param_name}_ref'] = f'$stellar.{param_name}.curated.ref'
+                return_doc[f'{param_name}_ref'] = '$' + stellar_path.format(param_name=param_name, suffix=ref_suffix)
             # sorting by a string field requires a different field to sort by.
             if sort_field == param_name and param_name in str_to_float_fields:
                 number_field_str = f'{param_name}_num'
-                return_doc[number_field_str] = f'$stellar.{number_field_str}.curated.value'
+                return_doc[number_field_str] = '$' + stellar_path.format(param_name=number_field_str,
+                                                                         suffix=value_suffix)
                 sort_field = number_field_str
 
     if is_planetary:
-        return_doc['nea_name'] = '$planets_array.v.pl_name'
+        return_doc['nea_name'] = '$pl_name' if plot_view else '$planets_array.v.pl_name'
         if planet_params_returned:
             for param_name in planet_params_returned:
                 if param_name not in {'pl_name', 'nea_name'}:
                     if param_name == 'planet_letter':
-                        return_doc[param_name] = '$planets_array.v.letter'
+                        return_doc[param_name] = '$letter' if plot_view else '$planets_array.v.letter'
                     elif param_name in string_names_types:
-                        return_doc[param_name] = f'$planets_array.v.planetary.{param_name}.value'
+                        return_doc[param_name] = '$' + planet_path.format(param_name=param_name, suffix=value_suffix)
                     else:
-                        return_doc[param_name] = f'$planets_array.v.planetary.{param_name}.value'
+                        return_doc[param_name] = '$' + planet_path.format(param_name=param_name, suffix=value_suffix)
                         if return_error:
-                            return_doc[f'{param_name}_err'] = f'$planets_array.v.planetary.{param_name}.err'
+                            return_doc[f'{param_name}_err'] = '$' + planet_path.format(param_name=param_name,
+                                                                                       suffix=err_suffix)
                     if return_hover and param_name not in nea_no_ref:
-                        return_doc[f'{param_name}_ref'] = f'$planets_array.v.planetary.{param_name}.ref'
+                        return_doc[f'{param_name}_ref'] = '$' + planet_path.format(param_name=param_name,
+                                                                                   suffix=ref_suffix)
     elif return_nea_name:
-        return_doc['nea_name'] = '$nea.nea_name'
+        return_doc['nea_name'] = '$nea_name' if plot_view else '$nea.nea_name'
     if name_types_returned:
         for name_type in name_types_returned:
             if name_type != star_name_column:
@@ -495,7 +695,11 @@ def frontend_pipeline(db_formatted_names: list[str] = None,
     if return_hover:
         if elements_returned:
             for element_name in sorted(elements_returned, key=element_rank):
-                return_doc[f'{element_name}_catalogs'] = 1
+                if plot_view:
+                    # null when the star has no value, like the $arrayToObject in stage 3
+                    return_doc[f'{element_name}_catalogs'] = {'$ifNull': [f'${catalogs_fields[element_name]}', None]}
+                else:
+                    return_doc[f'{element_name}_catalogs'] = 1
     if sort_field:
         sort_location = return_doc[sort_field]
         if sort_location == 1:
@@ -516,3 +720,61 @@ def frontend_pipeline(db_formatted_names: list[str] = None,
             sort_dict[unique_field] = 1
         json_pipeline.append({'$sort': sort_dict})
     return json_pipeline
+
+
+def histogram_range_stages(field: str) -> list[dict]:
+    """
+    Stages for the end of frontend_pipeline() that return the count, min, and max of the numeric values of a field
+    in one document.
+    """
+    return [{'$match': {field: {'$type': 'number'}}},
+            {'$group': {'_id': None, 'count': {'$sum': 1}, 'min': {'$min': f'${field}'},
+                        'max': {'$max': f'${field}'}}}]
+
+
+def histogram_bucket_stages(field: str, edges: list[float]) -> list[dict]:
+    """
+    Stages for the end of frontend_pipeline() that count the values of a field in the bins between the edges, for
+    all the rows and for the rows with a nea_name. Like numpy.histogram(), the last bin includes the last edge, these
+    values are in the 'last' bucket.
+    """
+    return [{'$match': {field: {'$type': 'number'}}},
+            {'$bucket': {
+                'groupBy': f'${field}',
+                'boundaries': edges,
+                'default': 'last',
+                'output': {
+                    'all': {'$sum': 1},
+                    'planet': {'$sum': {'$cond': [{'$eq': [{'$type': '$nea_name'}, 'missing']}, 0, 1]}},
+                },
+            }}]
+
+
+if __name__ == '__main__':
+    import time
+    from hypatia.pipeline.star.db import HypatiaDB
+    from hypatia.configs.env_load import MONGO_DATABASE
+    # the planned pipeline returns the same rows as the pipeline without the planning step
+    hypatiaDB = HypatiaDB(db_name=MONGO_DATABASE, collection_name='hypatiaDB')
+    test_elements = [ElementID.from_str(el_name) for el_name in ['C', 'O', 'Mg', 'Si', 'Fe']]
+    test_value_filters = [{}, {test_elements[4]: (-0.3, 0.3, False)}, {test_elements[0]: (-0.5, 0.5, True)}]
+    test_catalogs = [None, {'adibekyan12', 'brewer16', 'luck17'}]
+    test_planet_params = [None, ['pl_mass', 'period']]
+    mismatch_count = 0
+    for test_index, (value_filters, catalogs_subset, planet_params, return_hover) \
+            in list(enumerate(product(test_value_filters, test_catalogs, test_planet_params, [False, True]))):
+        query_args = dict(elements_returned=test_elements, element_value_filters=value_filters,
+                          elements_match_filters={test_elements[4]}, catalogs=catalogs_subset,
+                          stellar_params_returned=['dist', 'teff'], planet_params_returned=planet_params,
+                          return_error=True, return_hover=return_hover, return_nea_name=True, sort_field='Fe')
+        start_time = time.time()
+        unplanned_rows = list(hypatiaDB.collection.aggregate(frontend_pipeline(**query_args, plan=False)))
+        unplanned_s = time.time() - start_time
+        start_time = time.time()
+        planned_rows = list(hypatiaDB.collection.aggregate(frontend_pipeline(**query_args)))
+        planned_s = time.time() - start_time
+        is_equal = unplanned_rows == planned_rows
+        mismatch_count += not is_equal
+        print(f'{test_index + 1:3}.) {"equal" if is_equal else "MISMATCH"}, {len(planned_rows)} rows, '
+              f'without planning {unplanned_s:.3f} s, planned {planned_s:.3f} s')
+    print(f'{mismatch_count} mismatched queries')
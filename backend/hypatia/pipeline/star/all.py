@@ -3,6 +3,7 @@ import datetime
 
 import numpy as np
 
+from hypatia.tools.instrument import span
 from hypatia.elements import element_rank
 from hypatia.sources.gaia.ops import GaiaLib
 from hypatia.plots.histograms import simple_hist
@@ -11,11 +12,29 @@ from hypatia.pipeline.star.single import SingleStar
 from hypatia.pipeline.star.stats import StarDataStats
 from hypatia.object_params import StarDict, SingleParam
 from hypatia.configs.file_paths import star_data_output_dir
+from hypatia.tools.fork_pool import fork_map, fork_shared, get_processes
 from hypatia.sources.catalogs.solar_norm import iron_id, iron_set
+from hypatia.pipeline.params.chem import add_abundances_batch, calc_stats_batch
 from hypatia.sources.nea.ops import get_all_nea, refresh_nea_data
 from hypatia.sources.simbad.ops import get_star_data, get_main_id
 
 
+def reduce_stars_chunk(star_range: range) -> list[tuple[int, dict]]:
+    """
+    Process pool worker for AllStarData.reduce_elements(), only the reduced abundances are sent back to the parent.
+    """
+    stars_chunk = fork_shared['star_list'][star_range.start:star_range.stop]
+    reduce_stars(stars_chunk)
+    return [(star_index, single_star.reduced_abundances) for star_index, single_star in zip(star_range, stars_chunk)]
+
+
+def reduce_stars(stars_list: list[SingleStar]):
+    # all the (star, normalization, element) groups are reduced together in a single batch.
+    add_abundances_batch([abundance_record for single_star in stars_list
+                          for abundance_record in single_star.abundance_records()])
+    calc_stats_batch([el_stats for single_star in stars_list for el_stats in single_star.all_element_stats()])
+
+
 def params_check(params_dict, hypatia_handle):
     star_name_str = f'Hypatia Handle: {hypatia_handle}'
     for params_key in params_dict.keys():
@@ -39,10 +58,16 @@ class AllStarData:
         ('a', 'semi_major_axis', '(AU)'),
     ]
 
-    def __init__(self, verbose=True):
+    def __init__(self, verbose=True, processes=1):
         self.verbose = verbose
+        # processes=1 is the serial mode, processes=None uses all the available CPUs
+        self.processes = processes
 
         self.star_names = set()
+        # main_id -> SingleStar, the SingleStar objects are also attributes of this class named by their attr_name
+        self.star_index = {}
+        # the SingleStar objects sorted by main_id, made when needed for iteration
+        self.sorted_stars = None
 
         self.star_aliases = {}
         self.reverse_aliases = {}
@@ -63,13 +88,37 @@ class AllStarData:
         self.targets_requested = self.targets_found = self.targets_not_found = None
 
     def __iter__(self):
-        for star_name in sorted(self.star_names):
-            attr_name = get_star_data(test_name=star_name, test_origin='AllStarData.__iter__()')['attr_name']
-            yield self.__getattribute__(attr_name)
+        if self.sorted_stars is None:
+            self.sorted_stars = [self.star_index[main_id] for main_id in sorted(self.star_index.keys())]
+        # Stars removed during an iteration make a new sorted list, the list in this iteration is not changed.
+        return iter(self.sorted_stars)
 
     def __len__(self):
         return len(self.star_names)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'star_index' not in state:
+            # pickled before the star index was added, the SingleStar objects are only attributes
+            self.star_index = {value.star_reference_name: value for value in state.values()
+                               if isinstance(value, SingleStar)}
+            self.sorted_stars = None
+
+    def add_star(self, single_star: SingleStar):
+        self.star_names.add(single_star.star_reference_name)
+        self.star_index[single_star.star_reference_name] = single_star
+        self.__setattr__(single_star.attr_name, single_star)
+        self.sorted_stars = None
+
+    def remove_star(self, single_star: SingleStar):
+        self.star_names.remove(single_star.star_reference_name)
+        del self.star_index[single_star.star_reference_name]
+        self.__delattr__(single_star.attr_name)
+        self.sorted_stars = None
+
+    def get_star(self, main_id: str) -> SingleStar:
+        return self.star_index[main_id]
+
     def get_abundances(self, all_catalogs):
         for short_catalog_name in sorted(all_catalogs.keys()):
             cat_data = all_catalogs[short_catalog_name]
@@ -81,33 +130,29 @@ class AllStarData:
                 catalog_dict['original_star_name'] = original_star_name
                 catalog_dict['main_id'] = main_id
                 # check to see if there is already an entry for this reference name
-                attr_name = simbad_doc['attr_name']
                 if main_id not in self.star_names:
-                    # add this reference name to the set of names
-                    self.star_names.add(main_id)
                     # create entry for the catalog information
-                    self.__setattr__(attr_name, SingleStar(main_id, simbad_doc=simbad_doc, verbose=self.verbose))
+                    self.add_star(SingleStar(main_id, simbad_doc=simbad_doc, verbose=self.verbose))
                 # get the default normalization
-                self.__getattribute__(attr_name).add_abundance_catalog(short_catalog_name, catalog_dict)
+                self.star_index[main_id].add_abundance_catalog(short_catalog_name, catalog_dict)
 
     def get_exoplanets(self, refresh_exo_data: bool = False):
         if self.verbose:
             print('Loading and mapping all exoplanet data...')
         if refresh_exo_data:
             refresh_nea_data(verbose=self.verbose)
-        for exo_host_doc in get_all_nea():
-            star_main_id = exo_host_doc['_id']
-            attr_name = exo_host_doc['attr_name']
-            if star_main_id not in self.star_names:
-                # add this reference name to the set of names
-                self.star_names.add(star_main_id)
-                # create entry for the catalog information
-                self.__setattr__(attr_name, SingleStar(star_main_id,
-                                                       get_star_data(test_name=star_main_id,
-                                                                     test_origin='all_star_data'),
-                                                       verbose=self.verbose))
-            # get the default normalization
-            self.__getattribute__(attr_name).add_exoplanet_data(exo_host_doc)
+        with span('exoplanets') as exo_span:
+            exo_host_docs = get_all_nea()
+            exo_span.items = len(exo_host_docs)
+            for exo_host_doc in exo_host_docs:
+                star_main_id = exo_host_doc['_id']
+                if star_main_id not in self.star_names:
+                    # create entry for the catalog information
+                    self.add_star(SingleStar(star_main_id,
+                                             get_star_data(test_name=star_main_id, test_origin='all_star_data'),
+                                             verbose=self.verbose))
+                # get the default normalization
+                self.star_index[star_main_id].add_exoplanet_data(exo_host_doc)
 
         if self.verbose:
             print('Exoplanet data acquired.\n')
@@ -134,17 +179,12 @@ class AllStarData:
         # add the un_found stars to AllStarData
         for not_found_target_simbad_id in list(self.targets_not_found):
             simbad_doc = get_star_data(not_found_target_simbad_id)
-            attr_name = simbad_doc['attr_name']
-            # add this reference name to the set of names
-            self.star_names.add(not_found_target_simbad_id)
             # create entry for the catalog information
-            self.__setattr__(attr_name, SingleStar(not_found_target_simbad_id, simbad_doc=simbad_doc, is_target=True,
-                                                   verbose=self.verbose))
+            self.add_star(SingleStar(not_found_target_simbad_id, simbad_doc=simbad_doc, is_target=True,
+                                     verbose=self.verbose))
         # note the found stars have been identified as target stars
         for found_target_simbad_id in list(self.targets_found):
-            simbad_doc = get_star_data(found_target_simbad_id)
-            attr_name = simbad_doc['attr_name']
-            found_single_star = self.__getattribute__(attr_name)
+            found_single_star = self.star_index[found_target_simbad_id]
             found_single_star.is_target = True
 
     def fast_update_gaia(self):
@@ -172,14 +212,31 @@ class AllStarData:
                                       dr_number=dr_number)
 
     def do_stats(self, params_set=None, star_name_types=None):
-        self.stats = StarDataStats(star_data=self,
-                                   params_set=params_set, star_name_types=star_name_types)
+        with span('stats', items=len(self.star_names)):
+            self.stats = StarDataStats(star_data=self,
+                                       params_set=params_set, star_name_types=star_name_types)
 
-    def reduce_elements(self):
+    def reduce_elements(self, star_names: set[str] = None):
+        """
+        Reduces all the stars, or only the stars with main_ids in star_names.
+        """
         if self.verbose:
             print("Reducing elemental abundance data for Hypatia stars across that star's catalogs")
-        for single_star in self:
-            single_star.reduce()
+        if star_names is None:
+            star_list = list(self)
+        else:
+            star_list = [self.get_star(main_id) for main_id in sorted(star_names)]
+        processes = get_processes(self.processes)
+        with span('reduction', items=len(star_list)):
+            if processes == 1:
+                reduce_stars(star_list)
+            else:
+                if self.verbose:
+                    print(f'  reducing {len(star_list)} stars with {processes} processes')
+                for star_index, reduced_abundances in fork_map(worker=reduce_stars_chunk,
+                                                               shared={'star_list': star_list},
+                                                               total=len(star_list), processes=processes):
+                    star_list[star_index].reduced_abundances = reduced_abundances
         if self.verbose:
             print('  abundance reduction is complete.\n')
 
@@ -193,23 +250,23 @@ class AllStarData:
         plfile = open(file_name, 'w')
         plfile.write('%s\n' % column_header)
 
-        for star_name in list(self.star_names):
+        for single_star in self:
             star_line = []
-            star_line.append(self.__getattribute__(star_name).star_reference_name)
-            if 'exo' in self.__getattribute__(star_name).available_data_types:
-                star_line.extend((1, len(self.__getattribute__(star_name).exo.planet_letters)))
+            star_line.append(single_star.star_reference_name)
+            if 'exo' in single_star.available_data_types:
+                star_line.extend((1, len(single_star.exo.planet_letters)))
                 pmasses = []
-                for planet_letter in sorted(self.__getattribute__(star_name).exo.planet_letters):
-                    if 'pl_bmassj' in self.__getattribute__(star_name).exo.__getattribute__(planet_letter).planet_params:
-                        pmasses.append(self.__getattribute__(star_name).exo.__getattribute__(planet_letter).pl_bmassj)
+                for planet_letter in sorted(single_star.exo.planet_letters):
+                    if 'pl_bmassj' in single_star.exo.__getattribute__(planet_letter).planet_params:
+                        pmasses.append(single_star.exo.__getattribute__(planet_letter).pl_bmassj)
                     else:
                         pmasses.append(0.)
                 star_line.append(max(pmasses))
             else:
                 star_line.append((0, 0, 0))
             for element in elemlist:
-                if element in self.__getattribute__(star_name).reduced_abundances.available_abundances:
-                    star_line.append(round(self.__getattribute__(star_name).reduced_abundances.__getattribute__(element).median, 2))
+                if element in single_star.reduced_abundances.available_abundances:
+                    star_line.append(round(single_star.reduced_abundances.__getattribute__(element).median, 2))
                 else:
                     star_line.append('')
             star_line = str(star_line).replace('(', '').replace(')', '').strip('[').rstrip(']')
@@ -219,11 +276,7 @@ class AllStarData:
 
     def get_single_star_data(self, star_name):
         main_star_id = get_main_id(star_name, test_origin='get_single_star_data')
-        if main_star_id in self.star_names:
-            simbad_doc = get_star_data(main_star_id, test_origin='AllStarData.get_single_star_data')
-            return self.__getattribute__(simbad_doc['attr_name'])
-        else:
-            return None
+        return self.star_index.get(main_star_id, None)
 
     def find_available_attributes(self):
         if self.verbose:
@@ -283,16 +336,14 @@ class AllStarData:
         x = []
         title = ''
         if thing in self.stellar_params:
-            for star_name in self.star_names:
-                single_star = self.__getattribute__(star_name)
+            for single_star in self:
                 if thing in single_star.params.available_params:
                     value = single_star.params.__getattribute__(thing)
                     x.append(value)
             title += f'Stellar Parameter {thing}'
 
         elif thing in self.exoplanet_params:
-            for star_name in self.star_names:
-                single_star = self.__getattribute__(star_name)
+            for single_star in self:
                 if 'exo' in single_star.available_data_types:
                     for planet_letter in single_star.exo.planet_letters:
                         single_planet = single_star.exo.__getattribute__(planet_letter)
@@ -300,8 +351,7 @@ class AllStarData:
                             x.append(single_planet.__getattribute__(thing))
             title += f'Exoplanet Parameter {thing}'
         elif thing in self.available_abundances:
-            for star_name in self.star_names:
-                single_star = self.__getattribute__(star_name)
+            for single_star in self:
                 for catalog_name in single_star.available_abundance_catalogs:
                     available_abundances = single_star.__getattribute__(catalog_name).available_abundances
                     if thing in available_abundances:
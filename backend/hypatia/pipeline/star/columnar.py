@@ -0,0 +1,513 @@
+"""
+An in-memory, columnar engine that runs the frontend_pipeline() queries for the plot view without the database.
+
+The engine does not have its own query logic. It evaluates the aggregation pipeline that
+frontend_pipeline(plot_view=True) makes, with numpy masks over columns of the plot view, see
+hypatia.pipeline.star.plot_view. So the filters, ratios, statistics, and sorting are the same as in the database.
+The supported stages are $match, $addFields, $project, and $sort, with the operators that frontend_pipeline() uses,
+and anything else raises UnsupportedPipeline, so the caller can run the pipeline in the database instead. The
+catalog subset statistics, see catalog_subset_stats(), are recognized as a whole and calculated with masks over a
+dense matrix of the per-catalog values, one row per document and one column per catalog.
+
+Columns are loaded from the plot view collection when they are first used, into a snapshot for one data version
+(see upload_summary()). The data version is read again after each column is loaded, and the snapshot is discarded
+if it changed, so the columns of a snapshot are not mixed from two versions of the plot view. A new snapshot is
+started when the data version changes.
+
+Differences from the database: strings are compared without case, like the collection's collation, but in the code
+point order, not in the English collation order.
+"""
+import math
+import time
+import threading
+
+import numpy as np
+
+from hypatia.collect import BaseCollection
+from hypatia.pipeline.star.aggregation import catalog_subset_stats
+from hypatia.configs.source_settings import query_cache_version_check_s
+
+range_operators = {'$gte': np.greater_equal, '$gt': np.greater, '$lte': np.less_equal, '$lt': np.less}
+
+
+class Missing:
+    """
+    The value of a field that a document does not have, this is different from a None (null) value.
+    """
+    def __repr__(self):
+        return 'missing'
+
+
+missing = Missing()
+
+
+class StaleSnapshot(Exception):
+    pass
+
+
+class UnsupportedPipeline(Exception):
+    """
+    A stage, operator, or value that the engine does not handle, the pipeline is run in the database instead.
+    """
+
+
+def bson_type(value) -> str:
+    if value is missing:
+        return 'missing'
+    elif value is None:
+        return 'null'
+    elif isinstance(value, bool):
+        return 'bool'
+    elif isinstance(value, int):
+        return 'int' if -2 ** 31 <= value < 2 ** 31 else 'long'
+    elif isinstance(value, float):
+        return 'double'
+    elif isinstance(value, str):
+        return 'string'
+    elif isinstance(value, dict):
+        return 'object'
+    elif isinstance(value, (list, tuple)):
+        return 'array'
+    raise UnsupportedPipeline(f'No BSON type for {type(value)}')
+
+
+def sort_key(value) -> tuple:
+    """
+    A key in the BSON sort order: null and missing, numbers, strings, objects, arrays, and booleans.
+    """
+    if value is missing or value is None:
+        return 0, 0
+    elif isinstance(value, bool):
+        return 5, value
+    elif isinstance(value, (int, float)):
+        return 1, value
+    elif isinstance(value, str):
+        return 2, value.casefold()
+    elif isinstance(value, dict):
+        return 3, str(value)
+    elif isinstance(value, (list, tuple)):
+        return 4, str(value)
+    raise UnsupportedPipeline(f'No BSON sort order for {type(value)}')
+
+
+def libm_log10(values: np.ndarray) -> np.ndarray:
+    """
+    The log10 of the database, numpy's log10 can differ in the last bit, which can change a value that is rounded.
+    """
+    return np.array([math.log10(value) for value in values.tolist()], dtype=float)
+
+
+def fold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+class Column:
+    def __init__(self, values: list):
+        self.values = np.empty(len(values), dtype=object)
+        for row_index, value in enumerate(values):
+            self.values[row_index] = value
+        self.present = np.array([value is not missing and value is not None for value in values], dtype=bool)
+        self._numeric = None
+
+    @property
+    def numeric(self) -> np.ndarray:
+        """
+        The numeric values as floats, with NaN for the values that are not numbers, these fail every comparison.
+        """
+        if self._numeric is None:
+            self._numeric = np.array([float(value) if isinstance(value, (int, float)) and not isinstance(value, bool)
+                                      else np.nan for value in self.values], dtype=float)
+        return self._numeric
+
+
+class CatalogMatrix:
+    def __init__(self, handles_column: Column, values_column: Column, linear_column: Column):
+        self.handles_column = handles_column
+        self.values_column = values_column
+        self.handles = sorted({handle for row_handles in handles_column.values if isinstance(row_handles, list)
+                               for handle in row_handles})
+        column_for_handle = {handle: column_index for column_index, handle in enumerate(self.handles)}
+        row_count = len(handles_column.values)
+        self.has_element = np.array([isinstance(row_handles, list) for row_handles in handles_column.values],
+                                    dtype=bool)
+        self.values = np.full((row_count, len(self.handles)), np.nan)
+        self.linear = np.full((row_count, len(self.handles)), np.nan)
+        for row_index in np.flatnonzero(self.has_element):
+            column_indexes = [column_for_handle[handle] for handle in handles_column.values[row_index]]
+            self.values[row_index, column_indexes] = values_column.values[row_index]
+            self.linear[row_index, column_indexes] = linear_column.values[row_index]
+
+    def subset(self, catalogs: list[str], catalog_exclude: bool, return_median: bool) -> dict[str, any]:
+        """
+        The value, err, and catalogs columns of catalog_subset_stats(), the catalogs column is made when it is used.
+        """
+        allowed = {fold(catalog) for catalog in catalogs}
+        in_subset = np.array([fold(handle) in allowed for handle in self.handles], dtype=bool)
+        if catalog_exclude:
+            in_subset = ~in_subset
+        subset_indexes = np.flatnonzero(in_subset)
+        # NaN sorts to the end of each row
+        values = np.sort(self.values[:, subset_indexes], axis=1)
+        linear = np.sort(self.linear[:, subset_indexes], axis=1)
+        counts = np.sum(~np.isnan(values), axis=1)
+        row_indexes = np.arange(len(counts))
+        has_values = counts > 0
+        stat = np.full(len(counts), np.nan)
+        err = np.full(len(counts), np.nan)
+        if return_median:
+            half = counts // 2
+            is_odd = counts % 2 == 1
+            stat[is_odd] = values[row_indexes[is_odd], half[is_odd]]
+            is_even = has_values & ~is_odd
+            stat[is_even] = libm_log10((linear[row_indexes[is_even], half[is_even] - 1]
+                                        + linear[row_indexes[is_even], half[is_even]]) / 2.0)
+        else:
+            stat[has_values] = libm_log10(np.nansum(linear[has_values], axis=1) / counts[has_values])
+        if has_values.any():
+            err[has_values] = (np.nanmax(values[has_values], axis=1)
+                               - np.nanmin(values[has_values], axis=1)) / 2.0
+
+        def catalogs_column() -> Column:
+            # the arrays of each document are sorted by value, so the selected catalogs are too
+            subset_handles = {self.handles[column_index] for column_index in subset_indexes}
+            catalogs_values = []
+            for row_handles, row_values in zip(self.handles_column.values, self.values_column.values):
+                if isinstance(row_handles, list):
+                    catalogs_values.append({handle: value for handle, value in zip(row_handles, row_values)
+                                            if handle in subset_handles})
+                else:
+                    catalogs_values.append(None)
+            return Column(catalogs_values)
+
+        return {
+            'value': Column([None if np.isnan(value) else round(value, 2) for value in stat.tolist()]),
+            'err': Column([None if np.isnan(value) else round(value, 2) for value in err.tolist()]),
+            'catalogs': catalogs_column,
+        }
+
+
+class Snapshot:
+    def __init__(self, collection: BaseCollection, get_data_version, data_version: str | None):
+        self.collection = collection
+        self.get_data_version = get_data_version
+        self.data_version = data_version
+        self.ids = [doc['_id'] for doc in collection.collection.find({}, {'_id': 1})]
+        self.row_for_id = {doc_id: row_index for row_index, doc_id in enumerate(self.ids)}
+        self.size = len(self.ids)
+        self.columns = {}
+        self.catalog_matrices = {}
+        self.lock = threading.Lock()
+
+    def column(self, path: str) -> Column:
+        found_column = self.columns.get(path, None)
+        if found_column is None:
+            with self.lock:
+                found_column = self.columns.get(path, None)
+                if found_column is None:
+                    found_column = self.load_column(path)
+                    self.columns[path] = found_column
+        return found_column
+
+    def catalog_matrix(self, field_prefix: str) -> CatalogMatrix:
+        found_matrix = self.catalog_matrices.get(field_prefix, None)
+        if found_matrix is None:
+            found_matrix = CatalogMatrix(handles_column=self.column(f'{field_prefix}__cat_handles'),
+                                         values_column=self.column(f'{field_prefix}__cat_values'),
+                                         linear_column=self.column(f'{field_prefix}__cat_linear'))
+            self.catalog_matrices[field_prefix] = found_matrix
+        return found_matrix
+
+    def load_column(self, path: str) -> Column:
+        values = [missing] * self.size
+        path_keys = path.split('.')
+        for doc in self.collection.collection.find({path: {'$exists': True}}, {path: 1}):
+            row_index = self.row_for_id.get(doc['_id'], None)
+            if row_index is None:
+                raise StaleSnapshot(f'{doc["_id"]} is not in the snapshot of {self.collection.collection_name}')
+            value = doc
+            for key in path_keys:
+                if not isinstance(value, dict) or key not in value.keys():
+                    value = missing
+                    break
+                value = value[key]
+            values[row_index] = value
+        # a publish or an export may have changed the plot view while the column was read
+        if self.get_data_version() != self.data_version:
+            raise StaleSnapshot(f'The data version of {self.collection.collection_name} changed')
+        return Column(values)
+
+
+class ColumnarEngine:
+    def __init__(self, plot_view: BaseCollection, get_data_version,
+                 version_check_s: float = query_cache_version_check_s):
+        self.plot_view = plot_view
+        self.get_data_version = get_data_version
+        self.version_check_s = version_check_s
+        self.snapshot = None
+        self.last_version_check = None
+        self.lock = threading.Lock()
+
+    def current_snapshot(self) -> Snapshot:
+        now = time.monotonic()
+        with self.lock:
+            if self.last_version_check is None or now - self.last_version_check >= self.version_check_s:
+                self.last_version_check = now
+                data_version = self.get_data_version()
+                if self.snapshot is None or data_version != self.snapshot.data_version:
+                    self.snapshot = Snapshot(self.plot_view, get_data_version=self.get_data_version,
+                                             data_version=data_version)
+            return self.snapshot
+
+    def reset(self):
+        with self.lock:
+            self.snapshot = None
+            self.last_version_check = None
+
+    def run(self, json_pipeline: list[dict]) -> list[dict]:
+        try:
+            return PipelineRun(self.current_snapshot()).run(json_pipeline)
+        except StaleSnapshot:
+            # the plot view was replaced or the data version changed after the data version was checked
+            self.reset()
+            return PipelineRun(self.current_snapshot()).run(json_pipeline)
+
+
+class PipelineRun:
+    """
+    The state of one pipeline run, a mask of the documents that are still in the pipeline and the added fields.
+    """
+    def __init__(self, snapshot: Snapshot):
+        self.snapshot = snapshot
+        self.mask = np.ones(snapshot.size, dtype=bool)
+        self.added_fields = {}
+        self.rows = None
+
+    def column(self, path: str) -> Column:
+        if path in self.added_fields.keys():
+            added_column = self.added_fields[path]
+            if not isinstance(added_column, Column):
+                # made when it is first used
+                added_column = added_column()
+                self.added_fields[path] = added_column
+            return added_column
+        return self.snapshot.column(path)
+
+    def run(self, json_pipeline: list[dict]) -> list[dict]:
+        for stage in json_pipeline:
+            (stage_name, stage_spec), = stage.items()
+            if self.rows is not None and stage_name != '$sort':
+                raise UnsupportedPipeline(f'{stage_name} after $project')
+            if stage_name == '$match':
+                self.mask &= self.match(stage_spec)
+            elif stage_name == '$addFields':
+                for field_name, expression in stage_spec.items():
+                    subset_columns = self.catalog_subset(expression)
+                    if subset_columns is not None:
+                        for key, subset_column in subset_columns.items():
+                            self.added_fields[f'{field_name}.{key}'] = subset_column
+                        continue
+                    values = self.expression(expression)
+                    self.added_fields[field_name] = Column([None if np.isnan(value) else value
+                                                            for value in values.tolist()])
+            elif stage_name == '$project':
+                self.rows = self.project(stage_spec)
+            elif stage_name == '$sort':
+                self.sort(stage_spec)
+            else:
+                raise UnsupportedPipeline(f'The {stage_name} stage is not supported')
+        if self.rows is None:
+            raise UnsupportedPipeline('The pipeline must end with a $project stage')
+        return self.rows
+
+    def match(self, query: dict) -> np.ndarray:
+        mask = np.ones(self.snapshot.size, dtype=bool)
+        for key, condition in query.items():
+            if key == '$and':
+                for sub_query in condition:
+                    mask &= self.match(sub_query)
+            elif key == '$or':
+                or_mask = np.zeros(self.snapshot.size, dtype=bool)
+                for sub_query in condition:
+                    or_mask |= self.match(sub_query)
+                mask &= or_mask
+            elif key.startswith('$'):
+                raise UnsupportedPipeline(f'The {key} query operator is not supported')
+            else:
+                mask &= self.field_match(self.column(key), condition)
+        return mask
+
+    @staticmethod
+    def field_match(column: Column, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            # equality
+            if isinstance(condition, (dict, list)) or condition is None:
+                raise UnsupportedPipeline(f'Equality with {condition} is not supported')
+            folded = fold(condition)
+            return np.array([type(value) is type(condition) and fold(value) == folded for value in column.values],
+                            dtype=bool)
+        mask = np.ones(len(column.values), dtype=bool)
+        for operator, operand in condition.items():
+            if operator == '$ne' and operand is None:
+                mask &= column.present
+            elif operator in {'$in', '$nin'}:
+                allowed = {fold(item) for item in operand}
+                in_mask = np.array([any(fold(item) in allowed for item in value) if isinstance(value, list)
+                                    else value is not missing and fold(value) in allowed
+                                    for value in column.values], dtype=bool)
+                mask &= in_mask if operator == '$in' else ~in_mask
+            elif operator in range_operators.keys() and isinstance(operand, (int, float)) \
+                    and not isinstance(operand, bool):
+                with np.errstate(invalid='ignore'):
+                    mask &= range_operators[operator](column.numeric, float(operand))
+            else:
+                raise UnsupportedPipeline(f'The {operator} operator with {operand} is not supported')
+        return mask
+
+    def catalog_subset(self, expression) -> dict[str, any] | None:
+        """
+        The columns for an expression that is exactly a catalog_subset_stats() expression, otherwise None.
+        """
+        try:
+            picked = expression['$let']['vars']['picked']['$filter']
+            handles_path = picked['input']['$range'][1]['$size']['$ifNull'][0]
+            condition = picked['cond']
+            catalog_exclude = '$not' in condition.keys()
+            catalogs = (condition['$not'] if catalog_exclude else condition)['$in'][1]
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return None
+        field_prefix = handles_path[1:].removesuffix('__cat_handles')
+        for return_median in [True, False]:
+            if expression == catalog_subset_stats(field_prefix=field_prefix, catalogs=catalogs,
+                                                  catalog_exclude=catalog_exclude, return_median=return_median):
+                return self.snapshot.catalog_matrix(field_prefix).subset(catalogs=catalogs,
+                                                                         catalog_exclude=catalog_exclude,
+                                                                         return_median=return_median)
+        return None
+
+    def expression(self, expression) -> np.ndarray:
+        """
+        A number expression for all the documents, as floats with NaN for a null result.
+        """
+        if isinstance(expression, str) and expression.startswith('$'):
+            return self.column(expression[1:]).numeric
+        elif isinstance(expression, dict) and len(expression) == 1:
+            (operator, operands), = expression.items()
+            if operator == '$subtract':
+                first, second = [self.expression(operand) for operand in operands]
+                return first - second
+            elif operator == '$round':
+                values = self.expression(operands[0])
+                # $round of a double is half-to-even of its exact value, like round()
+                return np.array([round(value, operands[1]) if not np.isnan(value) else np.nan
+                                 for value in values], dtype=float)
+        raise UnsupportedPipeline(f'The expression {expression} is not supported')
+
+    def project(self, spec: dict) -> list[dict]:
+        row_indexes = np.flatnonzero(self.mask)
+        output_columns = []
+        for field_name, field_spec in spec.items():
+            if field_name == '_id':
+                if field_spec != 0:
+                    raise UnsupportedPipeline('Only _id: 0 is supported')
+                continue
+            if field_spec == 1:
+                values = self.column(field_name).values
+            elif isinstance(field_spec, str) and field_spec.startswith('$'):
+                values = self.column(field_spec[1:]).values
+            elif isinstance(field_spec, dict) and len(field_spec) == 1 and '$ifNull' in field_spec.keys() \
+                    and field_spec['$ifNull'][1] is None:
+                values = self.column(field_spec['$ifNull'][0][1:]).values
+                values = np.array([None if value is missing else value for value in values], dtype=object)
+            elif isinstance(field_spec, dict) and len(field_spec) == 1 and '$type' in field_spec.keys():
+                values = self.column(field_spec['$type'][1:]).values
+                values = np.array([bson_type(value) for value in values], dtype=object)
+            else:
+                raise UnsupportedPipeline(f'The projection {field_name}: {field_spec} is not supported')
+            output_columns.append((field_name, values))
+        rows = []
+        for row_index in row_indexes:
+            row = {}
+            for field_name, values in output_columns:
+                value = values[row_index]
+                if value is not missing:
+                    row[field_name] = value
+            rows.append(row)
+        return rows
+
+    def sort(self, spec: dict):
+        if self.rows is None:
+            raise UnsupportedPipeline('$sort before $project')
+        # stable sorts from the last key to the first
+        for field_name, direction in reversed(list(spec.items())):
+            self.rows.sort(key=lambda row: sort_key(row.get(field_name, missing)), reverse=direction < 0)
+
+
+if __name__ == '__main__':
+    import json
+    from itertools import product
+    from hypatia.elements import ElementID, RatioID
+    from hypatia.pipeline.star.db import HypatiaDB
+    from hypatia.configs.env_load import MONGO_DATABASE
+    from hypatia.pipeline.star.aggregation import frontend_pipeline
+    # parity of the columnar engine and the plot view aggregation, the rows are compared in order when sorted
+    hypatiaDB = HypatiaDB(db_name=MONGO_DATABASE, collection_name='hypatiaDB')
+    if not hypatiaDB.enable_plot_view():
+        raise ValueError('The plot view is empty, run the export first.')
+    test_engine = ColumnarEngine(plot_view=hypatiaDB.plot_view, get_data_version=lambda: None)
+    test_elements = [ElementID.from_str(el_name) for el_name in ['C', 'O', 'Mg', 'Si', 'Fe']]
+    test_value_filters = [{}, {test_elements[0]: (-1.0, 12.0, False)}, {test_elements[4]: (-0.3, 0.3, True)}]
+    test_ratio_filters = [None, {RatioID(test_elements[2], test_elements[3]): (-0.2, None, False)}]
+    test_stellar_filters = [None, {'dist': (None, 100.0, False)}]
+    test_planet_params = [None, ['pl_mass', 'period']]
+    test_sort_fields = [None, 'Fe', 'dist']
+    mismatch_count = 0
+    for test_index, (value_filters, ratio_filters, stellar_filters, planet_params, sort_field, sort_reverse) \
+            in list(enumerate(product(test_value_filters, test_ratio_filters, test_stellar_filters,
+                                      test_planet_params, test_sort_fields, [False, True]))):
+        test_pipeline = frontend_pipeline(elements_returned=test_elements, element_value_filters=value_filters,
+                                          element_ratios_returned=[RatioID(test_elements[4], test_elements[3])],
+                                          element_ratios_value_filters=ratio_filters,
+                                          stellar_params_returned=['dist', 'teff'],
+                                          stellar_params_value_filters=stellar_filters,
+                                          planet_params_returned=planet_params, name_types_returned=['hip'],
+                                          sort_field=sort_field, sort_reverse=sort_reverse, return_error=True,
+                                          return_hover=True, return_nea_name=True, plot_view=True)
+        start_time = time.time()
+        database_rows = list(hypatiaDB.plot_view.collection.aggregate(test_pipeline))
+        database_s = time.time() - start_time
+        start_time = time.time()
+        engine_rows = test_engine.run(test_pipeline)
+        engine_s = time.time() - start_time
+        if sort_field is None:
+            database_rows = sorted(database_rows, key=lambda row: json.dumps(row, sort_keys=True))
+            engine_rows = sorted(engine_rows, key=lambda row: json.dumps(row, sort_keys=True))
+        is_equal = database_rows == engine_rows
+        mismatch_count += not is_equal
+        print(f'{test_index + 1:3}.) {"equal" if is_equal else "MISMATCH"}, {len(database_rows)} rows, '
+              f'database {database_s:.3f} s, columnar {engine_s:.3f} s')
+    print(f'{mismatch_count} mismatched queries')
+    # catalog subsets: the nested aggregation, the plot view aggregation, and the columnar engine
+    from hypatia.pipeline.summary import SummaryCollection
+    summary_db = SummaryCollection(db_name=MONGO_DATABASE, collection_name='summary')
+    all_catalogs = sorted(summary_db.get_summary()['catalogs'].keys())
+    for catalog_count in [1, 10, 100]:
+        subset_args = dict(elements_returned=test_elements, element_value_filters={},
+                           catalogs=set(all_catalogs[:catalog_count]), return_error=True, return_hover=True,
+                           sort_field='Fe')
+        start_time = time.time()
+        nested_rows = list(hypatiaDB.collection.aggregate(frontend_pipeline(**subset_args)))
+        nested_s = time.time() - start_time
+        subset_pipeline = frontend_pipeline(**subset_args, plot_view=True)
+        start_time = time.time()
+        database_rows = list(hypatiaDB.plot_view.collection.aggregate(subset_pipeline))
+        database_s = time.time() - start_time
+        start_time = time.time()
+        test_engine.run(subset_pipeline)
+        engine_first_s = time.time() - start_time
+        start_time = time.time()
+        engine_rows = test_engine.run(subset_pipeline)
+        engine_s = time.time() - start_time
+        print(f'{catalog_count:3} catalogs, {len(nested_rows)} rows, '
+              f'{"equal" if nested_rows == database_rows == engine_rows else "MISMATCH"}, '
+              f'nested {nested_s:.3f} s, plot view {database_s:.3f} s, '
+              f'columnar {engine_s:.3f} s ({engine_first_s:.3f} s with the column loads)')
@@ -1,14 +1,41 @@
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+from pymongo import ReplaceOne, DeleteMany
+
+from hypatia.tools.instrument import span, in_current_span
 from hypatia.collect import BaseStarCollection
 from hypatia.configs.env_load import MONGO_DATABASE, DEBUG
 from hypatia.sources.simbad.db import indexed_name_types
 from hypatia.elements import element_rank, ElementID, RatioID
 from hypatia.sources.simbad.query import simbad_coord_to_deg
 from hypatia.pipeline.star.single import SingleStar, ObjectParams
+from hypatia.pipeline.star.index_advisor import IndexAdvisor
+from hypatia.pipeline.star.query_cache import QueryCache, query_key
+from hypatia.pipeline.star.columnar import ColumnarEngine, StaleSnapshot, UnsupportedPipeline
+from hypatia.pipeline.star.plot_view import PlotViewCollection, plot_view_suffix
+from hypatia.configs.source_settings import (export_chunk_size, export_upload_threads, query_cache_size,
+                                             query_cache_version_check_s, histogram_bins)
 from hypatia.pipeline.star.validator import validator, nea_data, single_abundance_keys
 from hypatia.pipeline.star.aggregation import (get_normalization_field, star_data_v2, abundance_data_v2,
-                                               frontend_pipeline)
+                                               frontend_pipeline, histogram_range_stages, histogram_bucket_stages)
+
+
+def nea_record(exo: dict | None) -> dict | None:
+    if exo is None:
+        return None
+    nea = {key: exo[key] for key in nea_data.keys() if key in exo.keys()}
+    if "stellar" in exo.keys():
+        nea['stellar'] = exo['stellar'].to_record()
+    if "planets" in exo.keys():
+        nea['planets'] = {}
+        for letter, pl_data in exo['planets'].items():
+            nea['planets'][letter] = {
+                name: value.to_record() if isinstance(value, ObjectParams) else value
+                for name, value in pl_data.items()}
+    return nea
 
 
 class HypatiaDB(BaseStarCollection):
@@ -16,6 +43,14 @@ class HypatiaDB(BaseStarCollection):
     added_elements_nlte = set()
     added_catalogs = set()
     added_normalizations = set()
+    # set by enable_query_cache(), enable_plot_view(), enable_columnar_engine(), and enable_index_advisor()
+    query_cache = None
+    plot_view = None
+    columnar_engine = None
+    index_advisor = None
+    # the requested plot view and columnar engine, they are checked for again when the data version changes
+    plot_view_requested = False
+    columnar_engine_settings = None
     validator = validator
 
     def __len__(self):
@@ -32,21 +67,10 @@ class HypatiaDB(BaseStarCollection):
         # chemical-element names and all nested components
         self.collection_add_index(index_name='normalizations.$**', ascending=True, unique=False)
 
-    def doc_format(self, single_star: SingleStar):
+    def doc_format(self, single_star: SingleStar, fingerprint: str = None):
         simbad_doc = single_star.simbad_doc
-        exo = single_star.exo
-        if exo is None:
-            nea = None
-        else:
-            nea = {key: exo[key] for key in nea_data.keys() if key in exo.keys()}
-            if "stellar" in exo.keys():
-                nea['stellar'] = exo['stellar'].to_record()
-            if "planets" in exo.keys():
-                nea['planets'] = {}
-                for letter, pl_data in exo['planets'].items():
-                    nea['planets'][letter] = {
-                        name: value.to_record() if isinstance(value, ObjectParams) else value
-                        for name, value in pl_data.items()}
+        nea = nea_record(single_star.exo)
+        if nea is not None:
             simbad_doc['nea'] = nea['nea_name']
 
         # get the stellar parameters
@@ -144,25 +168,101 @@ class HypatiaDB(BaseStarCollection):
         if target_handles is None:
             target_handles = []
         doc['target_handles'] = sorted(target_handles)
+        if fingerprint is not None:
+            doc['fingerprint'] = fingerprint
         return doc
 
+    def add_found_data(self, single_star: SingleStar):
+        """
+        Updates the found catalogs, elements, and normalizations from a star that is not exported in this run, the
+        same sets that doc_format() collects, but from the normalized catalogs instead of the reduced abundances.
+        """
+        catalogs_this_star = single_star.available_abundance_catalogs
+        if len(catalogs_this_star) > 0:
+            self.added_catalogs.update(catalogs_this_star)
+            self.added_normalizations.add('absolute')
+            for catalog_name in catalogs_this_star:
+                single_catalog = single_star.__getattribute__(catalog_name)
+                self.added_normalizations.update(single_catalog.normalizations)
+                for element_id in single_catalog.available_abundances:
+                    if element_id.is_nlte:
+                        self.added_elements_nlte.add(element_id)
+                    else:
+                        self.added_elements.add(element_id)
+
     def add_star(self, single_star: SingleStar):
         doc = self.doc_format(single_star)
         self.add_one(doc=doc)
         print(f'Added {doc["_id"]} to the database')
 
-    def add_all_stars(self, single_stars: list[SingleStar]) -> int:
+    def add_all_stars(self, single_stars: list[SingleStar], fingerprints: dict[str, str] = None,
+                      chunk_size: int = export_chunk_size, upload_threads: int = export_upload_threads,
+                      bypass_validation: bool = False) -> int:
+        """
+        A streaming export, the documents are formatted in chunks of chunk_size and each chunk is sent as an
+        unordered insert_many by a pool of upload_threads, while the next chunks are formatted. At most
+        2 * upload_threads chunks are held in memory at once. Use bypass_validation=True for a bulk load,
+        see finish_bulk_load().
+        """
         print('Adding many stars to the database...')
-        print('  Formatting documents...')
-        docs = [self.doc_format(single_star) for single_star in single_stars]
-        if len(docs) > 0:
-            print(f'  Adding {len(docs)} stars to the database...')
-            result = self.add_many(docs=docs)
-            print(f'  ...upload completed, {len(result.inserted_ids)} stars added.')
-            return len(result.inserted_ids)
-        else:
+        if fingerprints is None:
+            fingerprints = {}
+        start_time = time.perf_counter()
+        inserted_count = 0
+        pending_uploads = deque()
+        # the upload spans are under the span that runs the export
+        upload_chunk = in_current_span(self.upload_chunk)
+        with ThreadPoolExecutor(max_workers=upload_threads) as executor:
+            for star_index in range(0, len(single_stars), chunk_size):
+                stars_chunk = single_stars[star_index:star_index + chunk_size]
+                with span('doc_format', items=len(stars_chunk)):
+                    docs_chunk = [self.doc_format(single_star,
+                                                  fingerprint=fingerprints.get(single_star.star_reference_name, None))
+                                  for single_star in stars_chunk]
+                pending_uploads.append(executor.submit(upload_chunk, docs_chunk, bypass_validation))
+                while len(pending_uploads) >= 2 * upload_threads:
+                    inserted_count += pending_uploads.popleft().result()
+            while pending_uploads:
+                inserted_count += pending_uploads.popleft().result()
+        if inserted_count == 0:
             print('No stars to add.')
             return 0
+        delta_time = time.perf_counter() - start_time
+        print(f'  ...upload completed, {inserted_count} stars added in {delta_time:.2f} seconds, '
+              f'{inserted_count / max(delta_time, 1e-9):.0f} documents per second.')
+        return inserted_count
+
+    def upload_chunk(self, docs_chunk: list[dict], bypass_validation: bool = False) -> int:
+        with span('mongo_upload', items=len(docs_chunk)):
+            result = self.collection.insert_many(docs_chunk, ordered=False,
+                                                 bypass_document_validation=bypass_validation)
+        return len(result.inserted_ids)
+
+    def get_fingerprints(self) -> dict[str, str | None]:
+        return {doc['_id']: doc.get('fingerprint', None)
+                for doc in self.collection.find({}, {'_id': 1, 'fingerprint': 1})}
+
+    def update_stars(self, single_stars: list[SingleStar], fingerprints: dict[str, str],
+                     removed_ids: set[str]) -> tuple[int, int]:
+        """
+        The incremental export, an upsert for each changed star and a delete for each star that is no longer in the
+        output. Returns the counts of (upserted or replaced, deleted) documents.
+        """
+        print('Updating changed stars in the database...')
+        with span('doc_format', items=len(single_stars)):
+            docs = [self.doc_format(single_star, fingerprint=fingerprints[single_star.star_reference_name])
+                    for single_star in single_stars]
+        write_requests = [ReplaceOne(filter={'_id': doc['_id']}, replacement=doc, upsert=True) for doc in docs]
+        if removed_ids:
+            write_requests.append(DeleteMany({'_id': {'$in': sorted(removed_ids)}}))
+        if not write_requests:
+            print('  No stars have changed.')
+            return 0, 0
+        with span('mongo_upload', items=len(write_requests)):
+            result = self.collection.bulk_write(write_requests, ordered=False)
+        updated_count = result.upserted_count + result.modified_count
+        print(f'  ...update completed, {updated_count} stars upserted, {result.deleted_count} stars deleted.')
+        return updated_count, result.deleted_count
 
     def get_abundance_count(self, norm_key: str = 'absolute', by_element: bool = False, count_stars: bool = False)\
             -> dict[str, int]:
@@ -232,6 +332,60 @@ class HypatiaDB(BaseStarCollection):
         ]
         return list(self.collection.aggregate(json_pipeline))
 
+    def enable_query_cache(self, get_data_version, max_entries: int = query_cache_size,
+                           version_check_s: float = query_cache_version_check_s):
+        """
+        Caches the results of frontend_pipeline(), get_data_version is usually SummaryCollection.get_data_version.
+        """
+        self.query_cache = QueryCache(get_data_version=get_data_version, max_entries=max_entries,
+                                      version_check_s=version_check_s)
+        # a plot view that is exported after the API starts is used from the next data version
+        self.query_cache.version_listeners.append(self.check_plot_view)
+
+    def get_plot_view(self) -> PlotViewCollection:
+        return PlotViewCollection(collection_name=f'{self.collection_name}{plot_view_suffix}', db_name=self.db_name,
+                                  verbose=self.verbose)
+
+    def enable_plot_view(self) -> bool:
+        """
+        Uses the plot view for the frontend_pipeline() queries, if the plot view has data. With the query cache, the
+        plot view is checked for again each time that the data version changes.
+        """
+        self.plot_view_requested = True
+        return self.check_plot_view()
+
+    def check_plot_view(self, data_version: str = None) -> bool:
+        """
+        Starts or stops using the plot view, and the columnar engine, by whether the plot view has data.
+        """
+        if not self.plot_view_requested:
+            return False
+        plot_view = self.plot_view if self.plot_view is not None else self.get_plot_view()
+        if plot_view.collection.estimated_document_count() == 0:
+            self.columnar_engine = None
+            self.plot_view = None
+            return False
+        self.plot_view = plot_view
+        if self.columnar_engine is None and self.columnar_engine_settings is not None:
+            self.columnar_engine = ColumnarEngine(plot_view=plot_view, **self.columnar_engine_settings)
+        return True
+
+    def enable_columnar_engine(self, get_data_version,
+                               version_check_s: float = query_cache_version_check_s) -> bool:
+        """
+        Runs the frontend_pipeline() queries for the plot view in memory, see hypatia.pipeline.star.columnar.
+        """
+        self.columnar_engine_settings = dict(get_data_version=get_data_version, version_check_s=version_check_s)
+        return self.enable_plot_view() and self.columnar_engine is not None
+
+    def enable_index_advisor(self, report_file: str = None, auto_write: bool = False) -> IndexAdvisor:
+        """
+        Runs explain for each new shape of the frontend_pipeline() queries that go to the database,
+        see hypatia.pipeline.star.index_advisor.
+        """
+        self.index_advisor = IndexAdvisor(report_file=report_file, auto_write=auto_write)
+        return self.index_advisor
+
     def frontend_pipeline(self, db_formatted_names: list[str] = None,
                           db_formatted_names_exclude: bool = False,
                           elements_returned: list[ElementID] = None,
@@ -258,7 +412,7 @@ class HypatiaDB(BaseStarCollection):
                           return_hover: bool = False,
                           return_targets: bool = False,
                           **kwargs) -> list:
-        json_pipeline = frontend_pipeline(
+        query_args = dict(
             db_formatted_names=db_formatted_names,
             db_formatted_names_exclude=db_formatted_names_exclude,
             elements_returned=elements_returned,
@@ -285,13 +439,94 @@ class HypatiaDB(BaseStarCollection):
             return_hover=return_hover,
             return_targets=return_targets,
         )
+        if self.query_cache is not None:
+            cache_key = query_key(**query_args)
+            cached_results = self.query_cache.get(cache_key)
+            if cached_results is not None:
+                return cached_results
+            data_version = self.query_cache.data_version
+        use_plot_view = self.plot_view is not None
+        json_pipeline = frontend_pipeline(**query_args, plot_view=use_plot_view)
         if DEBUG:
             for stage_index, stage in list(enumerate(json_pipeline)):
                 print(f'Pipeline Stage {stage_index + 1: 2}):', stage)
         # run the aggregation pipeline and return the results.
-        raw_results = list(self.collection.aggregate(json_pipeline))
+        if use_plot_view and self.columnar_engine is not None:
+            try:
+                raw_results = self.columnar_engine.run(json_pipeline)
+            except (UnsupportedPipeline, StaleSnapshot) as error:
+                if DEBUG:
+                    print(f'Columnar engine fallback to the database: {error}')
+                raw_results = list(self.plot_view.collection.aggregate(json_pipeline))
+        else:
+            query_collection = self.plot_view.collection if use_plot_view else self.collection
+            raw_results = self.run_aggregation(query_collection, json_pipeline)
+        if self.query_cache is not None:
+            self.query_cache.put(cache_key, raw_results, data_version=data_version)
+        return raw_results
+
+    def run_aggregation(self, query_collection, json_pipeline: list[dict]) -> list[dict]:
+        start_time = time.time()
+        raw_results = list(query_collection.aggregate(json_pipeline))
+        if self.index_advisor is not None:
+            self.index_advisor.record(collection=query_collection, json_pipeline=json_pipeline,
+                                      run_s=time.time() - start_time)
         return raw_results
 
+    def frontend_histogram(self, histogram_field: str, bins: int = histogram_bins, **query_args) -> dict[str, any]:
+        """
+        The histogram of histogram_field for the frontend_pipeline() rows, for all the rows and for the rows with a
+        nea_name, with the same bins and counts as numpy.histogram(), null values are not counted. The database counts
+        the bins, or the columnar engine when it is enabled, so the rows are not returned.
+        """
+        if self.query_cache is not None:
+            cache_key = query_key(**query_args, histogram_field=histogram_field, histogram_bins=bins)
+            cached_histogram = self.query_cache.get_value(cache_key)
+            if cached_histogram is not None:
+                return cached_histogram
+            data_version = self.query_cache.data_version
+        use_plot_view = self.plot_view is not None
+        if use_plot_view and self.columnar_engine is not None:
+            rows = self.frontend_pipeline(**query_args)
+            # like the database, only the numeric values are counted, the missing fields are not in the rows
+            rows = [row for row in rows if isinstance(row.get(histogram_field, None), (int, float))
+                    and not isinstance(row[histogram_field], bool)]
+            x_data = [row[histogram_field] for row in rows]
+            x_data_with_planet = [row[histogram_field] for row in rows if 'nea_name' in row.keys()]
+            hist_all, edges = np.histogram(x_data, bins=bins)
+            hist_planet, edges = np.histogram(x_data_with_planet, bins=edges)
+            histogram = dict(hist_all=hist_all, hist_planet=hist_planet, edges=edges, count=len(x_data),
+                             x_range=[min(x_data), max(x_data)] if x_data else None)
+        else:
+            query_collection = self.plot_view.collection if use_plot_view else self.collection
+            json_pipeline = frontend_pipeline(**query_args, plot_view=use_plot_view)
+            range_docs = self.run_aggregation(query_collection, json_pipeline + histogram_range_stages(histogram_field))
+            if range_docs and range_docs[0]['count']:
+                count, x_min, x_max = range_docs[0]['count'], range_docs[0]['min'], range_docs[0]['max']
+                first_edge, last_edge = x_min, x_max
+            else:
+                # numpy.histogram() uses the range 0 to 1 for no values
+                count, x_min, x_max = 0, None, None
+                first_edge, last_edge = 0, 1
+            if first_edge == last_edge:
+                first_edge, last_edge = first_edge - 0.5, last_edge + 0.5
+            edges = np.linspace(first_edge, last_edge, bins + 1, dtype=float)
+            hist_all = np.zeros(bins, dtype=np.intp)
+            hist_planet = np.zeros(bins, dtype=np.intp)
+            if count:
+                edge_to_bin = {edge: bin_index for bin_index, edge in enumerate(edges[:-1].tolist())}
+                for bucket_doc in self.run_aggregation(query_collection,
+                                                       json_pipeline + histogram_bucket_stages(histogram_field,
+                                                                                               edges.tolist())):
+                    bin_index = bins - 1 if bucket_doc['_id'] == 'last' else edge_to_bin[bucket_doc['_id']]
+                    hist_all[bin_index] += bucket_doc['all']
+                    hist_planet[bin_index] += bucket_doc['planet']
+            histogram = dict(hist_all=hist_all, hist_planet=hist_planet, edges=edges, count=count,
+                             x_range=[x_min, x_max] if count else None)
+        if self.query_cache is not None:
+            self.query_cache.put_value(cache_key, histogram, data_version=data_version)
+        return histogram
+
 
 if __name__ == '__main__':
     from itertools import product
@@ -0,0 +1,68 @@
+"""
+Fingerprints of the pipeline inputs for each star, used by the incremental mode of standard_output to find the stars
+that need to be reduced and exported again.
+
+A star's fingerprint hashes the catalog rows, the stellar parameters from every source, the NASA Exoplanet Archive
+record, the target handles and the star names. The run fingerprint hashes the inputs that are shared by all the stars
+(the normalization keys, the solar normalizations and the representative errors), and it is part of every star's
+fingerprint, so changing any of these will export all the stars again.
+"""
+import json
+import hashlib
+
+from hypatia.pipeline.star.db import nea_record
+from hypatia.element_error import plusminus_error
+from hypatia.pipeline.star.single import SingleStar
+from hypatia.sources.catalogs.solar_norm import solar_norm
+
+# increase this when the exported document format changes, to export all the stars again
+fingerprint_version = 1
+# get_representative_error() adds fallback errors to plusminus_error during the reduction, so the loaded errors
+# are copied here, before any reduction
+loaded_plusminus_error = {str(element_id): error for element_id, error in plusminus_error.items()}
+
+
+def hash_record(record) -> str:
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def run_fingerprint(norm_keys: list[str]) -> str:
+    norm_keys = sorted(norm_keys)
+    return hash_record({
+        'version': fingerprint_version,
+        'norm_keys': norm_keys,
+        # all the solar normalizations, the 'original' key uses the normalization of each catalog
+        'solar_norms': solar_norm.to_record(),
+        'plusminus_error': loaded_plusminus_error,
+    })
+
+
+def star_record(single_star: SingleStar) -> dict:
+    catalogs = {}
+    for catalog_name in single_star.available_abundance_catalogs:
+        single_catalog = single_star.__getattribute__(catalog_name)
+        catalogs[catalog_name] = {
+            'star_name': single_catalog.original_catalog_star_name,
+            'norm_key': single_catalog.original_catalog_norm,
+            'abundances': {str(element_id): single_catalog.__getattribute__(str(element_id))
+                           for element_id in single_catalog.available_abundances},
+        }
+    # the 'all' lists are made from sets, they are sorted so that the order is the same in every run
+    params = {param_name: {'curated': param_record['curated'],
+                           'all': sorted(param_record['all'], key=lambda record: json.dumps(record, sort_keys=True,
+                                                                                           default=str))}
+              for param_name, param_record in single_star.params.to_record().items()}
+    target_handles = single_star.target_handles
+    if target_handles is None:
+        target_handles = []
+    return {
+        'names': {key: value for key, value in single_star.simbad_doc.items() if key not in {'timestamp', 'nea'}},
+        'catalogs': catalogs,
+        'params': params,
+        'nea': nea_record(single_star.exo),
+        'targets': sorted(target_handles),
+    }
+
+
+def star_fingerprint(single_star: SingleStar, run_key: str) -> str:
+    return hash_record({'run': run_key, 'star': star_record(single_star)})
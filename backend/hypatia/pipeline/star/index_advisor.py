@@ -0,0 +1,264 @@
+"""
+An index advisor for the frontend_pipeline() queries.
+
+The website queries have a small number of distinct shapes, the same pipeline with different names, elements values
+and filter limits. The advisor groups the queries by shape, runs explain once for each new shape, and keeps a summary
+of the plan: the documents and index keys examined, the time, and the indexes that were used. The first $match stage
+of each shape is used to suggest a compound index, with the equality fields first and then a range field, the
+equality-sort-range rule from the MongoDB documentation. Suggestions that are a prefix of an existing index are
+skipped.
+
+Turn it on for the API with the INDEX_ADVISOR environment variable, or replay a log of the API query strings with
+explain_queries.py.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+from pymongo.errors import OperationFailure
+from pymongo.collection import Collection
+
+from hypatia.configs.file_paths import run_report_dir
+
+# the query operators that are index bounds for a range of values
+range_operators = {'$gt', '$gte', '$lt', '$lte', '$ne', '$nin', '$exists'}
+
+
+def pipeline_shape(value):
+    """
+    The pipeline with the literal values replaced by '?', the field names, field paths and operators are kept.
+    """
+    if isinstance(value, dict):
+        return {key: pipeline_shape(item) for key, item in value.items()}
+    elif isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, str) and not item.startswith('$') for item in value):
+            # a list of names or catalogs, the length does not change the shape
+            return '?[]'
+        return [pipeline_shape(item) for item in value]
+    elif isinstance(value, str):
+        return value if value.startswith('$') else '?'
+    elif isinstance(value, float):
+        return '?'
+    # None, bool, and int values are usually part of the stage, like {'_id': 0} and {'$ne': None}
+    return value
+
+
+def shape_id(shape) -> str:
+    return hashlib.sha1(json.dumps(shape, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:12]
+
+
+def find_values(record, key: str):
+    """
+    All the values for key in a nested explain result.
+    """
+    if isinstance(record, dict):
+        for record_key, value in record.items():
+            if record_key == key:
+                yield value
+            yield from find_values(value, key)
+    elif isinstance(record, list):
+        for item in record:
+            yield from find_values(item, key)
+
+
+def explain_summary(collection: Collection, json_pipeline: list[dict]) -> dict:
+    """
+    Runs explain for an aggregation pipeline and returns a summary of the winning plan.
+    """
+    try:
+        explain = collection.database.command('explain',
+                                              {'aggregate': collection.name, 'pipeline': json_pipeline, 'cursor': {}},
+                                              verbosity='executionStats')
+    except OperationFailure as error:
+        return {'error': str(error)}
+    execution_stats = next(find_values(explain, 'executionStats'), {})
+    winning_plans = list(find_values(explain, 'winningPlan'))
+    stages = sorted({stage for plan in winning_plans for stage in find_values(plan, 'stage')})
+    return {
+        'returned': execution_stats.get('nReturned', None),
+        'docs_examined': execution_stats.get('totalDocsExamined', None),
+        'keys_examined': execution_stats.get('totalKeysExamined', None),
+        'explain_ms': execution_stats.get('executionTimeMillis', None),
+        'collection_scan': 'COLLSCAN' in stages,
+        'indexes_used': sorted({index_name for plan in winning_plans for index_name in find_values(plan, 'indexName')}),
+        'stages': stages,
+    }
+
+
+def match_fields(query: dict, equality_fields: list[str], range_fields: list[str]):
+    """
+    Adds the fields of a $match query to equality_fields or range_fields, in the order of the query.
+    """
+    for key, condition in query.items():
+        if key == '$and':
+            for sub_query in condition:
+                match_fields(sub_query, equality_fields, range_fields)
+        elif key == '$or':
+            # an $or on a single field, like the element filters with a value or null, is one range of an index
+            or_fields = {field for sub_query in condition for field in sub_query.keys()}
+            if len(or_fields) == 1 and not next(iter(or_fields)).startswith('$'):
+                field = or_fields.pop()
+                if field not in range_fields and field not in equality_fields:
+                    range_fields.append(field)
+        elif key.startswith('$'):
+            continue
+        elif isinstance(condition, dict) and any(operator in range_operators for operator in condition.keys()):
+            if key not in range_fields and key not in equality_fields:
+                range_fields.append(key)
+        elif key not in equality_fields:
+            # plain values and $in are equality matches
+            equality_fields.append(key)
+            if key in range_fields:
+                range_fields.remove(key)
+
+
+def index_exists(fields: list[str], index_information: dict[str, dict]) -> bool:
+    """
+    True if the fields are a prefix of an existing index, or a single field that a wildcard index covers.
+    """
+    for index_record in index_information.values():
+        index_fields = [field for field, _direction in index_record['key']]
+        if index_fields[:len(fields)] == fields:
+            return True
+        if len(fields) == 1 and len(index_fields) == 1 and index_fields[0].endswith('$**'):
+            wildcard_prefix = index_fields[0][:-len('$**')]
+            if fields[0].startswith(wildcard_prefix):
+                return True
+    return False
+
+
+def suggest_indexes(json_pipeline: list[dict], index_information: dict[str, dict]) -> list[dict]:
+    """
+    The suggested index for the first $match stage of the pipeline, an empty list if an existing index covers it.
+    """
+    if not json_pipeline or '$match' not in json_pipeline[0].keys():
+        return []
+    equality_fields = []
+    range_fields = []
+    match_fields(json_pipeline[0]['$match'], equality_fields, range_fields)
+    # only one range field can limit the index bounds, so the compound index ends with the first one
+    fields = equality_fields + range_fields[:1]
+    if not fields or index_exists(fields, index_information):
+        return []
+    return [{
+        'keys': [[field, 1] for field in fields],
+        'equality': equality_fields,
+        'range': range_fields,
+    }]
+
+
+class IndexAdvisor:
+    def __init__(self, report_file: str = None, auto_write: bool = False):
+        """
+        Collects the explain summaries of the frontend_pipeline() shapes, see HypatiaDB.enable_index_advisor().
+        With auto_write, the report is written again after each new shape.
+        """
+        self.start_time = time.time()
+        if report_file is None:
+            time_str = time.strftime('%Y%m%d_%H%M%S', time.localtime(self.start_time))
+            report_file = os.path.join(run_report_dir, f'index_advisor_{time_str}.json')
+        self.report_file = report_file
+        self.auto_write = auto_write
+        self.shapes = {}
+        self.lock = threading.Lock()
+
+    def record(self, collection: Collection, json_pipeline: list[dict], run_s: float) -> dict:
+        """
+        Adds a run of the pipeline, explain is run the first time that a shape is seen.
+        """
+        shape = pipeline_shape(json_pipeline)
+        this_shape_id = shape_id(shape)
+        with self.lock:
+            shape_summary = self.shapes.get(this_shape_id, None)
+            is_new_shape = shape_summary is None
+            if is_new_shape:
+                shape_summary = self.shapes[this_shape_id] = {
+                    'shape_id': this_shape_id,
+                    'collection': f'{collection.database.name}.{collection.name}',
+                    'count': 0,
+                    'total_s': 0.0,
+                    'max_s': 0.0,
+                    'shape': shape,
+                    'example': json.loads(json.dumps(json_pipeline, default=str)),
+                }
+            shape_summary['count'] += 1
+            shape_summary['total_s'] += run_s
+            shape_summary['max_s'] = max(shape_summary['max_s'], run_s)
+        if is_new_shape:
+            shape_summary['plan'] = explain_summary(collection, json_pipeline)
+            shape_summary['suggested_indexes'] = suggest_indexes(json_pipeline, collection.index_information())
+            if self.auto_write:
+                self.write(verbose=False)
+        return shape_summary
+
+    def slowest(self, count: int = 10) -> list[dict]:
+        """
+        The shapes with the most total time.
+        """
+        with self.lock:
+            shape_summaries = list(self.shapes.values())
+        return sorted(shape_summaries, key=lambda shape_summary: shape_summary['total_s'], reverse=True)[:count]
+
+    def suggestions(self) -> list[dict]:
+        """
+        The suggested indexes over all the shapes, the index that would help the most total time is first.
+        """
+        suggested = {}
+        with self.lock:
+            shape_summaries = list(self.shapes.values())
+        for shape_summary in shape_summaries:
+            for index_suggestion in shape_summary.get('suggested_indexes', []):
+                key = (shape_summary['collection'], tuple(field for field, _direction in index_suggestion['keys']))
+                suggestion = suggested.setdefault(key, {'collection': shape_summary['collection'],
+                                                        'keys': index_suggestion['keys'], 'shapes': 0, 'count': 0,
+                                                        'total_s': 0.0})
+                suggestion['shapes'] += 1
+                suggestion['count'] += shape_summary['count']
+                suggestion['total_s'] += shape_summary['total_s']
+        return sorted(suggested.values(), key=lambda suggestion: suggestion['total_s'], reverse=True)
+
+    def to_record(self) -> dict:
+        return {
+            'start_time': self.start_time,
+            'end_time': time.time(),
+            'shapes': self.slowest(count=len(self.shapes)),
+            'suggestions': self.suggestions(),
+        }
+
+    def write(self, file_name: str = None, verbose: bool = True) -> str:
+        if file_name is None:
+            file_name = self.report_file
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        record = self.to_record()
+        with open(file_name, 'w') as f:
+            json.dump(record, f, indent=2)
+        if verbose:
+            print(f'Index advisor report written to: {file_name}')
+        return file_name
+
+    def print_summary(self, count: int = 10):
+        print(f'{len(self.shapes)} pipeline shapes, the {min(count, len(self.shapes))} slowest:')
+        for shape_summary in self.slowest(count=count):
+            plan = shape_summary.get('plan', {})
+            mean_s = shape_summary['total_s'] / shape_summary['count']
+            print(f"  {shape_summary['shape_id']} {shape_summary['collection']}: {shape_summary['count']} runs, "
+                  f"{shape_summary['total_s']:.3f} s total, {mean_s:.3f} s mean, {shape_summary['max_s']:.3f} s max")
+            if 'error' in plan.keys():
+                print(f"    explain failed: {plan['error']}")
+            elif plan:
+                indexes_used = ', '.join(plan['indexes_used']) if plan['indexes_used'] else 'no index'
+                print(f"    {plan['docs_examined']} docs and {plan['keys_examined']} keys examined for "
+                      f"{plan['returned']} returned, {plan['explain_ms']} ms, {indexes_used}"
+                      f"{' (COLLSCAN)' if plan['collection_scan'] else ''}")
+            print(f"    first stage: {json.dumps(shape_summary['shape'][0], default=str)}")
+        suggestions = self.suggestions()
+        if suggestions:
+            print('Suggested indexes:')
+            for suggestion in suggestions:
+                keys_str = ', '.join(f'{field}: {direction}' for field, direction in suggestion['keys'])
+                print(f"  {suggestion['collection']} {{{keys_str}}}: {suggestion['shapes']} shapes, "
+                      f"{suggestion['count']} runs, {suggestion['total_s']:.3f} s total")
+        else:
+            print('No new indexes suggested.')
@@ -1,18 +1,23 @@
 import copy
 import pickle
 
+import numpy as np
+
+from hypatia.tools.instrument import span
 from hypatia.pipeline.star.db import HypatiaDB
 from hypatia.element_error import plusminus_error
 from hypatia.pipeline.star.all import AllStarData
 from hypatia.tools.color_text import file_name_text
 from hypatia.configs.env_load import MONGO_DATABASE
 from hypatia.pipeline.summary import upload_summary
-from hypatia.sources.simbad.ops import get_star_data
-from hypatia.pipeline.params.filters import core_filter
+from hypatia.pipeline.star.single import SingleStar
+from hypatia.pipeline.abund_cat import normalize_catalogs
 from hypatia.tools.color_text import attention_yellow_text
 from hypatia.sources.catalogs.solar_norm import solar_norm
+from hypatia.pipeline.params.filters import core_filter, StarFeatures
 from hypatia.plots.element_rad_plot import make_element_distance_plots
 from hypatia.configs.file_paths import pickle_out, default_catalog_file
+from hypatia.pipeline.star.fingerprint import run_fingerprint, star_fingerprint
 
 
 def load_pickled_output():
@@ -22,8 +27,74 @@ def load_pickled_output():
 class OutputStarData(AllStarData):
     distance_bin_default = [0.0, 30.0, 60.0, 150.0]
 
+    def __init__(self, verbose=True, processes=1):
+        super().__init__(verbose=verbose, processes=processes)
+        # main_ids of the SingleStar objects this instance has its own copy of, all the other stars are shared
+        self.owned_stars = set()
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if 'owned_stars' not in state:
+            # pickled before the stars were shared, every star was a deep copy
+            self.owned_stars = set(self.star_index.keys())
+
     def receive_data(self, star_data):
-        self.__dict__.update(copy.deepcopy(star_data.__dict__))
+        """
+        Makes this instance a view of star_data. The SingleStar objects are shared with star_data and filtering only
+        removes stars from this view. A star is copied the first time it is changed, see writable_star().
+        """
+        shared_keys = {single_star.attr_name for single_star in star_data} \
+            | {'star_names', 'star_index', 'sorted_stars', 'owned_stars'}
+        self.__dict__.update(copy.deepcopy({key: value for key, value in star_data.__dict__.items()
+                                            if key not in shared_keys}))
+        self.star_names = set()
+        self.star_index = {}
+        self.sorted_stars = None
+        self.owned_stars = set()
+        for single_star in star_data:
+            self.add_star(single_star)
+        if isinstance(star_data, OutputStarData):
+            # the stars star_data owned are now shared, so star_data must also copy them before any change
+            star_data.owned_stars = set()
+
+    def writable_star(self, single_star: SingleStar) -> SingleStar:
+        """
+        Copy on write, returns this instance's own copy of single_star that can be changed without changing any
+        other instance that shares the star.
+        """
+        main_id = single_star.star_reference_name
+        if main_id not in self.owned_stars:
+            self.add_star(copy.deepcopy(self.star_index[main_id]))
+            self.owned_stars.add(main_id)
+        return self.star_index[main_id]
+
+    def reduce_elements(self, star_names: set[str] = None):
+        for single_star in self:
+            if star_names is None or single_star.star_reference_name in star_names:
+                self.writable_star(single_star)
+        super().reduce_elements(star_names=star_names)
+
+    def star_fingerprints(self) -> dict[str, str]:
+        """
+        The fingerprint of the pipeline inputs for each star, call this after normalize().
+        """
+        run_key = run_fingerprint(norm_keys=list(self.data_norms))
+        return {single_star.star_reference_name: star_fingerprint(single_star, run_key=run_key)
+                for single_star in self}
+
+    def find_changed_stars(self, fingerprints: dict[str, str]) -> tuple[set[str], set[str]]:
+        """
+        Compares the fingerprints to those in hypatiaDB and returns the main_ids of (changed or new, removed) stars.
+        """
+        hypatia_db = HypatiaDB(db_name=MONGO_DATABASE, collection_name='hypatiaDB')
+        db_fingerprints = hypatia_db.get_fingerprints()
+        changed_ids = {main_id for main_id, fingerprint in fingerprints.items()
+                       if db_fingerprints.get(main_id, None) != fingerprint}
+        removed_ids = set(db_fingerprints.keys()) - set(fingerprints.keys())
+        if self.verbose:
+            print(f'{len(changed_ids)} of {len(fingerprints)} stars are changed or new, '
+                  f'{len(removed_ids)} stars were removed.')
+        return changed_ids, removed_ids
 
     def pickle_myself(self):
         if self.verbose:
@@ -36,37 +107,32 @@ class OutputStarData(AllStarData):
         if star_data is not None:
             self.receive_data(star_data)
         for single_star in self:
-            self.__delattr__(single_star.attr_name)
-        self.star_names = main_star_ids
-        for main_id in self.star_names:
-            single_star_data = single_star_dicts[main_id]
-            self.__setattr__(single_star_data.attr_name, copy.deepcopy(single_star_data))
+            self.remove_star(single_star)
+        for main_id in main_star_ids:
+            self.add_star(copy.deepcopy(single_star_dicts[main_id]))
+            self.owned_stars.add(main_id)
 
     def __add__(self, other):
         # get the data from this instance of OutputStarData
         new_output = OutputStarData()
-        # a copy of this instance
+        # a view of this instance
         new_output.receive_data(star_data=self)
-        # add in all the SingleStarData that is in other but not in the instance
+        # add in all the SingleStarData that is in other but not in the instance, these stars are shared with other
         for star_name in other.star_names - self.star_names:
-            simbad_doc = get_star_data(star_name, test_origin="OutputStarData")
-            attr_name = simbad_doc['attr_name']
-            main_id = simbad_doc['_id']
-            new_output.__setattr__(attr_name, copy.deepcopy(other.__getattribute__(attr_name)))
-            new_output.star_names.add(main_id)
+            new_output.add_star(other.star_index[star_name])
+        if isinstance(other, OutputStarData):
+            other.owned_stars = set()
         # For the star names that overlap, add all the available data types that are missing.
         for star_name in other.star_names & self.star_names:
-            simbad_doc = get_star_data(star_name, test_origin="OutputStarData")
-            attr_name = simbad_doc['attr_name']
-            other_star_data = other.__getattribute__(attr_name)
-            self_star_data = self.__getattribute__(attr_name)
+            other_star_data = other.star_index[star_name]
+            self_star_data = self.star_index[star_name]
             # add missing data_types
             for data_type in other_star_data.available_data_types - self_star_data.available_data_types:
-                new_output.__getattribute__(attr_name)\
-                    .__setattr__(data_type, copy.deepcopy(other_star_data.__getattribute__(data_type)))
-                new_output.__getattribute__(attr_name).available_data_types.add(data_type)
+                new_star_data = new_output.writable_star(self_star_data)
+                new_star_data.__setattr__(data_type, copy.deepcopy(other_star_data.__getattribute__(data_type)))
+                new_star_data.available_data_types.add(data_type)
                 if data_type not in self.non_abundance_data_types:
-                    new_output.__getattribute__(attr_name).available_abundance_catalogs.add(data_type)
+                    new_star_data.available_abundance_catalogs.add(data_type)
         return new_output
 
     def filter_by_available_data_type(self, and_logic_for_multiples, target_types, return_only_targets=False,
@@ -85,9 +151,9 @@ class OutputStarData(AllStarData):
             target_found_flag = core_filter(and_logic_for_multiples, target_types, available_data_types)
             if not (target_found_flag and not keep_compliment):
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(single_star.star_reference_name)
+                self.remove_star(single_star)
             elif return_only_targets:
+                single_star = self.writable_star(single_star)
                 if keep_compliment:
                     for type_to_remove in target_types:
                         data_types_removed += 1
@@ -119,8 +185,7 @@ class OutputStarData(AllStarData):
             available_data_types = single_star.available_abundance_catalogs
             if not (len(available_data_types) >= minimum_cat_count and not keep_compliment):
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(single_star.star_reference_name)
+                self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed)
             if self.star_names == set():
@@ -140,8 +205,7 @@ class OutputStarData(AllStarData):
             target_found_flag = core_filter(and_logic_for_multiples, target_types, available_object_parameters)
             if not (target_found_flag and not keep_compliment):
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(single_star.star_reference_name)
+                self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed)
             if self.star_names == set():
@@ -157,12 +221,11 @@ class OutputStarData(AllStarData):
                 logic_str = "using 'Or' logic."
             print("Filtering on each stellar object's available name types", target_types, logic_str)
         for single_star in self:
-            available_star_name_types = set(single_star.star_names_dict.keys())
+            available_star_name_types = single_star.available_star_name_types
             target_found_flag = core_filter(and_logic_for_multiples, target_types, available_star_name_types)
             if not (target_found_flag and not keep_compliment):
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(single_star.star_reference_name)
+                self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed)
             if self.star_names == set():
@@ -182,13 +245,12 @@ class OutputStarData(AllStarData):
                 print(" ", target, "target values of", match_values, ".")
             for single_star in self:
                 if target == "sptype":
-                    value = single_star.params.spyype.value[0]
+                    value = single_star.params.sptype.value[0]
                 else:
                     value = single_star.params.__getattribute__(target).value
                 if not (value in match_values and not keep_compliment):
                     stars_removed += 1
-                    self.__delattr__(single_star.attr_name)
-                    self.star_names.remove(single_star.star_reference_name)
+                    self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed)
             if self.star_names == set():
@@ -219,8 +281,7 @@ class OutputStarData(AllStarData):
                         above_lower = False
                 if not (above_lower and below_upper and not keep_compliment):
                     stars_removed += 1
-                    self.__delattr__(single_star.attr_name)
-                    self.star_names.remove(single_star.star_reference_name)
+                    self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed)
             if self.star_names == set():
@@ -248,6 +309,7 @@ class OutputStarData(AllStarData):
                     an_element_found_this_star = True
                 if not an_element_found_this_catalog:
                     catalogs_removed += 1
+                    single_star = self.writable_star(single_star)
                     single_star.__delattr__(short_catalog_name)
                     single_star.available_abundance_catalogs.remove(short_catalog_name)
                     try:
@@ -256,8 +318,7 @@ class OutputStarData(AllStarData):
                         pass
             if not an_element_found_this_star or (and_logic_for_multiples and elements_not_found_this_star != set()):
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(single_star.star_reference_name)
+                self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed, "  Catalogs removed:", catalogs_removed)
             if self.star_names == set():
@@ -293,6 +354,7 @@ class OutputStarData(AllStarData):
                     bounds_satisfied_at_least_one_catalog = True
                 if not all_values_in_bounds:
                     catalogs_removed += 1
+                    single_star = self.writable_star(single_star)
                     single_star.__delattr__(short_catalog_name)
                     single_star.available_abundance_catalogs.remove(short_catalog_name)
                     try:
@@ -301,8 +363,7 @@ class OutputStarData(AllStarData):
                         pass
             if not bounds_satisfied_at_least_one_catalog:
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(single_star.star_reference_name)
+                self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed, "  Catalogs removed:", catalogs_removed)
             if self.star_names == set():
@@ -327,13 +388,13 @@ class OutputStarData(AllStarData):
                     min_requirements_this_star = True
                 else:
                     catalogs_removed += 1
+                    single_star = self.writable_star(single_star)
                     single_star.__delattr__(short_catalog_name)
                     single_star.available_abundance_catalogs.remove(short_catalog_name)
                     single_star.available_data_types.remove(short_catalog_name)
             if not min_requirements_this_star:
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(single_star.star_reference_name)
+                self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed, "  Catalogs removed:", catalogs_removed)
             if self.star_names == set():
@@ -351,6 +412,9 @@ class OutputStarData(AllStarData):
                 this_catalog = single_star.__getattribute__(short_catalog_name)
                 elements_this_catalog = this_catalog.available_abundances
                 nlte_abundances = {abundance for abundance in elements_this_catalog if abundance.is_nlte}
+                if nlte_abundances:
+                    single_star = self.writable_star(single_star)
+                    this_catalog = single_star.__getattribute__(short_catalog_name)
                 for nlte_abundance in nlte_abundances:
                     this_catalog.__delattr__(str(nlte_abundance))
                     this_catalog.available_abundances.remove(nlte_abundance)
@@ -360,6 +424,7 @@ class OutputStarData(AllStarData):
                     an_element_found_this_star = True
                 else:
                     catalogs_removed += 1
+                    single_star = self.writable_star(single_star)
                     single_star.__delattr__(short_catalog_name)
                     single_star.available_abundance_catalogs.remove(short_catalog_name)
                     try:
@@ -368,8 +433,7 @@ class OutputStarData(AllStarData):
                         pass
             if not an_element_found_this_star:
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(single_star.star_reference_name)
+                self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed, "  Catalogs removed:", catalogs_removed)
             if self.star_names == set():
@@ -379,14 +443,10 @@ class OutputStarData(AllStarData):
         stars_removed = 0
         if self.verbose:
             print("Removing not target star.")
-        for main_id in list(self.star_names):
-            simbad_doc = get_star_data(main_id)
-            attr_name = simbad_doc['attr_name']
-            single_star = self.__getattribute__(attr_name)
+        for single_star in self:
             if matching_truth_value != single_star.is_target:
                 stars_removed += 1
-                self.__delattr__(single_star.attr_name)
-                self.star_names.remove(main_id)
+                self.remove_star(single_star)
         if self.verbose:
             print("  Stars removed:", stars_removed)
             if self.star_names == set():
@@ -486,26 +546,66 @@ class OutputStarData(AllStarData):
                                         is_target==True, and False selects SingleStar instances where is_target==False.
         :return: self.output_star_data
         """
+        star_list = list(self)
+        features = StarFeatures(star_list)
+        star_masks = []
+        # star level filters, these are combined as numpy masks and the stars are removed in one step
         if has_exoplanet is not None:
-            self.filter_by_available_data_type(and_logic_for_multiples=True, target_types={'exo'},
-                                               keep_compliment=keep_complement)
+            star_masks.append(("has exoplanet ('exo' data type)",
+                               features.data_types.core_mask(and_logic_for_lists=True, target_types={'exo'}), True))
         if target_catalogs is not None:
-            self.filter_by_available_data_type(and_logic_for_multiples=not or_logic_for_catalogs,
-                                               target_types=target_catalogs,
-                                               return_only_targets=catalogs_return_only_targets,
-                                               keep_compliment=keep_complement)
+            star_masks.append((f'catalogs {sorted(target_catalogs)}',
+                               features.data_types.core_mask(and_logic_for_lists=not or_logic_for_catalogs,
+                                                             target_types=set(target_catalogs)), True))
         if min_catalog_count is not None:
-            self.filter_by_min_cat_count(minimum_cat_count=min_catalog_count, keep_compliment=keep_complement)
+            # returning only the target catalogs removes the other catalogs before the count
+            count_keys = set(target_catalogs) if target_catalogs is not None and catalogs_return_only_targets else None
+            star_masks.append((f'at least {min_catalog_count} catalogs',
+                               features.abundance_catalogs.count(keys=count_keys) >= min_catalog_count, True))
         if target_params is not None:
-            self.filter_by_object_parameters(and_logic_for_multiples=and_logic_for_params,
-                                             target_types=target_params, keep_compliment=keep_complement)
+            star_masks.append((f'stellar parameters {sorted(target_params)}',
+                               features.params.core_mask(and_logic_for_lists=and_logic_for_params,
+                                                         target_types={target.lower() for target in target_params}),
+                               True))
         if target_star_name_types is not None:
-            self.filter_by_object_name_types(and_logic_for_multiples=and_logic_for_star_names,
-                                             target_types=target_star_name_types, keep_compliment=keep_complement)
+            star_masks.append((f'star name types {sorted(target_star_name_types)}',
+                               features.name_types.core_mask(and_logic_for_lists=and_logic_for_star_names,
+                                                             target_types=set(target_star_name_types)), True))
         if parameter_match_filter is not None:
-            self.match_filter_for_object_parameters(targets=parameter_match_filter, keep_compliment=keep_complement)
+            for target, match_values in parameter_match_filter:
+                star_masks.append((f'{target.lower()} in {match_values}',
+                                   features.match_mask(param_name=target.lower(), match_values=match_values), True))
         if parameter_bound_filter is not None:
-            self.bound_filter_for_object_parameters(targets=parameter_bound_filter, keep_compliment=keep_complement)
+            for target, lower_bound, upper_bound in parameter_bound_filter:
+                star_masks.append((f'{lower_bound} <= {target.lower()} < {upper_bound}',
+                                   features.bound_mask(param_name=target.lower(), lower_bound=lower_bound,
+                                                       upper_bound=upper_bound), True))
+        if target_elements is not None and not catalogs_return_only_targets:
+            # only the stars, catalogs without the target elements are removed by filter_by_available_abundances()
+            star_masks.append((f'elements {sorted(target_elements, key=str)}',
+                               features.elements.core_mask(and_logic_for_lists=not or_logic_for_element,
+                                                           target_types=set(target_elements)), False))
+        if is_target is not None:
+            star_masks.append((f'is_target={is_target}', features.is_target == is_target, False))
+        keep_mask = np.ones(len(star_list), dtype=bool)
+        for filter_description, star_mask, uses_complement in star_masks:
+            if uses_complement and keep_complement:
+                # the same as 'not (target_found_flag and not keep_compliment)' in the single star filters
+                star_mask = np.zeros(len(star_list), dtype=bool)
+            if self.verbose:
+                print(f'Filtering for {filter_description}.')
+                print('  Stars removed:', int(np.count_nonzero(keep_mask & ~star_mask)))
+            keep_mask &= star_mask
+        for star_index in np.flatnonzero(~keep_mask):
+            self.remove_star(star_list[star_index])
+        if self.verbose and star_masks and self.star_names == set():
+            print("    The star filters have ended with and empty set of data.")
+        # catalog level filters, these change the catalogs of the remaining stars
+        if target_catalogs is not None and catalogs_return_only_targets:
+            self.filter_by_available_data_type(and_logic_for_multiples=not or_logic_for_catalogs,
+                                               target_types=target_catalogs,
+                                               return_only_targets=catalogs_return_only_targets,
+                                               keep_compliment=keep_complement)
         if target_elements is not None:
             self.filter_by_available_abundances(and_logic_for_multiples=not or_logic_for_element,
                                                 target_types=target_elements)
@@ -515,8 +615,6 @@ class OutputStarData(AllStarData):
             self.remove_nlte()
         if at_least_fe_and_another:
             self.min_abundance_check()
-        if is_target is not None:
-            self.remove_non_targets(matching_truth_value=is_target)
         if self.verbose:
             print("Filtering complete.\n")
 
@@ -535,17 +633,18 @@ class OutputStarData(AllStarData):
         """
         if norm_keys is None:
             norm_keys = ['original']
-        for norm_key in norm_keys:
-            if self.verbose:
-                print(f"Normalizing abundance data using the {norm_key} solar normalization for all data.")
-            for single_star in self:
-                for catalog_short_name in list(single_star.available_abundance_catalogs):
-                    this_catalog = single_star.__getattribute__(catalog_short_name)
-                    this_catalog.normalize(norm_key)
-            self.data_norms.add(norm_key)
-            if self.verbose:
-                print("  Normalization complete.\n")
-                print(f"Adding catalog into: {attention_yellow_text(default_catalog_file)}\n")
+        if self.verbose:
+            print(f"Normalizing abundance data using the {norm_keys} solar normalizations for all data.")
+        # all the catalogs of all the stars are normalized into every norm_key together
+        catalogs = [self.writable_star(single_star).__getattribute__(catalog_short_name)
+                    for single_star in self
+                    for catalog_short_name in sorted(single_star.available_abundance_catalogs)]
+        with span('normalization', items=len(catalogs)):
+            normalize_catalogs(catalogs=catalogs, norm_keys=norm_keys)
+        self.data_norms.update(norm_keys)
+        if self.verbose:
+            print("  Normalization complete.\n")
+            print(f"Adding catalog into: {attention_yellow_text(default_catalog_file)}\n")
 
     def get_element_ratio_and_distance(self, element_set=None,
                                        distance_list=None, xlimits_list=None, ylimits_list=None,
@@ -555,7 +654,7 @@ class OutputStarData(AllStarData):
         if self.stats is None:
             self.do_stats()
         if element_set is None:
-            element_set = set(self.stats.element_count.keys()) - {"Fe"}
+            element_set = {str(element_id) for element_id in self.stats.result.star_count_per_element.keys()} - {"Fe"}
         if self.verbose:
             print("Starting Element Ratio and Distance Plots... \n")
             print(len(element_set), "elements are being plotted.")
@@ -578,10 +677,8 @@ class OutputStarData(AllStarData):
                 temp_output_star_data.filter(target_elements=[element],
                                              parameter_bound_filter=[('dist', lower_bound, upper_bound)],
                                              has_exoplanet=has_exoplanet)
-                for star_name in temp_output_star_data.star_names:
-                    simbad_doc = get_star_data(star_name, test_origin="OutputStarData")
-                    attr_name = simbad_doc['attr_name']
-                    reduced_data_this_star = temp_output_star_data.__getattribute__(attr_name).reduced_abundances
+                for single_star in temp_output_star_data:
+                    reduced_data_this_star = single_star.reduced_abundances
                     if use_median:
                         iron_value = reduced_data_this_star.Fe.median
                         y_data.append(reduced_data_this_star.__getattribute__(element).median - iron_value)
@@ -598,11 +695,38 @@ class OutputStarData(AllStarData):
             print("  ...Element Ratio and Distance Plots completed \n")
 
     def export_to_mongo(self, catalogs_file_name: str = default_catalog_file,
-                        target_web_data: dict[str, dict[str, str | list[str]]]  = None):
+                        target_web_data: dict[str, dict[str, str | list[str]]]  = None,
+                        fingerprints: dict[str, str] = None,
+                        changed_ids: set[str] = None, removed_ids: set[str] = None):
+        """
+        With changed_ids=None, all the stars are loaded into a staging collection that is then swapped in for
+        hypatiaDB, keeping the last version as hypatiaDB_previous. Otherwise, only the stars in changed_ids are
+        upserted and the stars in removed_ids are deleted, see find_changed_stars(). The plot view, hypatiaDB_plot,
+        is updated in the same way.
+        """
         hypatia_db = HypatiaDB(db_name=MONGO_DATABASE, collection_name='hypatiaDB')
-        hypatia_db.reset()
-        # [hypatia_db.add_star(single_star) for single_star in self]
-        hypatia_db.add_all_stars([single_star for single_star in self])
+        if changed_ids is None:
+            staging_db = hypatia_db.staging_collection(bulk_load=True)
+            # [staging_db.add_star(single_star) for single_star in self]
+            staging_db.add_all_stars([single_star for single_star in self], fingerprints=fingerprints,
+                                     bypass_validation=True)
+            staging_db.finish_bulk_load()
+            # the flat plot view for the website queries, built from the loaded documents
+            plot_view = hypatia_db.get_plot_view()
+            plot_staging = plot_view.staging_collection(bulk_load=True)
+            plot_staging.add_from(staging_db, bypass_validation=True)
+            plot_staging.finish_bulk_load()
+            hypatia_db.swap_in(staging_db)
+            plot_view.swap_in(plot_staging)
+        else:
+            hypatia_db.update_stars([single_star for single_star in self
+                                     if single_star.star_reference_name in changed_ids],
+                                    fingerprints=fingerprints, removed_ids=removed_ids or set())
+            hypatia_db.get_plot_view().update_stars(hypatia_db, star_ids=changed_ids | (removed_ids or set()))
+            # the summary is for all the stars, including those that were not exported
+            for single_star in self:
+                if single_star.star_reference_name not in changed_ids:
+                    hypatia_db.add_found_data(single_star)
         # add the summary and site-wide information
         found_elements = hypatia_db.added_elements
         found_element_nlte = hypatia_db.added_elements_nlte
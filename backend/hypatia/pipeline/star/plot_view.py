@@ -0,0 +1,128 @@
+"""
+The plot view is a flat copy of the Hypatia database that is built at export time for the website queries.
+
+The hypatiaDB documents are nested, so frontend_pipeline() has to reshape them on every request, with $objectToArray
+and $unwind for the planets and long paths like normalizations.<norm>.<element>.median. The plot view has one
+document per star and one document per planet (with the data of its host star), and every value is a top-level field:
+
+    <norm>__<element>__<statistic>    for the abundances, with norm 'absolute' or a normalization key
+    stellar__<param>                  for the curated stellar parameter value, and stellar__<param>__err, ...
+    planet__<param>                   for the planet parameter value, and planet__<param>__err, ...
+
+The per-catalog abundances are stored as parallel arrays that are sorted by value, <norm>__<element>__cat_handles
+with the catalog handles, and __cat_values and __cat_linear with the values. A query for a subset of catalogs then
+selects from these arrays, see catalog_subset_stats(), instead of sorting the catalogs object of every document.
+"""
+from hypatia.collect import BaseCollection
+from hypatia.tools.instrument import span
+from hypatia.configs.source_settings import export_chunk_size
+
+# the plot view for a collection named hypatiaDB is named hypatiaDB_plot
+plot_view_suffix = '_plot'
+# abundance statistics that are copied to the plot view, the catalogs are sorted by value like frontend_pipeline()
+plot_view_statistics = ['median', 'mean', 'plusminus', 'catalogs']
+
+
+def flat_field(*parts) -> str:
+    return '__'.join([str(part) for part in parts])
+
+
+def flat_param_fields(prefix: str, params: dict[str, dict]) -> dict[str, any]:
+    flat_fields = {}
+    for param_name, param_record in params.items():
+        for key, value in param_record.items():
+            if key == 'value':
+                flat_fields[flat_field(prefix, param_name)] = value
+            else:
+                flat_fields[flat_field(prefix, param_name, key)] = value
+    return flat_fields
+
+
+def plot_view_docs(doc: dict) -> list[dict]:
+    """
+    The plot view documents for one hypatiaDB document, the star and then each of its planets.
+    """
+    star_id = doc['_id']
+    names = doc.get('names', {})
+    star_doc = {
+        '_id': star_id,
+        'star_id': star_id,
+        'is_planet': False,
+        'match_names': names.get('match_names', []),
+        'names': names,
+        'target_handles': doc.get('target_handles', []),
+    }
+    nea = doc.get('nea', None)
+    if nea is not None and 'nea_name' in nea.keys():
+        star_doc['nea_name'] = nea['nea_name']
+    norms = {}
+    if 'absolute' in doc.keys():
+        norms['absolute'] = doc['absolute']
+    norms.update(doc.get('normalizations', {}))
+    for norm_key, element_records in norms.items():
+        for element_str, element_record in element_records.items():
+            for statistic in plot_view_statistics:
+                if statistic in element_record.keys():
+                    value = element_record[statistic]
+                    if statistic == 'catalogs':
+                        value = dict(sorted(value.items(), key=lambda item: item[1]))
+                    star_doc[flat_field(norm_key, element_str, statistic)] = value
+            if 'catalogs' in element_record.keys():
+                # the linear values sort in the same order as the log values
+                catalogs_linear = element_record.get('catalogs_linear', {})
+                sorted_catalogs = sorted(element_record['catalogs'].items(), key=lambda item: item[1])
+                star_doc[flat_field(norm_key, element_str, 'cat_handles')] = [handle for handle, _ in sorted_catalogs]
+                star_doc[flat_field(norm_key, element_str, 'cat_values')] = [value for _, value in sorted_catalogs]
+                star_doc[flat_field(norm_key, element_str, 'cat_linear')] = [catalogs_linear.get(handle, 10.0 ** value)
+                                                                             for handle, value in sorted_catalogs]
+    star_doc.update(flat_param_fields('stellar', {param_name: param_record['curated']
+                                                  for param_name, param_record in doc.get('stellar', {}).items()
+                                                  if 'curated' in param_record.keys()}))
+    docs = [star_doc]
+    if nea is not None:
+        for letter, planet_record in nea.get('planets', {}).items():
+            planet_doc = {key: value for key, value in star_doc.items() if key != 'nea_name'}
+            planet_doc['_id'] = f'{star_id}|{letter}'
+            planet_doc['is_planet'] = True
+            planet_doc['letter'] = planet_record.get('letter', None)
+            planet_doc['pl_name'] = planet_record.get('pl_name', None)
+            planet_doc.update(flat_param_fields('planet', planet_record.get('planetary', {})))
+            docs.append(planet_doc)
+    return docs
+
+
+class PlotViewCollection(BaseCollection):
+    def create_indexes(self):
+        self.collection_add_index(index_name='star_id', ascending=True, unique=False)
+        self.collection_compound_index({'is_planet': 1, 'match_names': 1})
+        # any single flat field, for the element and parameter filters and sorts
+        self.collection_add_index(index_name='$**', ascending=True, unique=False)
+
+    def add_from(self, source: BaseCollection, query: dict = None, chunk_size: int = export_chunk_size,
+                 bypass_validation: bool = False) -> int:
+        """
+        Adds the plot view documents for the hypatiaDB documents in source that match the query.
+        """
+        added_count = 0
+        docs_chunk = []
+        with span('plot_view') as this_span:
+            for doc in source.find_all(query):
+                docs_chunk.extend(plot_view_docs(doc))
+                if len(docs_chunk) >= chunk_size:
+                    added_count += len(self.add_many(docs_chunk, bypass_validation=bypass_validation).inserted_ids)
+                    docs_chunk = []
+            if docs_chunk:
+                added_count += len(self.add_many(docs_chunk, bypass_validation=bypass_validation).inserted_ids)
+            this_span.items = added_count
+        if self.verbose:
+            print(f'Added {added_count} documents to the plot view {self.db_name}.{self.collection_name}')
+        return added_count
+
+    def update_stars(self, source: BaseCollection, star_ids: set[str]) -> int:
+        """
+        Replaces the plot view documents for star_ids, the stars that are no longer in source are removed.
+        """
+        if not star_ids:
+            return 0
+        self.collection.delete_many({'star_id': {'$in': sorted(star_ids)}})
+        return self.add_from(source, query={'_id': {'$in': sorted(star_ids)}})
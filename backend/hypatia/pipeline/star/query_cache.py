@@ -0,0 +1,124 @@
+"""
+A result cache for HypatiaDB.frontend_pipeline().
+
+The key is made from the query arguments in a canonical form, so the same query always has the same key, no matter
+how the website built its sets and dictionaries. The cache holds at most max_entries results and evicts the least
+recently used one. Each result is stored with the data version from the summary document, see upload_summary(), and
+the whole cache is cleared when a new version is published. The functions in version_listeners are called with the
+new version after the cache is cleared.
+"""
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+from hypatia.elements import ElementID, RatioID
+from hypatia.configs.source_settings import query_cache_size, query_cache_version_check_s
+
+
+def canonical_value(value):
+    """
+    A hashable form of a query argument, sets and dictionaries are sorted, lists keep their order since this is the
+    order of the returned columns.
+    """
+    if isinstance(value, (ElementID, RatioID)):
+        # repr() keeps ElementID(Fe) and the string 'Fe' as different values
+        return repr(value)
+    elif isinstance(value, dict):
+        return ('dict', tuple(sorted(((canonical_value(key), canonical_value(item)) for key, item in value.items()),
+                                     key=repr)))
+    elif isinstance(value, (set, frozenset)):
+        return ('set', tuple(sorted((canonical_value(item) for item in value), key=repr)))
+    elif isinstance(value, (list, tuple)):
+        return tuple(canonical_value(item) for item in value)
+    return value
+
+
+def query_key(**query_args) -> tuple:
+    return tuple((arg_name, canonical_value(query_args[arg_name])) for arg_name in sorted(query_args.keys()))
+
+
+class QueryCache:
+    def __init__(self, get_data_version, max_entries: int = query_cache_size,
+                 version_check_s: float = query_cache_version_check_s):
+        """
+        get_data_version is called at most once every version_check_s seconds to find if the data has changed.
+        """
+        self.get_data_version = get_data_version
+        self.max_entries = max_entries
+        self.version_check_s = version_check_s
+        self.results = OrderedDict()
+        self.data_version = None
+        self.last_version_check = None
+        self.hits = 0
+        self.misses = 0
+        self.version_listeners = []
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def check_data_version(self):
+        now = time.monotonic()
+        if self.last_version_check is not None and now - self.last_version_check < self.version_check_s:
+            return
+        self.last_version_check = now
+        data_version = self.get_data_version()
+        with self.lock:
+            is_new_version = data_version != self.data_version
+            if is_new_version:
+                self.results.clear()
+                self.data_version = data_version
+        if is_new_version:
+            for version_listener in self.version_listeners:
+                version_listener(data_version)
+
+    def lookup(self, key: tuple):
+        self.check_data_version()
+        with self.lock:
+            value = self.results.get(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self.results.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def store(self, key: tuple, value, data_version: str | None):
+        """
+        data_version is the version when the query was started, results from an older version are not stored.
+        """
+        with self.lock:
+            if data_version != self.data_version:
+                return
+            self.results[key] = value
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+
+    def get(self, key: tuple) -> list[dict] | None:
+        rows = self.lookup(key)
+        if rows is None:
+            return None
+        # the callers change the rows in place, so each call gets its own copy
+        return [dict(row) for row in rows]
+
+    def put(self, key: tuple, rows: list[dict], data_version: str | None):
+        self.store(key, [dict(row) for row in rows], data_version=data_version)
+
+    def get_value(self, key: tuple):
+        """
+        A result that is not a list of rows, like a histogram, each call gets its own deep copy.
+        """
+        value = self.lookup(key)
+        if value is None:
+            return None
+        return copy.deepcopy(value)
+
+    def put_value(self, key: tuple, value, data_version: str | None):
+        self.store(key, copy.deepcopy(value), data_version=data_version)
+
+    def stats(self) -> dict[str, int | str | None]:
+        return {'entries': len(self.results), 'hits': self.hits, 'misses': self.misses,
+                'data_version': self.data_version}
@@ -5,8 +5,8 @@ from hypatia.pipeline.abund_cat import CatalogData
 from hypatia.elements import spectral_type_to_float
 from hypatia.sources.simbad.db import indexed_name_types
 from hypatia.pipeline.params.star import SingleStarParams
-from hypatia.pipeline.params.chem import ReducedAbundances
 from hypatia.object_params import ObjectParams, SingleParam
+from hypatia.pipeline.params.chem import ReducedAbundances, ElementStats, add_abundances_batch, calc_stats_batch
 
 
 all_gaia_refs_ranked = ['Gaia DR3 Gaia Collaboration et al. (2016b) and Gaia Collaboration et al. (2022k)',
@@ -100,15 +100,18 @@ class SingleStar:
                         value=spectral_type_to_float(single_param.value), ref=single_param.ref, units='')
                     self.params.update_param(param_name='sptype_num', single_param=sp_num_param, overwrite_existing=overwrite_existing)
 
-    def reduce(self):
+    def abundance_records(self):
+        """
+        Yields (reduced_abundances, element_name, catalog_name, value) for every abundance value of this star, in the
+        order that values are added to the reduced abundances. The ReducedAbundances for a normalization is only
+        made if there is data to put in it.
+        """
         # absolute abundances
         for catalog_name in sorted(self.available_abundance_catalogs):
             single_catalog = self.__getattribute__(catalog_name)
             for element_name in single_catalog.available_abundances:
-                abundance_record = single_catalog.__getattribute__(str(element_name))
-                self.reduced_abundances['absolute'].add_abundance(abundance_record=abundance_record,
-                                                                  element_name=element_name,
-                                                                  catalog=catalog_name)
+                yield (self.reduced_abundances['absolute'], element_name, catalog_name,
+                       single_catalog.__getattribute__(str(element_name)))
         # normalized abundances
         for catalog_name in sorted(self.available_abundance_catalogs):
             single_catalog = self.__getattribute__(catalog_name)
@@ -118,12 +121,16 @@ class SingleStar:
                     if norm_key not in self.reduced_abundances.keys():
                         # only make if there is data to put in it
                         self.reduced_abundances[norm_key] = ReducedAbundances()
-                    abundance_record = single_norm.__getattribute__(str(element_name))
-                    self.reduced_abundances[norm_key].add_abundance(abundance_record=abundance_record,
-                                                                    element_name=element_name,
-                                                                    catalog=catalog_name)
-        for reduced_abundance in self.reduced_abundances.values():
-            reduced_abundance.calc()
+                    yield (self.reduced_abundances[norm_key], element_name, catalog_name,
+                           single_norm.__getattribute__(str(element_name)))
+
+    def all_element_stats(self) -> list[ElementStats]:
+        return [el_stats for reduced_abundance in self.reduced_abundances.values()
+                for el_stats in reduced_abundance.all_element_stats()]
+
+    def reduce(self):
+        add_abundances_batch(list(self.abundance_records()))
+        calc_stats_batch(self.all_element_stats())
 
     def find_thing(self, thing, type_of_thing):
         values = []
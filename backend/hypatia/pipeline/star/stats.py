@@ -1,6 +1,11 @@
-from hypatia.elements import ElementID
-from hypatia.sources.simbad.ops import get_star_data
+from typing import NamedTuple
+from itertools import chain
+
+import numpy as np
+
+from hypatia.elements import ElementID, element_rank
 from hypatia.sources.simbad.db import indexed_name_types
+from hypatia.pipeline.params.filters import SetColumns
 
 
 class CountPerBin:
@@ -10,18 +15,95 @@ class CountPerBin:
                           " type that has at least 1 " + str(bin) + " of that type."
         self.available_bins = set()
 
+    @staticmethod
+    def bin_name(one_bin):
+        if isinstance(one_bin, ElementID):
+            return str(one_bin)
+        return one_bin
+
     def count_bins(self, bins):
         for one_bin in bins:
-            if isinstance(one_bin, ElementID):
-                bin_name = str(one_bin)
-            else:
-                bin_name = one_bin
+            bin_name = self.bin_name(one_bin)
             if one_bin in self.available_bins:
                 self.__setattr__(bin_name, self.__getattribute__(bin_name) + 1)
             else:
                 self.__setattr__(bin_name, 1)
                 self.available_bins.add(one_bin)
 
+    def set_counts(self, counts: dict):
+        for one_bin, count in counts.items():
+            self.__setattr__(self.bin_name(one_bin), count)
+            self.available_bins.add(one_bin)
+
+
+class StarStats(NamedTuple):
+    star_count: int
+    stars_with_exoplanets: int
+    element_count_per_catalog_per_star: dict[ElementID, int]
+    star_count_per_element: dict[ElementID, int]
+    star_count_per_stellar_param: dict[str, int]
+    star_count_per_star_type: dict[str, int]
+    stellar_param_count_per_element: dict[str, dict[ElementID, int]]
+    star_type_count_per_element: dict[str, dict[ElementID, int]]
+
+
+def nonzero_counts(bins: list, counts: np.ndarray) -> dict:
+    return {one_bin: int(count) for one_bin, count in zip(bins, counts) if count > 0}
+
+
+def calc_star_stats(star_data, params_set=None, star_name_types=None) -> StarStats:
+    """
+    All the star counts in one pass over the stars. Every count is a sum or a bincount over a star x element presence
+    matrix, with boolean masks for the stellar parameters and the star name types. Only bins with at least one count
+    are in the returned dictionaries.
+    """
+    if params_set is None:
+        params_set = set()
+    if star_name_types is None:
+        star_name_types = set(indexed_name_types)
+    star_list = list(star_data)
+    star_count = len(star_list)
+    # one set of elements per (star, catalog)
+    catalog_elements = [single_star.__getattribute__(catalog_name).available_abundances for single_star in star_list
+                        for catalog_name in single_star.available_abundance_catalogs]
+    catalogs_per_star = np.fromiter((len(single_star.available_abundance_catalogs) for single_star in star_list),
+                                    dtype=int, count=star_count)
+    element_ids = sorted(set().union(*catalog_elements), key=element_rank)
+    element_index = {element_id: column_index for column_index, element_id in enumerate(element_ids)}
+    elements_per_catalog = np.fromiter(map(len, catalog_elements), dtype=int, count=len(catalog_elements))
+    pair_elements = np.fromiter(map(element_index.__getitem__, chain.from_iterable(catalog_elements)), dtype=int,
+                                count=int(elements_per_catalog.sum()))
+    pair_stars = np.repeat(np.repeat(np.arange(star_count), catalogs_per_star), elements_per_catalog)
+    presence = np.zeros((star_count, len(element_ids)), dtype=bool)
+    presence[pair_stars, pair_elements] = True
+    presence_int = presence.astype(int)
+    # stellar parameter and name type masks, (star, param) and (star, name type)
+    params_list = sorted(params_set)
+    param_columns = SetColumns([single_star.params.available_params for single_star in star_list])
+    param_mask = np.zeros((star_count, len(params_list)), dtype=int)
+    for column_index, param_name in enumerate(params_list):
+        param_mask[:, column_index] = param_columns[param_name]
+    name_types_list = sorted(star_name_types)
+    name_type_columns = SetColumns([single_star.available_star_name_types for single_star in star_list])
+    name_type_mask = np.zeros((star_count, len(name_types_list)), dtype=int)
+    for column_index, name_type in enumerate(name_types_list):
+        name_type_mask[:, column_index] = name_type_columns[name_type]
+    param_element_counts = param_mask.T @ presence_int
+    name_type_element_counts = name_type_mask.T @ presence_int
+    return StarStats(
+        star_count=star_count,
+        stars_with_exoplanets=sum('exo' in single_star.available_data_types for single_star in star_list),
+        element_count_per_catalog_per_star=nonzero_counts(element_ids,
+                                                          np.bincount(pair_elements, minlength=len(element_ids))),
+        star_count_per_element=nonzero_counts(element_ids, presence_int.sum(axis=0)),
+        star_count_per_stellar_param=nonzero_counts(params_list, param_mask.sum(axis=0)),
+        star_count_per_star_type=nonzero_counts(name_types_list, name_type_mask.sum(axis=0)),
+        stellar_param_count_per_element={param_name: nonzero_counts(element_ids, element_counts)
+                                         for param_name, element_counts in zip(params_list, param_element_counts)},
+        star_type_count_per_element={name_type: nonzero_counts(element_ids, element_counts)
+                                     for name_type, element_counts in zip(name_types_list, name_type_element_counts)},
+    )
+
 
 class StarDataStats:
     def __init__(self, star_data, params_set=None, star_name_types=None):
@@ -33,49 +115,27 @@ class StarDataStats:
             star_name_types = set(indexed_name_types)
         else:
             star_name_types = set(star_name_types)
+        self.result = calc_star_stats(star_data=star_data, params_set=params_set, star_name_types=star_name_types)
 
-        self.star_count = 0
-        self.stars_with_exoplanets = 0
+        self.star_count = self.result.star_count
+        self.stars_with_exoplanets = self.result.stars_with_exoplanets
         self.element_count_per_catalog_per_star = CountPerBin(thing_counted="catalogs within each star",
                                                               bin='elemental abundance')
+        self.element_count_per_catalog_per_star.set_counts(self.result.element_count_per_catalog_per_star)
         self.star_count_per_stellar_param = CountPerBin(thing_counted="stars", bin='stellar parameters')
+        self.star_count_per_stellar_param.set_counts(self.result.star_count_per_stellar_param)
         self.star_count_per_element = CountPerBin(thing_counted="stars", bin='elemental abundance')
+        self.star_count_per_element.set_counts(self.result.star_count_per_element)
         self.star_count_per_star_type = CountPerBin(thing_counted="stars", bin='found star name type')
-        for stellar_param in params_set:
-            self.__setattr__("stellar_param_" + str(stellar_param) + "_count_per_element",
-                             CountPerBin(thing_counted="stellar parameter " + str(stellar_param),
-                             bin="elemental abundance"))
-        for star_name_type in star_name_types:
-            self.__setattr__("star_type_" + str(star_name_type + "_count_per_element"),
-                             CountPerBin(thing_counted="star_name type: " + str(star_name_type),
-                             bin="elemental abundance"))
+        self.star_count_per_star_type.set_counts(self.result.star_count_per_star_type)
         self.norm_count_per_element = {}
         self.norm_count_per_star = {}
-        # - {"catalog", "#ref"}
-        for star_name in star_data.star_names:
-            simbad_doc = get_star_data(star_name, test_origin="StarDataStats")
-            single_star = star_data.__getattribute__(simbad_doc['attr_name'])
-            # count for the number of stars
-            self.star_count += 1
-            # stars with exoplanets
-            if 'exo' in single_star.available_data_types:
-                self.stars_with_exoplanets += 1
-            # counts of stars per abundance
-            abundances_this_star = set()
-            for catalog in single_star.available_abundance_catalogs:
-                available_abundances_this_catalog = single_star.__getattribute__(catalog).available_abundances
-                self.element_count_per_catalog_per_star.count_bins(available_abundances_this_catalog)
-                abundances_this_star = abundances_this_star | available_abundances_this_catalog
-            self.star_count_per_element.count_bins(abundances_this_star)
-            # counts of stars per stellar parameter
-            param_overlap = params_set & single_star.params.available_params
-            self.star_count_per_stellar_param.count_bins(param_overlap)
-            for stellar_param in param_overlap:
-                self.__getattribute__("stellar_param_" + str(stellar_param) + "_count_per_element")\
-                    .count_bins(abundances_this_star)
-            # counts of stars per stellar name type
-            name_type_overlap = star_name_types & single_star.available_star_name_types
-            self.star_count_per_star_type.count_bins(name_type_overlap)
-            for star_name_type in name_type_overlap:
-                self.__getattribute__("star_type_" + str(star_name_type + "_count_per_element"))\
-                    .count_bins(abundances_this_star)
+
+
+if __name__ == '__main__':
+    import time
+    from hypatia.pipeline.nat_cat import NatCat
+    nat_cat = NatCat(catalogs_from_scratch=False, verbose=False, get_abundance_data=True, get_exo_data=True)
+    start_time = time.perf_counter()
+    star_stats = calc_star_stats(nat_cat.star_data, params_set={'dist', 'teff', 'logg'})
+    print(f'{star_stats.star_count} stars counted in {time.perf_counter() - start_time:.3f} s')
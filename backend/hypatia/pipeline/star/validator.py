@@ -162,6 +162,10 @@ validator = {
                 'bsonType': 'double',
                 'description': 'must be a double and is required'
             },
+            'fingerprint': {
+                'bsonType': 'string',
+                'description': 'must be a string hash of the pipeline inputs for this star and is not required'
+            },
             'ra': {
                 'bsonType': 'double',
                 'description': 'must be a double and is not required'
@@ -1,3 +1,5 @@
+import uuid
+
 from hypatia.collect import BaseCollection
 from hypatia.configs.env_load import MONGO_DATABASE
 from hypatia.elements import element_rank, ElementID
@@ -21,6 +23,10 @@ class SummaryCollection(BaseCollection):
                     'bsonType': 'string',
                     'description': 'must be a string and is required to be unique'
                 },
+                'data_version': {
+                    'bsonType': 'string',
+                    'description': 'must be a string that is new for each upload of the Hypatia database'
+                },
                 'units_and_fields': {
                     'bsonType': 'object',
                     'description': 'must be an object and contains the units and fields data',
@@ -240,6 +246,14 @@ class SummaryCollection(BaseCollection):
             id_name = 'summary_hypatiacatalog'
         return self.collection.find_one({'_id': id_name})
 
+    def get_data_version(self, id_name: str = None) -> str | None:
+        if id_name is None:
+            id_name = 'summary_hypatiacatalog'
+        doc = self.collection.find_one({'_id': id_name}, {'data_version': 1})
+        if doc is None:
+            return None
+        return doc.get('data_version', None)
+
 
 def upload_summary(normalizations: dict[str, float| int | str | dict[str, float]],
                    plusminus_error: dict[ElementID, float],
@@ -247,6 +261,7 @@ def upload_summary(normalizations: dict[str, float| int | str | dict[str, float]
                    catalogs_file_name: str = default_catalog_file, found_catalogs: set[str] = None,
                    ids_with_wds_names: set[str] = None, ids_with_nea_names: set[str] = None,
                    targets: dict[str, dict[str, str | list[str]]] = None,
+                   data_version: str = None,
                    ):
     if found_elements is None:
         found_elements = set()
@@ -260,8 +275,11 @@ def upload_summary(normalizations: dict[str, float| int | str | dict[str, float]
         ids_with_nea_names = set()
     if targets is None:
         targets = {}
+    if data_version is None:
+        # a new version for each upload, used to invalidate the cached query results of the website
+        data_version = uuid.uuid4().hex
     summary_db = SummaryCollection(db_name=MONGO_DATABASE, collection_name='summary')
-    summary_db.reset()
+    staging_db = summary_db.staging_collection()
 
     catalog_data = export_to_records(catalog_input_file=catalogs_file_name,
                                      requested_catalogs=sorted(found_catalogs) if found_catalogs else None)
@@ -269,6 +287,7 @@ def upload_summary(normalizations: dict[str, float| int | str | dict[str, float]
 
     doc = {
         '_id': 'summary_hypatiacatalog',
+        'data_version': data_version,
         'units_and_fields': expected_params_dict,
         'chemical_ref': summary_dict,
         'chemicals_read': [str(el) for el in sorted(elements_found, key=element_rank)],
@@ -284,4 +303,5 @@ def upload_summary(normalizations: dict[str, float| int | str | dict[str, float]
                                     if key not in not_for_summary_fields}
                     for target_handle, target_data in targets.items()},
     }
-    summary_db.add_one(doc)
+    staging_db.add_one(doc)
+    summary_db.swap_in(staging_db)
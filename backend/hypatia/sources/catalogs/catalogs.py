@@ -4,6 +4,7 @@ import shutil
 import datetime
 from warnings import warn
 
+from hypatia.tools.instrument import instrumented
 from hypatia.tools.table_read import ClassyReader
 from hypatia.tools.color_text import catalog_name_text
 from hypatia.sources.simbad.batch import get_star_data_batch
@@ -15,6 +16,7 @@ from hypatia.sources.catalogs.solar_norm import (solar_norm_dict, ratio_to_eleme
                                                  un_norm_x_over_fe, un_norm_x_over_h, un_norm_abs_x)
 
 
+@instrumented('catalog_load', items_from='return')
 def get_catalogs(from_scratch=False, catalogs_file_name=None, local_abundance_dir=None, verbose=False):
     """
     Smashes together all the catalogs into a dictionary,
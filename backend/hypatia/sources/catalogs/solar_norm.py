@@ -2,6 +2,7 @@ import os
 from warnings import warn
 
 import requests
+import numpy as np
 
 from hypatia.tools.table_read import row_dict
 from hypatia.configs.env_load import MONGO_DATABASE
@@ -169,6 +170,21 @@ class SolarNorm:
         else:
             return self.solar_norm_dict[norm_key.lower()]
 
+    def solar_vectors(self, element_ids: list[ElementID], norm_keys: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The solar values as an array with the shape (len(norm_keys), len(element_ids)), and a boolean array of the
+        same shape that is True where the normalization has a value for that element.
+        """
+        element_index = {element_id: column_index for column_index, element_id in enumerate(element_ids)}
+        solar_values = np.zeros((len(norm_keys), len(element_ids)), dtype=float)
+        has_solar_value = np.zeros((len(norm_keys), len(element_ids)), dtype=bool)
+        for row_index, norm_key in enumerate(norm_keys):
+            for element_id, solar_value in self.solar_norm_dict[norm_key].items():
+                if element_id in element_index:
+                    solar_values[row_index, element_index[element_id]] = solar_value
+                    has_solar_value[row_index, element_index[element_id]] = True
+        return solar_values, has_solar_value
+
     def add_normalization(self, handle: str, author:str, year: int | str, element_dict: dict[str | ElementID, float]):
         formated_dict = {}
         for el_name, solar_values in element_dict.items():
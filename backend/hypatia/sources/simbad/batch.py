@@ -1,5 +1,6 @@
 from pymongo.errors import DuplicateKeyError
 
+from hypatia.tools.instrument import instrumented
 from hypatia.sources.simbad.db import get_match_name
 from hypatia.configs.env_load import INTERACTIVE_STARNAMES
 from hypatia.configs.source_settings import simbad_batch_size
@@ -9,6 +10,7 @@ from hypatia.sources.simbad.ops import (get_simbad_main_id, get_star_data_by_mai
                                         no_simbad_add_name, star_collection, set_cache_data)
 
 
+@instrumented('name_resolution', items_from='search_ids')
 def get_star_data_batch(search_ids: list[tuple[str, ...]] | list[str],
                         test_origin: str = 'batch',
                         has_micro_lens_names: list[bool] | None = None,
@@ -0,0 +1,77 @@
+"""
+Named stage checkpoints for resumable pipeline runs.
+
+A checkpoint file is two pickles written with the highest pickle protocol: a small header with the format version,
+the stage name, and the run key, followed by the stage state. The header is read first, so checkpoints from an older
+format or from a run with different settings are skipped without loading the state. Files are written to a temporary
+name and then moved into place, so an interrupted write never leaves a partial checkpoint.
+"""
+import os
+import pickle
+import hashlib
+
+from hypatia.tools.color_text import file_name_text
+from hypatia.configs.file_paths import checkpoint_dir
+
+# increase this when the state that is saved for a stage changes
+checkpoint_version = 1
+
+
+def run_key(*settings) -> str:
+    """
+    A hash of the run settings that change the data, checkpoints are only resumed by a run with the same key.
+    """
+    return hashlib.sha1(repr(settings).encode('utf-8')).hexdigest()
+
+
+def checkpoint_path(stage: str, prefix: str, save_dir: str = None) -> str:
+    if save_dir is None:
+        save_dir = checkpoint_dir
+    return os.path.join(save_dir, f'{prefix}_{stage}.pkl')
+
+
+def save_checkpoint(state, stage: str, prefix: str, key: str, save_dir: str = None, verbose: bool = True):
+    file_name = checkpoint_path(stage=stage, prefix=prefix, save_dir=save_dir)
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    temp_file_name = file_name + '.tmp'
+    with open(temp_file_name, 'wb') as f:
+        pickle.dump({'version': checkpoint_version, 'stage': stage, 'key': key}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file_name, file_name)
+    if verbose:
+        print(f'  Checkpoint saved for stage {stage}: {file_name_text(file_name)}')
+
+
+def load_checkpoint(stage: str, prefix: str, key: str, save_dir: str = None):
+    """
+    Returns the state for this stage, or None if there is no good checkpoint for this stage and run key.
+    """
+    file_name = checkpoint_path(stage=stage, prefix=prefix, save_dir=save_dir)
+    if not os.path.exists(file_name):
+        return None
+    try:
+        with open(file_name, 'rb') as f:
+            header = pickle.load(f)
+            if header != {'version': checkpoint_version, 'stage': stage, 'key': key}:
+                return None
+            return pickle.load(f)
+    except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def last_good_checkpoint(stages: list[str], prefix: str, key: str, save_dir: str = None):
+    """
+    Returns (stage, state) for the last stage in stages with a good checkpoint, or (None, None).
+    """
+    for stage in reversed(stages):
+        state = load_checkpoint(stage=stage, prefix=prefix, key=key, save_dir=save_dir)
+        if state is not None:
+            return stage, state
+    return None, None
+
+
+def clear_checkpoints(stages: list[str], prefix: str, save_dir: str = None):
+    for stage in stages:
+        file_name = checkpoint_path(stage=stage, prefix=prefix, save_dir=save_dir)
+        if os.path.exists(file_name):
+            os.remove(file_name)
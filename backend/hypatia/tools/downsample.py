@@ -0,0 +1,135 @@
+"""
+A server-side reduction of large scatter plots.
+
+The points are put on a square grid of cells over the plotted range, in log10 space for a log axis, so that the cells
+are the same size on the screen. Each point in a sparse cell, one with sparse_count points or fewer, is an outlier and
+is kept exactly. The points of each dense cell are replaced by one point at their mean with a weight of the number of
+points. The smallest and largest value of each axis, and of any extra columns like the color axis, are always kept
+exactly, so the plotted ranges do not change, and so are the points that cannot be placed on a log axis. The finest
+grid where the reduced points fit in max_points is used. When even the coarsest grid does not fit, all the points
+that are not exact are one bin, so there are max_points or fewer unless the exact points alone do not fit.
+"""
+import numpy as np
+
+# the grid sizes that are tried, the finest first
+grid_sizes = (1024, 512, 256, 128, 64, 32, 16, 8)
+# the cells with this many points or fewer are kept point by point
+sparse_count = 2
+
+
+def axis_values(values: np.ndarray, is_log: bool = False) -> np.ndarray:
+    """
+    The values in the space of the plot axis, NaN for the values that cannot be plotted.
+    """
+    if not is_log:
+        return values.astype(float, copy=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(values > 0, np.log10(values), np.nan)
+
+
+def extreme_mask(columns: list[np.ndarray]) -> np.ndarray:
+    """
+    True for the points with the smallest or largest finite value in any of the columns.
+    """
+    is_extreme = np.zeros(len(columns[0]), dtype=bool)
+    for column in columns:
+        finite_index = np.flatnonzero(np.isfinite(column))
+        if len(finite_index):
+            is_extreme[finite_index[np.argmin(column[finite_index])]] = True
+            is_extreme[finite_index[np.argmax(column[finite_index])]] = True
+    return is_extreme
+
+
+def grid_cells(values: np.ndarray, grid_size: int) -> np.ndarray:
+    """
+    The cell number, 0 to grid_size - 1, of each finite value.
+    """
+    min_value = values.min()
+    value_range = values.max() - min_value
+    if value_range == 0.0:
+        return np.zeros(len(values), dtype=np.int64)
+    cells = ((values - min_value) * (grid_size / value_range)).astype(np.int64)
+    # the largest value is on the upper edge of the last cell
+    return np.minimum(cells, grid_size - 1)
+
+
+def reduce_scatter(x: np.ndarray, y: np.ndarray, max_points: int, x_log: bool = False, y_log: bool = False,
+                   extra_columns: list[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The index of the points that are kept exactly, the bin of each point, -1 for the exact points, and the number of
+    points in each bin. All the points are exact when there are max_points or fewer. The result has more than
+    max_points only when the exact points, the extremes and the points that cannot be placed on a log axis, and one
+    bin do not fit.
+    """
+    point_count = len(x)
+    if point_count <= max_points:
+        return np.arange(point_count), np.full(point_count, -1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    x_values = axis_values(x, is_log=x_log)
+    y_values = axis_values(y, is_log=y_log)
+    extreme_columns = [x_values, y_values]
+    if extra_columns:
+        extreme_columns.extend(np.asarray(column, dtype=float) for column in extra_columns)
+    is_exact = extreme_mask(extreme_columns)
+    is_exact |= ~(np.isfinite(x_values) & np.isfinite(y_values))
+    binned_index = np.flatnonzero(~is_exact)
+    point_bin = np.full(point_count, -1, dtype=np.int64)
+    if len(binned_index) == 0:
+        return np.arange(point_count), point_bin, np.zeros(0, dtype=np.int64)
+    exact_count = point_count - len(binned_index)
+    for grid_size in grid_sizes:
+        cells = (grid_cells(x_values[binned_index], grid_size) * grid_size
+                 + grid_cells(y_values[binned_index], grid_size))
+        _cell_ids, cell_inverse, cell_counts = np.unique(cells, return_inverse=True, return_counts=True)
+        is_dense_cell = cell_counts > sparse_count
+        dense_cell_count = int(is_dense_cell.sum())
+        reduced_count = exact_count + len(binned_index) - int(cell_counts[is_dense_cell].sum()) + dense_cell_count
+        if reduced_count <= max_points:
+            break
+    else:
+        # even the coarsest grid does not fit, so all the points that are not exact are one bin
+        cell_inverse = np.zeros(len(binned_index), dtype=np.int64)
+        cell_counts = np.array([len(binned_index)], dtype=np.int64)
+        is_dense_cell = np.ones(1, dtype=bool)
+        dense_cell_count = 1
+    # number the dense cells 0 to dense_cell_count - 1, in the order of the cells
+    dense_cell_bin = np.full(len(cell_counts), -1, dtype=np.int64)
+    dense_cell_bin[is_dense_cell] = np.arange(dense_cell_count)
+    point_bin[binned_index] = dense_cell_bin[cell_inverse.reshape(-1)]
+    return np.flatnonzero(point_bin == -1), point_bin, cell_counts[is_dense_cell]
+
+
+def bin_means(values: np.ndarray, point_bin: np.ndarray, bin_count: np.ndarray, is_log: bool = False) -> np.ndarray:
+    """
+    The mean value of the points in each bin, the geometric mean for a log axis.
+    """
+    is_binned = point_bin >= 0
+    binned_values = axis_values(values[is_binned], is_log=is_log)
+    means = np.bincount(point_bin[is_binned], weights=binned_values, minlength=len(bin_count)) / bin_count
+    return 10.0 ** means if is_log else means
+
+
+if __name__ == '__main__':
+    import time
+
+    rng = np.random.default_rng(42)
+    # a dense core with a sparse halo of outliers
+    test_x = np.concatenate([rng.normal(0.0, 0.1, 200000), rng.uniform(-3.0, 3.0, 200)])
+    test_y = np.concatenate([rng.normal(0.0, 0.1, 200000), rng.uniform(-3.0, 3.0, 200)])
+    test_z = rng.uniform(0.0, 1.0, len(test_x))
+    start_time = time.time()
+    test_exact, test_bin, test_count = reduce_scatter(test_x, test_y, max_points=5000, extra_columns=[test_z])
+    reduce_s = time.time() - start_time
+    assert len(test_exact) + len(test_count) <= 5000
+    assert len(test_exact) + int(test_count.sum()) == len(test_x)
+    for test_column in (test_x, test_y, test_z):
+        assert np.argmin(test_column) in test_exact and np.argmax(test_column) in test_exact
+    # the halo is sparse, so nearly all of it is kept exactly
+    halo_kept = np.isin(np.arange(200000, len(test_x)), test_exact).sum()
+    test_mean_x = bin_means(test_x, test_bin, test_count)
+    assert np.isclose((test_mean_x * test_count).sum() + test_x[test_exact].sum(), test_x.sum())
+    print(f'{len(test_x)} points reduced to {len(test_exact)} exact points and {len(test_count)} bins in '
+          f'{reduce_s:.3f} s, {halo_kept} of 200 outliers kept exactly')
+    # a max_points that even the 8 by 8 grid does not fit in
+    few_exact, _few_bin, few_count = reduce_scatter(test_x, test_y, max_points=10, extra_columns=[test_z])
+    assert len(few_exact) + len(few_count) <= 10 and len(few_count) == 1
+    assert len(few_exact) + int(few_count.sum()) == len(test_x)
@@ -0,0 +1,71 @@
+"""
+A process pool for per-star loops that uses the 'fork' start method.
+
+Read-only inputs (the stars, solar norms, PASTEL/XHip/Gaia lookups) are put in the fork_shared dictionary in the parent
+process before the pool is started, the worker processes inherit them through fork and nothing is pickled on the way
+in. Only the star indexes are sent to the workers and only the compact per-star results are sent back.
+"""
+import os
+import multiprocessing
+
+
+# read-only inputs for the worker processes, only populated while a pool is running
+fork_shared = {}
+chunks_per_process = 4
+
+
+def fork_available() -> bool:
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def get_processes(processes: int | None = None) -> int:
+    """
+    None uses all the available CPUs, and 1 (or a platform without 'fork') is the serial mode for debugging.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if not fork_available():
+        return 1
+    return max(int(processes), 1)
+
+
+def split_indexes(total: int, chunks: int) -> list[range]:
+    """
+    Contiguous ranges of indexes, in order, that cover range(total).
+    """
+    chunks = max(min(chunks, total), 1)
+    chunk_len, remainder = divmod(total, chunks)
+    index_ranges = []
+    start_index = 0
+    for chunk_index in range(chunks):
+        end_index = start_index + chunk_len + (1 if chunk_index < remainder else 0)
+        index_ranges.append(range(start_index, end_index))
+        start_index = end_index
+    return index_ranges
+
+
+def fork_map(worker, shared: dict, total: int, processes: int) -> list:
+    """
+    Calls worker(index_range) in a forked process pool and returns the concatenated results. Chunk results are in
+    the order of the index ranges, so the output order is deterministic and matches a serial loop over range(total).
+    """
+    fork_shared.clear()
+    fork_shared.update(shared)
+    try:
+        with multiprocessing.get_context('fork').Pool(processes=processes) as pool:
+            chunk_results = pool.map(worker, split_indexes(total, processes * chunks_per_process))
+    finally:
+        fork_shared.clear()
+    return [result for chunk_result in chunk_results for result in chunk_result]
+
+
+def _square_chunk(index_range: range) -> list[tuple[int, int]]:
+    return [(index, fork_shared['values'][index] ** 2) for index in index_range]
+
+
+if __name__ == '__main__':
+    test_values = list(range(1000))
+    squares = fork_map(worker=_square_chunk, shared={'values': test_values}, total=len(test_values),
+                       processes=get_processes())
+    assert squares == [(index, value ** 2) for index, value in enumerate(test_values)]
+    print(f'{len(squares)} results returned in order with {get_processes()} processes')
@@ -0,0 +1,221 @@
+"""
+Timing and memory instrumentation for the data pipeline.
+
+Use the span() context manager around a stage of the pipeline:
+
+    with span('reduction', items=len(star_list)):
+        ...
+
+Each span records the wall time, the CPU time of its thread, the peak resident set size (RSS) of the process when the
+span finishes, and an optional item count (stars, catalogs, documents). Spans that are started inside another span get
+a path like 'standard_output/nat_cat.params/params_merge'. The open spans are kept per thread, so a function that runs
+in a worker thread is wrapped with in_current_span() to keep the path of the span that started it. The CPU time of a
+span does not include its worker threads, that time is in the worker spans. The run report is written as JSON so that
+runs can be compared with compare_reports().
+"""
+import os
+import sys
+import json
+import time
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+from hypatia.configs.file_paths import run_report_dir
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak_rss / 1024 ** 2
+    return peak_rss / 1024
+
+
+class Span:
+    def __init__(self, name: str, path: str, items: int | None = None):
+        self.name = name
+        self.path = path
+        self.items = items
+        self.start_time = time.time()
+        self.wall_s = None
+        self.cpu_s = None
+        self.peak_rss_mb = None
+        self.ok = True
+
+    def to_record(self) -> dict[str, str | int | float | bool | None]:
+        return {'name': self.name, 'path': self.path, 'items': self.items, 'start_time': self.start_time,
+                'wall_s': self.wall_s, 'cpu_s': self.cpu_s, 'peak_rss_mb': self.peak_rss_mb, 'ok': self.ok}
+
+
+class RunReport:
+    def __init__(self, run_name: str = 'pipeline'):
+        self.run_name = run_name
+        self.start_time = time.time()
+        self.spans = []
+        self.local = threading.local()
+
+    def reset(self, run_name: str = 'pipeline'):
+        self.run_name = run_name
+        self.start_time = time.time()
+        self.spans = []
+
+    def stack(self) -> list[Span]:
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def in_current_span(self, func):
+        """
+        Wraps func to run in another thread with the spans that are open in this thread as its parents.
+        """
+        parent_stack = list(self.stack())
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            thread_stack = self.stack()
+            saved_stack = list(thread_stack)
+            thread_stack[:] = parent_stack
+            try:
+                return func(*args, **kwargs)
+            finally:
+                thread_stack[:] = saved_stack
+        return wrapper
+
+    @contextmanager
+    def span(self, name: str, items: int | None = None):
+        """
+        The yielded Span's items can be set inside the block when the count is not known at the start.
+        """
+        stack = self.stack()
+        this_span = Span(name=name, path='/'.join([parent.name for parent in stack] + [name]), items=items)
+        stack.append(this_span)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield this_span
+        except BaseException:
+            this_span.ok = False
+            raise
+        finally:
+            this_span.wall_s = time.perf_counter() - wall_start
+            this_span.cpu_s = time.thread_time() - cpu_start
+            this_span.peak_rss_mb = peak_rss_mb()
+            stack.pop()
+            self.spans.append(this_span)
+
+    def summary(self) -> dict[str, dict[str, int | float | None]]:
+        """
+        Totals per span path, a path that is run more than once (like name_resolution) is added together.
+        """
+        summary = {}
+        for this_span in self.spans:
+            path_summary = summary.setdefault(this_span.path, {'count': 0, 'items': None, 'wall_s': 0.0,
+                                                               'cpu_s': 0.0, 'peak_rss_mb': None})
+            path_summary['count'] += 1
+            path_summary['wall_s'] += this_span.wall_s
+            path_summary['cpu_s'] += this_span.cpu_s
+            if this_span.items is not None:
+                path_summary['items'] = (path_summary['items'] or 0) + this_span.items
+            if this_span.peak_rss_mb is not None:
+                path_summary['peak_rss_mb'] = max(path_summary['peak_rss_mb'] or 0.0, this_span.peak_rss_mb)
+        return summary
+
+    def to_record(self) -> dict:
+        return {
+            'run_name': self.run_name,
+            'start_time': self.start_time,
+            'end_time': time.time(),
+            'python': sys.version.split()[0],
+            'peak_rss_mb': peak_rss_mb(),
+            'summary': self.summary(),
+            'spans': [this_span.to_record() for this_span in self.spans],
+        }
+
+    def write(self, file_name: str = None, verbose: bool = True) -> str:
+        if file_name is None:
+            time_str = time.strftime('%Y%m%d_%H%M%S', time.localtime(self.start_time))
+            file_name = os.path.join(run_report_dir, f'{self.run_name}_{time_str}.json')
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(file_name, 'w') as f:
+            json.dump(self.to_record(), f, indent=2)
+        if verbose:
+            print(f'Run report written to: {file_name}')
+        return file_name
+
+
+def compare_reports(baseline_file: str, current_file: str, tolerance: float = 0.2, min_wall_s: float = 1.0,
+                    verbose: bool = True) -> list[str]:
+    """
+    Returns the span paths where the wall time of the current run is more than (1 + tolerance) times the baseline,
+    spans that take less than min_wall_s in both runs are ignored.
+    """
+    with open(baseline_file, 'r') as f:
+        baseline_summary = json.load(f)['summary']
+    with open(current_file, 'r') as f:
+        current_summary = json.load(f)['summary']
+    regressions = []
+    for path in sorted(baseline_summary.keys() & current_summary.keys()):
+        baseline_wall_s = baseline_summary[path]['wall_s']
+        current_wall_s = current_summary[path]['wall_s']
+        if max(baseline_wall_s, current_wall_s) < min_wall_s:
+            continue
+        if current_wall_s > (1.0 + tolerance) * baseline_wall_s:
+            regressions.append(path)
+            if verbose:
+                print(f'{path}: {baseline_wall_s:.2f} s -> {current_wall_s:.2f} s')
+    return regressions
+
+
+# the report for this process, reset at the start of each run
+run_report = RunReport()
+span = run_report.span
+in_current_span = run_report.in_current_span
+
+
+def instrumented(name: str, items_from: str | None = None):
+    """
+    A decorator that runs the function in a span. The item count is len() of the argument named items_from, or of
+    the returned value when items_from='return'.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            items = None
+            if items_from is not None and items_from != 'return':
+                bound_args = signature.bind(*args, **kwargs)
+                if items_from in bound_args.arguments:
+                    items = len(bound_args.arguments[items_from])
+            with span(name, items=items) as this_span:
+                returned = func(*args, **kwargs)
+                if items_from == 'return':
+                    this_span.items = len(returned)
+            return returned
+        return wrapper
+    return decorator
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare the span wall times of two pipeline run reports.')
+    parser.add_argument('baseline', help='The run report JSON file to compare against.')
+    parser.add_argument('current', help='The run report JSON file to check for regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='The allowed fractional increase in wall time, default is 0.2 (20%%).')
+    args = parser.parse_args()
+    found_regressions = compare_reports(baseline_file=args.baseline, current_file=args.current,
+                                        tolerance=args.tolerance)
+    if not found_regressions:
+        print('No regressions found.')
@@ -0,0 +1,68 @@
+"""
+A small dependency-graph executor for independent, I/O-bound loads.
+
+Each task is a function of the results of the tasks that it depends on. A task is started in a thread pool as soon as
+all of its dependencies are finished, so independent loads (files, database collections, web queries) run at the
+same time. The results are returned by task name, so the caller can use them in a fixed, deterministic order.
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from hypatia.tools.instrument import in_current_span
+
+
+class TaskGraph:
+    def __init__(self, max_workers: int | None = None, verbose: bool = False):
+        self.max_workers = max_workers
+        self.verbose = verbose
+        self.tasks = {}
+
+    def add(self, name: str, func, depends_on: list[str] | tuple[str, ...] = ()):
+        """
+        Adds a task that is called as func(**{dependency_name: dependency_result}) after its dependencies.
+        """
+        if name in self.tasks:
+            raise KeyError(f'Task {name} is already in the graph.')
+        for dependency in depends_on:
+            if dependency not in self.tasks:
+                raise KeyError(f'Task {name} depends on {dependency}, which must be added first.')
+        self.tasks[name] = (func, tuple(depends_on))
+
+    def run(self) -> dict[str, any]:
+        results = {}
+        waiting = dict(self.tasks)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while waiting or running:
+                for name, (func, depends_on) in list(waiting.items()):
+                    if all(dependency in results for dependency in depends_on):
+                        if self.verbose:
+                            print(f'  Starting {name}')
+                        # the spans of the task are under the span that runs the graph
+                        dependency_results = {dependency: results[dependency] for dependency in depends_on}
+                        running[executor.submit(in_current_span(func), **dependency_results)] = name
+                        del waiting[name]
+                done, _not_done = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # an exception is raised here, the executor waits for the running tasks before it is closed
+                    results[name] = future.result()
+                    if self.verbose:
+                        print(f'  Finished {name}')
+        return results
+
+
+if __name__ == '__main__':
+    import time
+
+    def slow_value(value, delay=0.5):
+        time.sleep(delay)
+        return value
+
+    test_graph = TaskGraph(verbose=True)
+    test_graph.add('a', lambda: slow_value(1))
+    test_graph.add('b', lambda: slow_value(2))
+    test_graph.add('c', lambda a, b: slow_value(a + b), depends_on=['a', 'b'])
+    start_time = time.perf_counter()
+    test_results = test_graph.run()
+    assert test_results == {'a': 1, 'b': 2, 'c': 3}
+    print(f'{test_results} in {time.perf_counter() - start_time:.2f} s, 1.5 s if run in sequence')
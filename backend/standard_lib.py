@@ -2,9 +2,11 @@ import os
 
 from sandbox import mdwarf_histogram, multi_scatter_plot
 from hypatia.elements import element_rank, ElementID
+from hypatia.tools.instrument import span, run_report
 from hypatia.pipeline.star.output import load_pickled_output
 from hypatia.configs.source_settings import norm_keys_default
 from hypatia.pipeline.nat_cat import NatCat, load_catalog_query
+from hypatia.tools.checkpoint import run_key, save_checkpoint, load_checkpoint
 from hypatia.configs.file_paths import target_list_dir, base_dir, pickle_nat, default_catalog_file, hydata_dir
 
 
@@ -167,9 +169,65 @@ def save_or_load(load=True, a_catalog_query=None):
     else:
         a_catalog_query.pickle_myself()
 
+
+def make_standard_output(nat_cat: NatCat, norm_keys: list[str] = None,
+                         target_list: list[str] | list[tuple[str, ...]] | str | os.PathLike | None = None,
+                         dist: tuple[float | None, float | None] | None = (0.0, 500.0),
+                         teff: tuple[float | None, float | None] | None = (2300.0, 7500.0),
+                         logg: tuple[float | None, float | None] | None = None):
+    """
+    The filtered and normalized output star data, with stats, before the abundance reduction.
+    """
+    target_output = None
+    parameter_bound_filter = []
+    if dist is not None:
+        parameter_bound_filter.append(('dist', dist[0], dist[1]))
+    if teff is not None:
+        parameter_bound_filter.append(('teff', teff[0], teff[1]))
+    if logg is not None:
+        parameter_bound_filter.append(('logg', logg[0], logg[1]))
+
+    dist_output = nat_cat.make_output_star_data(min_catalog_count=1,
+                                                parameter_bound_filter=parameter_bound_filter,
+                                                star_data_stats=False,
+                                                reduce_abundances=False)
+
+    exo_output = nat_cat.make_output_star_data(min_catalog_count=1,
+                                               parameter_bound_filter=None,
+                                               has_exoplanet=True,
+                                               star_data_stats=False,
+                                               reduce_abundances=False)
+    if target_list is None:
+        output_star_data = dist_output + exo_output
+    else:
+        # select only the data that is belongs to the list of target stars
+        target_output = nat_cat.make_output_star_data(is_target=True)
+        output_star_data = target_output
+    # optional 2nd filtering step
+    output_star_data.filter(target_catalogs=None, or_logic_for_catalogs=True,
+                            catalogs_return_only_targets=False,
+                            target_star_name_types=None, and_logic_for_star_names=True,
+                            target_params=None, and_logic_for_params=True,
+                            target_elements=None, or_logic_for_element=True,
+                            element_bound_filter=None,  # filtering happens before normalization
+                            min_catalog_count=None,
+                            parameter_bound_filter=None,
+                            parameter_match_filter=None,
+                            at_least_fe_and_another=True,
+                            remove_nlte_abundances=False,
+                            keep_complement=False,
+                            is_target=None)
+    output_star_data.normalize(norm_keys=norm_keys)
+    output_star_data.filter(element_bound_filter=None)  # filter after normalization, and logic
+    output_star_data.do_stats(params_set=nat_cat.params_list_for_stats,
+                              star_name_types=nat_cat.star_types_for_stats)
+    return output_star_data, target_output
+
+
 def standard_output(from_scratch=True, refresh_exo_data=False, norm_keys: list[str] = None,
                     fast_update_gaia=True, from_pickled_cat: bool = False, from_pickled_output: bool = False,
-                    mongo_upload: bool = True,
+                    mongo_upload: bool = True, incremental: bool = False,
+                    checkpoints: bool = False, resume: bool = False,
                     catalogs_file_name: str = default_catalog_file,
                     target_list: list[str] | list[tuple[str, ...]] | str | os.PathLike | None = None,
                     params_list_for_stats: list[str] = None, star_types_for_stats: list[str] = None,
@@ -177,6 +235,18 @@ def standard_output(from_scratch=True, refresh_exo_data=False, norm_keys: list[s
                     teff: tuple[float | None, float | None] | None = (2300.0, 7500.0),
                     logg: tuple[float | None, float | None] | None = None,
                     ):
+    """
+    With incremental=True, only the stars with changed inputs (see hypatia.pipeline.star.fingerprint) are reduced
+    and upserted into hypatiaDB, and stars that are no longer in the output are deleted from hypatiaDB. The other
+    stars keep their hypatiaDB documents and are not reduced in the returned output_star_data.
+
+    With checkpoints=True, NatCat saves a checkpoint after each of its stages and the output star data is saved as the
+    'output' stage before the export. With resume=True, the run starts after the last good checkpoint. The output
+    checkpoint is only used when it was made from the same NatCat checkpoint generation, see NatCat.run_stages().
+
+    The timings of each stage are written to a JSON run report, see hypatia.tools.instrument.
+    """
+    run_report.reset(run_name='standard_output')
     target_output = None
     if params_list_for_stats is None:
         params_list_for_stats = ["dist", "logg", 'Teff', "SpType", 'st_mass', 'st_rad', "disk"]
@@ -186,65 +256,53 @@ def standard_output(from_scratch=True, refresh_exo_data=False, norm_keys: list[s
     if from_pickled_cat and os.path.exists(pickle_nat):
         nat_cat = load_catalog_query()
     else:
-        nat_cat = NatCat(params_list_for_stats=params_list_for_stats,
-                         star_types_for_stats=star_types_for_stats,
-                         catalogs_from_scratch=from_scratch, verbose=True, catalogs_verbose=True,
-                         get_abundance_data=True, get_exo_data=True, refresh_exo_data=refresh_exo_data,
-                         target_list=target_list,
-                         fast_update_gaia=fast_update_gaia,
-                         catalogs_file_name=catalogs_file_name)
+        with span('nat_cat'):
+            nat_cat = NatCat(params_list_for_stats=params_list_for_stats,
+                             star_types_for_stats=star_types_for_stats,
+                             catalogs_from_scratch=from_scratch, verbose=True, catalogs_verbose=True,
+                             get_abundance_data=True, get_exo_data=True, refresh_exo_data=refresh_exo_data,
+                             target_list=target_list,
+                             fast_update_gaia=fast_update_gaia,
+                             catalogs_file_name=catalogs_file_name,
+                             checkpoints=checkpoints, resume=resume)
         nat_cat.pickle_myself()
+    # the generation changes when NatCat computes any stage, so an output checkpoint from older NatCat data is not used
+    output_key = run_key(getattr(nat_cat, 'checkpoint_key', None), getattr(nat_cat, 'checkpoint_generation', None),
+                         norm_keys, target_list, dist, teff, logg)
+    output_checkpoint = None
+    if resume and not from_pickled_output:
+        output_checkpoint = load_checkpoint(stage='output', prefix='standard_output', key=output_key)
+        if output_checkpoint is not None:
+            print('Resuming standard_output after the output stage.\n')
     if from_pickled_output:
         output_star_data = load_pickled_output()
     else:
-        parameter_bound_filter = []
-        if dist is not None:
-            parameter_bound_filter.append(('dist', dist[0], dist[1]))
-        if teff is not None:
-            parameter_bound_filter.append(('teff', teff[0], teff[1]))
-        if logg is not None:
-            parameter_bound_filter.append(('logg', logg[0], logg[1]))
-
-        dist_output = nat_cat.make_output_star_data(min_catalog_count=1,
-                                                    parameter_bound_filter=parameter_bound_filter,
-                                                    star_data_stats=False,
-                                                    reduce_abundances=False)
-
-        exo_output = nat_cat.make_output_star_data(min_catalog_count=1,
-                                                   parameter_bound_filter=None,
-                                                   has_exoplanet=True,
-                                                   star_data_stats=False,
-                                                   reduce_abundances=False)
-        if target_list is None:
-            output_star_data = dist_output + exo_output
+        if output_checkpoint is None:
+            with span('output') as output_span:
+                output_star_data, target_output = make_standard_output(nat_cat=nat_cat, norm_keys=norm_keys,
+                                                                       target_list=target_list,
+                                                                       dist=dist, teff=teff, logg=logg)
+                output_span.items = len(output_star_data.star_names)
+            if checkpoints or resume:
+                save_checkpoint(state=(output_star_data, target_output), stage='output', prefix='standard_output',
+                                key=output_key)
+        else:
+            output_star_data, target_output = output_checkpoint
+        fingerprints = output_star_data.star_fingerprints()
+        if incremental:
+            changed_ids, removed_ids = output_star_data.find_changed_stars(fingerprints=fingerprints)
         else:
-            # select only the data that is belongs to the list of target stars
-            target_output = nat_cat.make_output_star_data(is_target=True)
-            output_star_data = target_output
-        # optional 2nd filtering step
-        output_star_data.filter(target_catalogs=None, or_logic_for_catalogs=True,
-                                catalogs_return_only_targets=False,
-                                target_star_name_types=None, and_logic_for_star_names=True,
-                                target_params=None, and_logic_for_params=True,
-                                target_elements=None, or_logic_for_element=True,
-                                element_bound_filter=None,  # filtering happens before normalization
-                                min_catalog_count=None,
-                                parameter_bound_filter=None,
-                                parameter_match_filter=None,
-                                at_least_fe_and_another=True,
-                                remove_nlte_abundances=False,
-                                keep_complement=False,
-                                is_target=None)
-        output_star_data.normalize(norm_keys=norm_keys)
-        output_star_data.filter(element_bound_filter=None)  # filter after normalization, and logic
-        output_star_data.do_stats(params_set=nat_cat.params_list_for_stats,
-                                  star_name_types=nat_cat.star_types_for_stats)
-        output_star_data.reduce_elements()
+            changed_ids, removed_ids = None, None
+        output_star_data.reduce_elements(star_names=changed_ids)
         output_star_data.find_available_attributes()
         if mongo_upload:
-            output_star_data.export_to_mongo(catalogs_file_name=nat_cat.catalogs_file_name,
-                                             target_web_data=nat_cat.target_web_data)
+            with span('export'):
+                output_star_data.export_to_mongo(catalogs_file_name=nat_cat.catalogs_file_name,
+                                                 target_web_data=nat_cat.target_web_data,
+                                                 fingerprints=fingerprints,
+                                                 changed_ids=changed_ids, removed_ids=removed_ids)
         output_star_data.pickle_myself()
+    run_report.write()
 
     return nat_cat, output_star_data, target_output
 
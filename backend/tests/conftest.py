@@ -0,0 +1,247 @@
+"""
+Fixtures for the frontend_pipeline() tests, a database with synthetic stars.
+
+Run from the backend directory with: python -m pytest, after: pip install -r requirements-test.txt
+
+By default, mongomock stands in for the MongoDB server, so the modules that open collections when they are imported
+work without one. It does not have a few of the aggregation expressions that frontend_pipeline() uses, these are
+added here with the MongoDB behavior, and they patch a private mongomock method, so mongomock is pinned in
+requirements-test.txt. It also has no collation, so the synthetic names are lowercase, these compare and sort the
+same with and without the collation.
+
+With TEST_MONGO_SERVER=true, the tests use the MongoDB server of the MONGO_* settings instead, see
+hypatia.configs.env_load, in a database named pytest that is dropped before and after the tests. The tests are
+skipped when there is neither mongomock nor a server.
+"""
+import os
+import math
+import random
+import tempfile
+
+import pytest
+import pymongo
+import pymongo.errors
+
+try:
+    import mongomock
+    from mongomock import aggregate as mongomock_aggregate
+except ImportError:
+    mongomock = mongomock_aggregate = None
+
+use_mongo_server = os.environ.get('TEST_MONGO_SERVER', 'false').lower().strip() in {'true', 'yes', '1'}
+test_elements = ['Fe', 'Si', 'Mg', 'Ca']
+test_catalogs = ['cat0', 'cat1', 'cat2', 'cat3', 'cat4', 'cat5']
+test_norm = 'lodders09'
+test_db_name = 'pytest'
+test_star_count = 240
+
+
+def create_collection(database, name, **kwargs):
+    # the validator and collation options are not supported by mongomock
+    try:
+        return mongomock_create_collection(database, name)
+    except mongomock.CollectionInvalid as error:
+        raise pymongo.errors.CollectionInvalid(name) from error
+
+
+def parse_or_none(parser, expression):
+    """
+    The value of an expression, None for a missing field, like the MongoDB expressions that return null.
+    """
+    try:
+        return parser.parse(expression)
+    except KeyError:
+        return None
+
+
+def bson_type_name(parser, expression) -> str:
+    try:
+        value = parser.parse(expression)
+    except KeyError:
+        return 'missing'
+    if value is None:
+        return 'null'
+    for value_type, type_name in ((bool, 'bool'), (int, 'int'), (float, 'double'), (str, 'string'),
+                                  (dict, 'object'), (list, 'array')):
+        if isinstance(value, value_type):
+            return type_name
+    raise TypeError(f'No BSON type for {type(value)}')
+
+
+def parse_expression(parser, expression):
+    if not isinstance(expression, dict) or len(expression) != 1:
+        return mongomock_parse(parser, expression)
+    (operator, args), = expression.items()
+    if operator == '$type':
+        return bson_type_name(parser, args)
+    elif operator == '$round':
+        value = parse_or_none(parser, args[0])
+        return None if value is None else round(float(value), args[1])
+    elif operator == '$sortArray':
+        values = parse_or_none(parser, args['input'])
+        if values is None:
+            return None
+        (field_name, direction), = args['sortBy'].items()
+        return sorted(values, key=lambda value: value[field_name], reverse=direction < 0)
+    elif operator == '$range':
+        return list(range(int(parser.parse(args[0])), int(parser.parse(args[1]))))
+    elif operator == '$zip':
+        arrays = [parse_or_none(parser, array) for array in args['inputs']]
+        if any(array is None for array in arrays):
+            return None
+        return [list(values) for values in zip(*arrays)]
+    elif operator == '$arrayElemAt':
+        # MongoDB also takes an index that is a whole double
+        values, index = parse_or_none(parser, args[0]), parse_or_none(parser, args[1])
+        if values is None or index is None:
+            return None
+        index = int(index)
+        return values[index] if -len(values) <= index < len(values) else None
+    elif operator == '$filter' and parse_or_none(parser, args['input']) is None:
+        return None
+    elif operator in {'$max', '$min', '$avg'} and isinstance(args, str):
+        # the accumulators on one array field, null for a missing field or no values
+        values = parse_or_none(parser, args)
+        if values is None:
+            return None
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+        if operator == '$avg':
+            return sum(values) / len(values)
+        return max(values) if operator == '$max' else min(values)
+    return mongomock_parse(parser, expression)
+
+
+def use_mongomock():
+    global mongomock_create_collection, mongomock_parse
+    mongomock_create_collection = mongomock.Database.create_collection
+    mongomock_parse = mongomock_aggregate._Parser.parse
+    mongomock.Database.create_collection = create_collection
+    mongomock_aggregate._Parser.parse = parse_expression
+    # before any hypatia module opens a collection
+    pymongo.MongoClient = mongomock.MongoClient
+
+
+skip_reason = None
+if use_mongo_server:
+    pass
+elif mongomock is None:
+    skip_reason = 'mongomock is not installed, see requirements-test.txt, or set TEST_MONGO_SERVER=true'
+else:
+    use_mongomock()
+
+
+def pytest_collection_modifyitems(config, items):
+    if skip_reason is not None:
+        for item in items:
+            item.add_marker(pytest.mark.skip(reason=skip_reason))
+
+
+def write_reference_files(ref_dir: str):
+    """
+    The solar normalization and element error files that are read when the pipeline modules are imported.
+    """
+    import hypatia.configs.file_paths as file_paths
+    file_paths.solar_norm_ref = os.path.join(ref_dir, 'solar_norm_ref.csv')
+    with open(file_paths.solar_norm_ref, 'w') as f:
+        f.write('# test solar normalizations\n')
+        f.write('catalog,author,year,' + ','.join(test_elements) + '\n')
+        f.write(f'{test_norm},Lodders,2009,7.45,7.52,7.54,6.29\n')
+    file_paths.element_plusminus_error_file = os.path.join(ref_dir, 'element_plusminus_err.toml')
+    with open(file_paths.element_plusminus_error_file, 'w') as f:
+        f.write(''.join(f'{element_name} = 0.05\n' for element_name in test_elements))
+
+
+write_reference_files(tempfile.mkdtemp(prefix='hypatia_test_'))
+
+
+def element_record(rng: random.Random, center: float) -> dict:
+    values = {handle: round(rng.gauss(center, 0.2), 3)
+              for handle in rng.sample(test_catalogs, rng.randint(1, 4))}
+    linear = {handle: 10.0 ** value for handle, value in values.items()}
+    sorted_values = sorted(values.values())
+    size = len(sorted_values)
+    if size % 2:
+        median = sorted_values[size // 2]
+    else:
+        median = math.log10((10.0 ** sorted_values[size // 2 - 1] + 10.0 ** sorted_values[size // 2]) / 2.0)
+    return {
+        'catalogs': values,
+        'catalogs_linear': linear,
+        'median': round(median, 2),
+        'mean': round(math.log10(sum(linear.values()) / size), 2),
+        'plusminus': round((sorted_values[-1] - sorted_values[0]) / 2.0, 2),
+    }
+
+
+def param_record(rng: random.Random, value, ref: str) -> dict:
+    record = {'value': value, 'ref': ref}
+    if isinstance(value, float):
+        record['err'] = round(abs(value) * rng.uniform(0.01, 0.1), 2)
+    return {'curated': record}
+
+
+def star_doc(star_index: int, rng: random.Random) -> dict:
+    """
+    A hypatiaDB document with some missing values, some null values, and planets for about a third of the stars.
+    """
+    star_name = f'star {star_index:04d}'
+    names = {'match_names': [star_name, f'alias {star_index:04d}'], 'aliases': [f'alias {star_index:04d}']}
+    if rng.random() < 0.7:
+        names['hip'] = f'hip {star_index}'
+    if rng.random() < 0.5:
+        names['gaia dr3'] = f'gaia dr3 {star_index * 7}'
+    doc = {'_id': star_name, 'attr_name': star_name.replace(' ', '_'), 'names': names,
+           'absolute': {}, 'normalizations': {test_norm: {}},
+           'target_handles': rng.sample(['has_exo', 'thin_disk', 'thick_disk'], rng.randint(0, 2)), 'stellar': {}}
+    for element_name, solar_value in zip(test_elements, [7.45, 7.52, 7.54, 6.29]):
+        if rng.random() < 0.85:
+            doc['absolute'][element_name] = element_record(rng, center=solar_value)
+            doc['normalizations'][test_norm][element_name] = element_record(rng, center=0.0)
+    if rng.random() < 0.9:
+        dist = None if rng.random() < 0.05 else round(rng.uniform(5.0, 500.0), 2)
+        doc['stellar']['dist'] = param_record(rng, dist, ref='ref_dist')
+    if rng.random() < 0.8:
+        doc['stellar']['teff'] = param_record(rng, round(rng.uniform(3500.0, 7000.0), 0), ref='ref_teff')
+    if rng.random() < 0.6:
+        disk = rng.choice(['thin', 'thick'])
+        doc['stellar']['disk'] = param_record(rng, disk, ref='ref_disk')
+        doc['stellar']['disk_num'] = param_record(rng, {'thin': 1, 'thick': 2}[disk], ref='ref_disk')
+    if star_index % 3 == 0:
+        planets = {}
+        for letter in 'bcd'[:rng.randint(1, 3)]:
+            planetary = {'period': {'value': round(rng.uniform(0.5, 30.0), 2), 'err': 0.1, 'ref': 'ref_period'}}
+            if rng.random() < 0.7:
+                planetary['pl_mass'] = {'value': round(rng.uniform(0.01, 5.0), 3), 'err': 0.02, 'ref': 'ref_mass'}
+            planets[letter] = {'letter': letter, 'pl_name': f'{star_name} {letter}', 'planetary': planetary}
+        doc['nea'] = {'nea_name': star_name, 'planets': planets}
+    return doc
+
+
+@pytest.fixture(scope='session')
+def star_docs() -> list[dict]:
+    rng = random.Random(42)
+    return [star_doc(star_index, rng) for star_index in range(test_star_count)]
+
+
+@pytest.fixture(scope='session')
+def hypatia_db(star_docs):
+    """
+    A HypatiaDB with the synthetic stars and their plot view, the plot view is not enabled.
+    """
+    from hypatia.collect import BaseCollection
+    from hypatia.pipeline.star.db import HypatiaDB
+    from hypatia.pipeline.star.plot_view import plot_view_docs
+    BaseCollection.client.drop_database(test_db_name)
+    test_db = HypatiaDB(db_name=test_db_name, collection_name='hypatiaDB', verbose=False)
+    test_db.collection.insert_many([dict(doc) for doc in star_docs])
+    test_db.get_plot_view().collection.insert_many([plot_view_doc for doc in star_docs
+                                                    for plot_view_doc in plot_view_docs(doc)])
+    yield test_db
+    BaseCollection.client.drop_database(test_db_name)
+
+
+@pytest.fixture(scope='session')
+def plot_view(hypatia_db):
+    return hypatia_db.get_plot_view()
@@ -0,0 +1,72 @@
+"""
+The planned frontend_pipeline() returns the same rows as the pipeline without the planning step, for the nested
+hypatiaDB collection and for the plot view.
+"""
+import json
+from itertools import product
+
+import pytest
+
+from hypatia.elements import ElementID
+from hypatia.pipeline.star.aggregation import frontend_pipeline
+
+fe, si, mg, ca = [ElementID.from_str(element_name) for element_name in ['Fe', 'Si', 'Mg', 'Ca']]
+
+value_filter_options = [{}, {fe: (-0.2, 0.2, False)}, {mg: (-0.1, 0.1, True)}]
+catalog_options = [None, ['cat1', 'cat2', 'cat4']]
+planet_options = [None, ['pl_mass', 'period']]
+sort_options = [None, 'Fe', 'dist']
+
+
+def query_grid() -> list[dict]:
+    grid = []
+    for query_index, (value_filters, catalogs, planet_params, return_hover, sort_field) \
+            in enumerate(product(value_filter_options, catalog_options, planet_options, [False, True], sort_options)):
+        grid.append(dict(
+            elements_returned=[fe, si, mg, ca],
+            elements_match_filters={fe},
+            element_value_filters=value_filters,
+            catalogs=catalogs,
+            catalog_exclude=catalogs is not None and query_index % 4 == 1,
+            stellar_params_returned=['dist', 'teff'],
+            planet_params_returned=planet_params,
+            solarnorm_id='lodders09',
+            return_median=query_index % 3 != 0,
+            return_error=query_index % 2 == 0,
+            return_hover=return_hover,
+            return_nea_name=True,
+            sort_field=sort_field,
+            sort_reverse=query_index % 2 == 1,
+        ))
+    return grid
+
+
+def row_order_key(row: dict) -> str:
+    return json.dumps(row, sort_keys=True, default=str)
+
+
+def assert_same_rows(collection, query_args: dict, plot_view: bool):
+    unplanned_rows = list(collection.aggregate(frontend_pipeline(**query_args, plot_view=plot_view, plan=False)))
+    planned_rows = list(collection.aggregate(frontend_pipeline(**query_args, plot_view=plot_view)))
+    if query_args['sort_field'] is None:
+        # only the sorted queries have an order
+        unplanned_rows = sorted(unplanned_rows, key=row_order_key)
+        planned_rows = sorted(planned_rows, key=row_order_key)
+    assert planned_rows == unplanned_rows
+
+
+@pytest.mark.parametrize('query_args', query_grid(), ids=lambda query_args: None)
+def test_planned_nested(hypatia_db, query_args):
+    assert_same_rows(hypatia_db.collection, query_args, plot_view=False)
+
+
+@pytest.mark.parametrize('query_args', query_grid(), ids=lambda query_args: None)
+def test_planned_plot_view(plot_view, query_args):
+    assert_same_rows(plot_view.collection, query_args, plot_view=True)
+
+
+def test_grid_returns_rows(hypatia_db):
+    # most of the grid should return rows, otherwise the planned tests do not test much
+    row_counts = [len(list(hypatia_db.collection.aggregate(frontend_pipeline(**query_args))))
+                  for query_args in query_grid()]
+    assert sum(row_count > 0 for row_count in row_counts) > 0.8 * len(row_counts)
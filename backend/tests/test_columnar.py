@@ -0,0 +1,148 @@
+"""
+Parity of the columnar engine with the database, the same frontend_pipeline(plot_view=True) queries are run by
+ColumnarEngine.run() and by the plot view aggregation.
+"""
+import json
+from itertools import product
+
+import pytest
+
+from hypatia.elements import ElementID, RatioID
+from hypatia.pipeline.star.aggregation import frontend_pipeline
+from hypatia.pipeline.star.columnar import ColumnarEngine, UnsupportedPipeline, sort_key, bson_type, missing
+
+fe, si, mg, ca = [ElementID.from_str(element_name) for element_name in ['Fe', 'Si', 'Mg', 'Ca']]
+solar_values = {fe: 7.45, si: 7.52, mg: 7.54, ca: 6.29}
+test_names = [f'star {star_index:04d}' for star_index in range(0, 240, 7)] + ['alias 0010', 'not a star']
+
+value_filter_options = [{}, {fe: (-0.2, 0.2, False)}, {si: (0.1, None, True)}]
+catalog_options = [(None, False), (['cat1', 'cat2', 'cat4'], False), (['cat0', 'cat3'], True)]
+planet_options = [None, ['period', 'pl_mass', 'planet_letter']]
+sort_options = [None, 'Fe', 'dist', 'disk']
+name_options = [None, False, True]
+
+
+def value_filters_for(value_filters: dict | None, solarnorm_id: str) -> dict | None:
+    """
+    The filters are written for the normalized values, the absolute values are shifted by the solar values.
+    """
+    if value_filters is None or solarnorm_id != 'absolute':
+        return value_filters
+    shifted_filters = {}
+    for value_id, (low, high, exclude) in value_filters.items():
+        if isinstance(value_id, RatioID):
+            shift = solar_values[value_id.numerator] - solar_values[value_id.denominator]
+        else:
+            shift = solar_values[value_id]
+        shifted_filters[value_id] = (None if low is None else low + shift, None if high is None else high + shift,
+                                     exclude)
+    return shifted_filters
+
+
+def query_grid() -> list[dict]:
+    """
+    The product of the main options, the other options change with the index of the query.
+    """
+    grid = []
+    for query_index, (value_filters, (catalogs, catalog_exclude), planet_params, sort_field, names_exclude) \
+            in enumerate(product(value_filter_options, catalog_options, planet_options, sort_options, name_options)):
+        solarnorm_id = ['absolute', 'lodders09'][query_index % 2]
+        query_args = dict(
+            elements_returned=[fe, si, mg],
+            elements_match_filters={mg} if query_index % 3 == 2 else None,
+            element_value_filters=value_filters_for(value_filters, solarnorm_id),
+            element_ratios_returned=[RatioID(mg, fe)] if query_index % 3 == 1 else None,
+            element_ratios_value_filters=value_filters_for({RatioID(ca, fe): (-0.5, None, False)}, solarnorm_id)
+            if query_index % 6 == 4 else None,
+            stellar_params_returned=['dist', 'teff', 'disk'],
+            stellar_params_match_filters={'teff'} if query_index % 5 == 2 else None,
+            stellar_params_value_filters={'dist': (None, 300.0, False)} if query_index % 4 == 3 else None,
+            planet_params_returned=planet_params,
+            planet_params_value_filters={'period': (2.0, 20.0, query_index % 4 == 1)}
+            if planet_params and query_index % 2 else None,
+            solarnorm_id=solarnorm_id,
+            return_median=query_index % 3 != 0,
+            catalogs=catalogs,
+            catalog_exclude=catalog_exclude,
+            return_nea_name=query_index % 5 == 0,
+            name_types_returned=[None, ['hip'], ['hip', 'gaia dr3']][query_index % 3],
+            sort_field=sort_field,
+            sort_reverse=query_index % 2 == 1,
+            return_error=query_index % 2 == 0,
+            star_name_column=['name', 'star_id'][query_index % 2],
+            return_hover=query_index % 4 < 2,
+            return_targets=query_index % 5 == 0,
+        )
+        if names_exclude is not None:
+            query_args['db_formatted_names'] = test_names
+            query_args['db_formatted_names_exclude'] = names_exclude
+        grid.append(query_args)
+    return grid
+
+
+def row_order_key(row: dict) -> str:
+    return json.dumps(row, sort_keys=True, default=str)
+
+
+@pytest.fixture(scope='module')
+def engine(plot_view):
+    return ColumnarEngine(plot_view=plot_view, get_data_version=lambda: 'test')
+
+
+@pytest.mark.parametrize('query_args', query_grid(), ids=lambda query_args: None)
+def test_engine_matches_aggregation(engine, plot_view, query_args):
+    json_pipeline = frontend_pipeline(**query_args, plot_view=True)
+    database_rows = list(plot_view.collection.aggregate(json_pipeline))
+    engine_rows = engine.run(json_pipeline)
+    if query_args['sort_field'] is None:
+        # only the sorted queries have an order
+        database_rows = sorted(database_rows, key=row_order_key)
+        engine_rows = sorted(engine_rows, key=row_order_key)
+    assert engine_rows == database_rows
+
+
+def test_grid_returns_rows(engine):
+    # most of the grid should return rows, otherwise the parity test does not test much
+    row_counts = [len(engine.run(frontend_pipeline(**query_args, plot_view=True))) for query_args in query_grid()]
+    assert sum(row_count > 0 for row_count in row_counts) > 0.8 * len(row_counts)
+
+
+def test_bson_sort_order():
+    values = [True, [1], {'a': 1}, 'B', 'a', 2.5, 1, None, missing]
+    assert sorted(values, key=sort_key) == [None, missing, 1, 2.5, 'a', 'B', {'a': 1}, [1], True]
+    assert [bson_type(value) for value in [missing, None, True, 1, 2 ** 40, 1.0, 'a', {}, []]] \
+        == ['missing', 'null', 'bool', 'int', 'long', 'double', 'string', 'object', 'array']
+
+
+def test_missing_and_null_filters(engine, plot_view):
+    # a null and a missing dist are both dropped by a match filter and sort before the numbers
+    query_args = dict(elements_returned=[fe], element_value_filters={}, stellar_params_returned=['dist'],
+                      sort_field='dist')
+    for match_filters in [None, {'dist'}]:
+        json_pipeline = frontend_pipeline(**query_args, stellar_params_match_filters=match_filters, plot_view=True)
+        engine_rows = engine.run(json_pipeline)
+        assert engine_rows == list(plot_view.collection.aggregate(json_pipeline))
+        has_null = any(row.get('dist', None) is None for row in engine_rows)
+        assert has_null == (match_filters is None)
+
+
+def test_unsupported_pipeline(engine):
+    with pytest.raises(UnsupportedPipeline):
+        engine.run([{'$group': {'_id': '$star_id'}}])
+    with pytest.raises(UnsupportedPipeline):
+        engine.run([{'$match': {'star_id': {'$regex': 'star'}}}, {'$project': {'_id': 0, 'star_id': 1}}])
+
+
+def test_version_change_discards_snapshot(plot_view):
+    # the data version changes while the first column is read, that snapshot is discarded and the query is run again
+    # the first call is for the new snapshot, the next calls after each column is read
+    data_versions = ['first', 'second']
+
+    def get_data_version():
+        return data_versions.pop(0) if len(data_versions) > 1 else data_versions[0]
+
+    version_engine = ColumnarEngine(plot_view=plot_view, get_data_version=get_data_version)
+    json_pipeline = frontend_pipeline(elements_returned=[fe], element_value_filters={}, sort_field='Fe',
+                                      plot_view=True)
+    assert version_engine.run(json_pipeline) == list(plot_view.collection.aggregate(json_pipeline))
+    assert version_engine.snapshot.data_version == 'second'
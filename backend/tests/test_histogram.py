@@ -0,0 +1,59 @@
+"""
+HypatiaDB.frontend_histogram() with the query cache, a miss and then a hit for the same histogram.
+"""
+import numpy as np
+import pytest
+
+from hypatia.elements import ElementID
+
+fe, si = [ElementID.from_str(element_name) for element_name in ['Fe', 'Si']]
+query_args = dict(elements_returned=[fe, si], element_value_filters={}, stellar_params_returned=['dist'],
+                  planet_params_returned=['period'], solarnorm_id='lodders09', return_nea_name=True)
+
+
+@pytest.fixture
+def cached_db(hypatia_db):
+    hypatia_db.enable_query_cache(get_data_version=lambda: 'test')
+    yield hypatia_db
+    hypatia_db.query_cache = None
+    hypatia_db.plot_view_requested = False
+    hypatia_db.plot_view = None
+    hypatia_db.columnar_engine = None
+    hypatia_db.columnar_engine_settings = None
+
+
+@pytest.mark.parametrize('histogram_field', ['Fe', 'dist'])
+def test_histogram_cache(cached_db, histogram_field):
+    first_histogram = cached_db.frontend_histogram(histogram_field, bins=10, **query_args)
+    assert cached_db.query_cache.stats()['misses'] == 1
+    second_histogram = cached_db.frontend_histogram(histogram_field, bins=10, **query_args)
+    assert cached_db.query_cache.stats()['hits'] == 1
+    assert second_histogram.keys() == first_histogram.keys()
+    for field_name in ['hist_all', 'hist_planet', 'edges']:
+        assert np.array_equal(second_histogram[field_name], first_histogram[field_name])
+    assert (second_histogram['count'], second_histogram['x_range']) \
+        == (first_histogram['count'], first_histogram['x_range'])
+    # the cached histogram is not changed by a caller that changes its copy
+    second_histogram['hist_all'][0] += 1000
+    third_histogram = cached_db.frontend_histogram(histogram_field, bins=10, **query_args)
+    assert np.array_equal(third_histogram['hist_all'], first_histogram['hist_all'])
+
+
+@pytest.mark.parametrize('query_path', ['nested', 'plot_view', 'columnar'])
+def test_histogram_matches_numpy(cached_db, query_path):
+    if query_path == 'plot_view':
+        assert cached_db.enable_plot_view()
+    elif query_path == 'columnar':
+        assert cached_db.enable_columnar_engine(get_data_version=lambda: 'test')
+    rows = cached_db.frontend_pipeline(**query_args)
+    # a missing dist is not returned by the pipelines
+    x_data = [row['dist'] for row in rows if row.get('dist', None) is not None]
+    x_data_with_planet = [row['dist'] for row in rows
+                          if row.get('dist', None) is not None and 'nea_name' in row.keys()]
+    hist_all, edges = np.histogram(x_data, bins=10)
+    hist_planet, edges = np.histogram(x_data_with_planet, bins=edges)
+    histogram = cached_db.frontend_histogram('dist', bins=10, **query_args)
+    assert histogram['count'] == len(x_data)
+    assert np.array_equal(histogram['hist_all'], hist_all)
+    assert np.array_equal(histogram['hist_planet'], hist_planet)
+    assert np.allclose(histogram['edges'], edges)
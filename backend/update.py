@@ -1,16 +1,24 @@
 from time import time
+from math import ceil
+from concurrent.futures import ThreadPoolExecutor
 
 from standard_lib import standard_output
 from hypatia.collect import BaseCollection
+from hypatia.tools.instrument import run_report, span
 from hypatia.pipeline.star.db import HypatiaDB
 from hypatia.sources.simbad.db import StarCollection
 from hypatia.plots.website import abundance_histogram
 from hypatia.pipeline.summary import SummaryCollection
-from hypatia.configs.source_settings import norm_keys_default
+from hypatia.pipeline.star.plot_view import PlotViewCollection, plot_view_suffix
+from hypatia.configs.source_settings import norm_keys_default, copy_batch_size, copy_cursor_threads
 from hypatia.configs.env_load import MONGO_DATABASE, MONGO_STARNAMES_COLLECTION
 
+published_collections = [('hypatiaDB', HypatiaDB), (f'hypatiaDB{plot_view_suffix}', PlotViewCollection),
+                         ('summary', SummaryCollection)]
 
-def update(norm_keys: list[str] = None, refresh_exo_data: bool = False):
+
+def update(norm_keys: list[str] = None, refresh_exo_data: bool = False, incremental: bool = False,
+           checkpoints: bool = False, resume: bool = False):
     if norm_keys is None:
         norm_keys = list(norm_keys_default)
     abs_list = []
@@ -18,12 +26,67 @@ def update(norm_keys: list[str] = None, refresh_exo_data: bool = False):
         norm_keys.remove('absolute')
         abs_list.append('absolute')
     return standard_output(from_scratch=True, refresh_exo_data=refresh_exo_data,
-                           norm_keys=norm_keys, mongo_upload=True)
+                           norm_keys=norm_keys, mongo_upload=True, incremental=incremental,
+                           checkpoints=checkpoints, resume=resume)
+
+
+def id_range_queries(source: BaseCollection, cursor_threads: int) -> list[dict]:
+    """
+    Queries on _id ranges that split the source collection into about equal parts, one for each cursor.
+    """
+    doc_count = source.collection.count_documents({})
+    step = ceil(doc_count / cursor_threads) if doc_count else 1
+    boundaries = []
+    for skip in range(step, doc_count, step):
+        for boundary_doc in source.collection.find({}, {'_id': 1}).sort('_id', 1).skip(skip).limit(1):
+            boundaries.append(boundary_doc['_id'])
+    queries = []
+    lower = None
+    for upper in boundaries + [None]:
+        id_query = {}
+        if lower is not None:
+            id_query['$gte'] = lower
+        if upper is not None:
+            id_query['$lt'] = upper
+        queries.append({'_id': id_query} if id_query else {})
+        lower = upper
+    return queries
+
+
+def copy_id_range(source: BaseCollection, target: BaseCollection, query: dict, batch_size: int) -> int:
+    copied = 0
+    batch = []
+    for doc in source.collection.find(query, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            target.collection.insert_many(batch, ordered=False, bypass_document_validation=True)
+            copied += len(batch)
+            batch = []
+    if batch:
+        target.collection.insert_many(batch, ordered=False, bypass_document_validation=True)
+        copied += len(batch)
+    return copied
+
+
+def stream_copy(source: BaseCollection, target: BaseCollection,
+                batch_size: int = copy_batch_size, cursor_threads: int = copy_cursor_threads) -> int:
+    """
+    Copies the documents in batches, with one cursor per _id range running in parallel.
+    """
+    queries = id_range_queries(source, cursor_threads=cursor_threads)
+    with ThreadPoolExecutor(max_workers=cursor_threads) as executor:
+        return sum(executor.map(lambda query: copy_id_range(source, target, query, batch_size), queries))
 
 
 def copy_collection(CollectionClass: BaseCollection,
                     source_db_name: str, source_collection_name: str,
-                    target_db_name: str,  target_collection_name: str):
+                    target_db_name: str,  target_collection_name: str,
+                    server_side: bool = True):
+    """
+    The documents are copied by the server with $out, all the collections use the one client of BaseCollection, so
+    the source and target are always on the same cluster. With server_side=False, the documents are streamed through
+    this process instead, see stream_copy().
+    """
     start_time = time()
     same_collection_name = source_collection_name == target_collection_name
     if same_collection_name:
@@ -32,10 +95,25 @@ def copy_collection(CollectionClass: BaseCollection,
         print(f'Publishing {source_db_name}.{source_collection_name} to {target_db_name}.{target_collection_name}')
     source = CollectionClass(collection_name=source_collection_name, db_name=source_db_name)
     target = CollectionClass(collection_name=target_collection_name, db_name=target_db_name)
-    target.reset()
-    all_data = source.find_all()
-    print('Copying documents from source to target')
-    target.add_many(all_data)
+    # the documents are bulk loaded into a staging collection, which is then swapped in for the target
+    staging = target.staging_collection(bulk_load=True)
+    copy_start = time()
+    if server_side:
+        print('Copying documents on the server with $out')
+        # $out keeps the validator of the existing staging collection
+        source.collection.aggregate([{'$match': {}},
+                                     {'$out': {'db': target_db_name, 'coll': staging.collection_name}}],
+                                    bypassDocumentValidation=True)
+        doc_count = staging.collection.count_documents({})
+    else:
+        print('Streaming documents from source to the staging collection')
+        doc_count = stream_copy(source, staging)
+    copy_time = time()
+    print(f' {copy_time - copy_start:.2f} seconds to copy {doc_count} documents '
+          f'({doc_count / max(copy_time - copy_start, 1e-9):.0f} documents per second)')
+    staging.finish_bulk_load(source=source)
+    print(f' {time() - copy_time:.2f} seconds to build the indexes and validate a sample of documents')
+    target.swap_in(staging)
     delta_time = time() - start_time
     if same_collection_name:
         print(f' {delta_time:.2f} seconds to complete the publishing {source_collection_name} from '
@@ -45,11 +123,23 @@ def copy_collection(CollectionClass: BaseCollection,
               f'{source_db_name}.{source_collection_name} to {target_db_name}.{target_collection_name}')
 
 
-def publish_hypatia(target_db_name: str = 'public', source_db_name: str = MONGO_DATABASE):
-    for collection_name, CollectionClass in [('hypatiaDB', HypatiaDB), ('summary', SummaryCollection)]:
-        copy_collection(CollectionClass=CollectionClass,
-            source_db_name=source_db_name, source_collection_name=collection_name,
-            target_db_name=target_db_name, target_collection_name=collection_name)
+def publish_hypatia(target_db_name: str = 'public', source_db_name: str = MONGO_DATABASE, server_side: bool = True):
+    run_report.reset(run_name='publish')
+    for collection_name, CollectionClass in published_collections:
+        with span(f'publish.{collection_name}'):
+            copy_collection(CollectionClass=CollectionClass,
+                source_db_name=source_db_name, source_collection_name=collection_name,
+                target_db_name=target_db_name, target_collection_name=collection_name,
+                server_side=server_side)
+    run_report.write()
+
+def rollback_hypatia(db_name: str = 'public'):
+    """
+    Swaps the previous versions of hypatiaDB, its plot view, and summary, kept by the last publish or export, back in.
+    """
+    for collection_name, CollectionClass in published_collections:
+        CollectionClass(collection_name=collection_name, db_name=db_name).rollback()
+
 
 def publish_stars(target_db_name: str = 'stars', source_db_name: str = MONGO_STARNAMES_COLLECTION,
                   remove_docs_with_exceptions: bool = False):
@@ -76,27 +166,48 @@ if __name__ == '__main__':
     parser.add_argument('--no-refresh-exo', action='store_false',
                         help='Do not refresh the exoplanet data.',
                         dest='refresh_exo_data')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only reduce and upload the stars with changed inputs, and delete the stars that are '
+                             'no longer in the output, instead of resetting the Hypatia database.',
+                        default=False)
+    parser.add_argument('--checkpoints', action='store_true',
+                        help='Save a checkpoint after each stage of the update.',
+                        default=False)
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume the update after the last stage with a good checkpoint from a run with the same '
+                             'settings, this also saves checkpoints.',
+                        default=False)
     parser.add_argument('--publish', action='store_true',
                         help='Publish the Hypatia database to the public database. '
                              'If elected all non-publish arguments are ignored. ' 
                              'Data is transferred from a test database to the public database.',
                         default=False)
+    parser.add_argument('--stream-copy', action='store_false',
+                        help='Publish by streaming the documents through this process in parallel batches, '
+                             'instead of copying them on the server with $out.',
+                        default=True, dest='server_side')
     parser.add_argument('--publish-stars', action='store_true',
                         help='Publish the Hypatia metadata.stars from another test database.'
                              'If elected all non-publish arguments are ignored. '
                              'data is transferred from a test database default metadata database.',
                         default=False)
+    parser.add_argument('--rollback', nargs='?', const='public', default=None, metavar='DB_NAME',
+                        help='Swap the previous hypatiaDB, hypatiaDB_plot, and summary collections back in, '
+                             'in the public database or in DB_NAME. '
+                             'If selected, all other arguments are ignored.')
     parser.add_argument('--make-website-plots', action='store_true',
                         help='Make the website plots, such as the abundance histogram. '
                              'If selected, all other arguments are ignored.',
                         default=False, dest='make_website_plots')
 
     args = parser.parse_args()
-    if args.make_website_plots:
+    if args.rollback is not None:
+        rollback_hypatia(db_name=args.rollback)
+    elif args.make_website_plots:
         do_website_plots()
     elif args.publish or args.publish_stars:
         if args.publish:
-            publish_hypatia()
+            publish_hypatia(server_side=args.server_side)
         if args.publish_stars:
             publish_stars()
     else:
@@ -105,4 +216,6 @@ if __name__ == '__main__':
         else:
             norm_keys = None
         nat_cat, output_star_data, target_star_data = update(norm_keys=norm_keys,
-                                                             refresh_exo_data=args.refresh_exo_data)
+                                                             refresh_exo_data=args.refresh_exo_data,
+                                                             incremental=args.incremental,
+                                                             checkpoints=args.checkpoints, resume=args.resume)
@@ -129,7 +129,7 @@ def graph():
     # set the packaged settings values
     settings = get_settings()
     # set the API request for the data values
-    url_values = urllib.parse.urlencode(settings)
+    url_values = urllib.parse.urlencode(settings | {'max_points': scatter_max_points})
     full_url = f'{BASE_API_URL}scatter/?{url_values}'
     graph_data_web = urllib.request.urlopen(full_url)
     graph_data = json.loads(graph_data_web.read().decode(graph_data_web.info().get_content_charset('utf-8')))
@@ -153,7 +153,10 @@ def graph():
                                        do_xlog=do_xlog, do_ylog=do_ylog, do_zlog=do_zlog,
                                        xaxisinv=settings['xaxisinv'], yaxisinv=settings['yaxisinv'],
                                        zaxisinv=settings['zaxisinv'], has_zaxis=has_zaxis,
-                                       do_gridlines=settings['gridlines'])
+                                       do_gridlines=settings['gridlines'],
+                                       weight=outputs.get('weight', None),
+                                       downsampled=graph_data.get('downsampled', False),
+                                       point_count=graph_data.get('point_count', None))
     # send back to the browser
     return dict(script=script, div=div)
 
@@ -218,7 +221,7 @@ def graph_hist():
     script, div = create_bokeh_hist(hist_all=graph_data['hist_all'], hist_planet = graph_data['hist_planet'],
                                     edges=graph_data['edges'],
                                     x_label=labels.get('x_label', None),
-                                    x_data = graph_data['x_data'],
+                                    x_range = graph_data['x_range'],
                                     normalize=settings['normalize'], xaxisinv=settings['xaxisinv'],
                                     do_gridlines=settings['gridlines'],
                                     )
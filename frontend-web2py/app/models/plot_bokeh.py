@@ -12,6 +12,10 @@ axis_lab_font_size = '12pt'
 axis_lab_font_style = 'normal'
 TOOLS = 'crosshair,pan,wheel_zoom,zoom_in,zoom_out,box_zoom,undo,redo,reset,tap,save,box_select,poly_select,lasso_select,'
 
+# the marker size of a single point on the scatter plot
+scatter_point_size = 8
+# the scatter plots with more points than this are downsampled by the API, dense regions are binned
+scatter_max_points = 20000
 plot_layers = ['all_hypatia', 'or_matches', 'combined_matches']
 
 def bokeh_export_html(p):
@@ -48,11 +52,20 @@ def create_bokeh_scatter(name: list[str],
                          do_xlog: bool = False, do_ylog: bool = False, do_zlog: bool = False,
                          xaxisinv: bool = False, yaxisinv: bool = False, zaxisinv: bool = False,
                          has_zaxis: bool = False, do_gridlines: bool = False,
+                         weight: list[int] = None, downsampled: bool = False, point_count: int = None,
                          ):
     # if there is no data, then return a message
     if not xaxis:
         return '', 'No data points to display'
     bokeh_source = {'name': name}
+    # a downsampled plot has a weight for each point, the binned points are drawn larger by the number of points
+    if weight:
+        weight = np.array(weight)
+        bokeh_source['weight'] = weight
+        bokeh_source['size'] = scatter_point_size + 3 * np.log2(weight)
+        point_size = 'size'
+    else:
+        point_size = scatter_point_size
     labels = {}
     if xaxis:
         xaxis = np.array(xaxis)
@@ -115,6 +128,8 @@ def create_bokeh_scatter(name: list[str],
         p.title.text = f'{planet_count} planets selected from {star_count} stars'
     else:
         p.title.text = f'{star_count} stars selected'
+    if downsampled:
+        p.title.text += f', dense regions binned ({len(xaxis)} of {point_count} points drawn)'
     p.title.align = 'center'
 
     # z-axis
@@ -131,7 +146,7 @@ def create_bokeh_scatter(name: list[str],
         # build the scatter plot
         p.scatter('xaxis', 'yaxis', fill_color={'field': 'zaxis', 'transform': mapper},
                   line_color={'field': 'zaxis', 'transform': mapper},
-                  fill_alpha=0.3, line_alpha=0.8, source=source, size=8)
+                  fill_alpha=0.3, line_alpha=0.8, source=source, size=point_size)
         color_bar = ColorBar(color_mapper=mapper, height=100, title=labels['zaxis'].replace('_', ' '),
                              border_line_width=1,
                              border_line_color='#cccccc', label_standoff=7)
@@ -140,12 +155,13 @@ def create_bokeh_scatter(name: list[str],
         # build the scatter plot
         p.scatter('xaxis', 'yaxis',
                   fill_color=hypatia_purple, line_color=hypatia_purple, fill_alpha=0.3, line_alpha=0.6,
-                  source=source, size=8)
+                  source=source, size=point_size)
 
     # callback
     callback = CustomJS(args={'allPlotData': source}, code="""
-            const inds = cb_obj.indices;
             const d1 = allPlotData.data;
+            // the binned points of a downsampled plot are not stars
+            const inds = cb_obj.indices.filter(i => !('weight' in d1) || d1['weight'][i] === 1);
             const result = inds.map(i => d1['name'][i]);
             $("#star_list").val(result.join(","));
             $("select[name='star_action']").val("only");
@@ -338,12 +354,12 @@ def create_bokeh_targets(name: list[str],
     return bokeh_default_settings(p=p, x_label=labels['xaxis'], y_label=labels['yaxis'], do_gridlines=do_gridlines)
 
 
-def create_bokeh_hist(hist_all, hist_planet, edges, x_data: list[str | float | int],
+def create_bokeh_hist(hist_all, hist_planet, edges, x_range: list[float | int] | None,
                       x_label: str = None,
                       normalize: bool = False, xaxisinv: bool = False, do_gridlines: bool = False,
                       ):
     # histogram - compare all data to the stars with planets
-    if x_data:
+    if x_range:
         labels = {'xaxis': x_label if x_label else 'X Axis'}
     else:
         # if there is no data, then return a message
@@ -361,10 +377,8 @@ def create_bokeh_hist(hist_all, hist_planet, edges, x_data: list[str | float | i
         labels['yaxis'] = y_label
         fill_alpha = 1
         line_alpha = 1
-    # set the bounds of the plot
-    x_min = min(x_data)
-    x_max = max(x_data)
-    x_range = [x_min, x_max]
+    # set the bounds of the plot, the minimum and maximum of the x values
+    x_range = list(x_range)
     # invert the plot if necessary
     if xaxisinv:
         x_range = x_range[::-1]